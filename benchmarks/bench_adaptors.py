@@ -0,0 +1,508 @@
+"""
+Benchmark harness of the OpenAI adaptors: hit latency, miss overhead and throughput, per backend and
+aggregation method, against a local stub of the OpenAI HTTP API.
+
+For every backend, aggregation method and adaptor (sync and async):
+    - direct: latency of the stub upstream without cachelm, the baseline of the miss overhead.
+    - miss: latency of requests missing the cache (lookup, upstream call and cache write).
+    - hit: latency of the same requests once cached, and the share served from the cache.
+    - throughput: cache hits per second at each concurrency level. Every concurrent worker has its
+      own adaptor, as adaptors keep the history of the request they're serving.
+
+Backends are skipped when their library isn't installed or their server isn't reachable:
+    - memory, chroma (in-memory client) and qdrant (":memory:") run in process.
+    - redis and clickhouse run against the servers given by --redis and --clickhouse
+      (or the CACHELM_BENCH_REDIS / CACHELM_BENCH_CLICKHOUSE environment variables), e.g.
+      --redis localhost:6379 --clickhouse default:password@localhost:8123.
+
+The results are written as JSON, with the environment they were measured in, so runs can be compared
+over time; a summary table is printed to stderr.
+
+Run with: python benchmarks/bench_adaptors.py --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import openai
+from loguru import logger
+
+from cachelm.adaptors.openai.async_openai import AsyncOpenAIAdaptor
+from cachelm.adaptors.openai.sync_openai import SyncOpenAIAdaptor
+from cachelm.databases.database import Database
+from cachelm.utils.aggregator import AggregateMethod
+from cachelm.vectorizers.hashing import HashingVectorizer
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+AGGREGATIONS = [
+    AggregateMethod.CONCATENATE,
+    AggregateMethod.EXPONENTIAL_DECAY,
+    AggregateMethod.LINEAR_DECAY,
+]
+BACKENDS = ["memory", "chroma", "qdrant", "redis", "clickhouse"]
+
+
+class StubOpenAIServer:
+    """
+    Local HTTP server answering `/v1/chat/completions` like the OpenAI API, after a fixed latency.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, Nagle's algorithm would delay the body
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                server.requests += 1
+                time.sleep(server.latency)
+                question = body["messages"][-1]["content"]
+                payload = json.dumps(
+                    {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion",
+                        "created": 0,
+                        "model": body["model"],
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {
+                                    "role": "assistant",
+                                    "content": f"Here is the answer to: {question}",
+                                },
+                                "finish_reason": "stop",
+                            }
+                        ],
+                    }
+                ).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_port}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StubVectorizer(Vectorizer):
+    """
+    Bag-of-words vectorizer hashing words into a fixed number of dimensions, no model needed.
+    """
+
+    model_name = "stub-bag-of-words"
+
+    def __init__(self, dimension: int = 256, **kwargs):
+        super().__init__(**kwargs)
+        self.dimension = dimension
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, text):
+        vectors = np.zeros((len(text), self.dimension), dtype=np.float32)
+        for i, t in enumerate(text):
+            for word in t.lower().split():
+                vectors[i, zlib.crc32(word.encode()) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+
+class SharedDatabase(Database):
+    """
+    Connected database shared by the adaptors of the concurrent workers, without reconnecting it.
+    """
+
+    def __init__(self, database: Database):
+        super().__init__(
+            database.vectorizer,
+            database.unique_id,
+            database.distance_threshold,
+            database.max_size,
+            database.serializer,
+        )
+        self.database = database
+
+    def connect(self) -> bool:
+        return True
+
+    def disconnect(self):
+        pass
+
+    def reset(self):
+        self.database.reset()
+
+    def write(self, history, response, namespace=None):
+        self.database.write(history, response, namespace)
+
+    def find(self, history, namespace=None):
+        return self.database.find(history, namespace)
+
+    def find_with_distance(self, history, namespace=None):
+        return self.database.find_with_distance(history, namespace)
+
+    def size(self) -> int:
+        return self.database.size()
+
+
+def make_database(backend: str, vectorizer: Vectorizer, args) -> Database:
+    """
+    Build and connect a backend, raising if it's unavailable.
+    """
+    unique_id = f"cachelm_bench_{os.getpid()}_{random.randrange(1 << 30)}"
+    common = {"unique_id": unique_id, "distance_threshold": 0.05, "max_size": 0}
+    if backend == "memory":
+        from cachelm.databases.memory import MemoryDatabase
+
+        database = MemoryDatabase(vectorizer, **common)
+    elif backend == "chroma":
+        from cachelm.databases.chroma import ChromaDatabase
+
+        database = ChromaDatabase(vectorizer, **common)
+    elif backend == "qdrant":
+        from cachelm.databases.qdrant import QdrantDatabase
+
+        database = QdrantDatabase(
+            vectorizer, location=":memory:", prefer_grpc=False, **common
+        )
+    elif backend == "redis":
+        if not args.redis:
+            raise RuntimeError("no server given (--redis host:port)")
+        from cachelm.databases.redisvl import RedisVLDatabase
+
+        host, _, port = args.redis.partition(":")
+        database = RedisVLDatabase(host, int(port or 6379), vectorizer, **common)
+    elif backend == "clickhouse":
+        if not args.clickhouse:
+            raise RuntimeError("no server given (--clickhouse user:password@host:port)")
+        from cachelm.databases.clickhouse import ClickHouse
+
+        credentials, _, address = args.clickhouse.rpartition("@")
+        user, _, password = credentials.partition(":")
+        host, _, port = address.partition(":")
+        database = ClickHouse(
+            host, int(port or 8123), user or "default", password, vectorizer, **common
+        )
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+    if not database.connect():
+        raise RuntimeError("connection failed")
+    return database
+
+
+def make_vectorizer(name: str, aggregation: str) -> Vectorizer:
+    if name == "fastembed":
+        from cachelm.vectorizers.fastembed import FastEmbedVectorizer
+
+        return FastEmbedVectorizer(aggregate_method=aggregation)
+    if name == "hashing":
+        return HashingVectorizer(dimension=256, aggregate_method=aggregation)
+    return StubVectorizer(aggregate_method=aggregation)
+
+
+def percentiles(latencies: list[float]) -> dict:
+    """
+    p50/p95/p99 and mean of latencies in seconds, in milliseconds.
+    """
+    if not latencies:
+        return {}
+    values = np.asarray(latencies) * 1e3
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+def make_prompts(count: int, seed: int) -> list[list[dict]]:
+    rng = random.Random(seed)
+    verbs = ["reset", "configure", "update", "export", "delete", "share", "rename"]
+    nouns = ["password", "invoice", "profile", "workspace", "report", "api key"]
+    return [
+        [
+            {"role": "system", "content": "You are a helpful support assistant."},
+            {
+                "role": "user",
+                "content": f"Ticket {i}: how do I {rng.choice(verbs)} my "
+                f"{rng.choice(nouns)} in project {rng.randrange(10**6)}?",
+            },
+        ]
+        for i in range(count)
+    ]
+
+
+def run_sync(database, server, prompts, args) -> dict:
+    def client():
+        return openai.OpenAI(
+            api_key="sk-bench", base_url=server.base_url, max_retries=0
+        )
+
+    def adapted():
+        return SyncOpenAIAdaptor(
+            module=client(), database=SharedDatabase(database)
+        ).get_adapted()
+
+    def timed(target, messages):
+        start = time.perf_counter()
+        target.chat.completions.create(model="gpt-4o", messages=messages)
+        return time.perf_counter() - start
+
+    direct = client()
+    direct_latencies = [timed(direct, messages) for messages in prompts]
+    cached = adapted()
+    miss_latencies = [timed(cached, messages) for messages in prompts]
+    upstream_before = server.requests
+    hit_latencies = [timed(cached, messages) for messages in prompts]
+    hit_rate = 1 - (server.requests - upstream_before) / len(prompts)
+
+    throughput = []
+    for concurrency in args.concurrency:
+        local = threading.local()
+
+        def request(messages):
+            if not hasattr(local, "client"):
+                local.client = adapted()
+            return timed(local.client, messages)
+
+        workload = prompts * max(1, args.throughput_requests // len(prompts))
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(request, prompts[:concurrency]))  # Warm the workers up
+            start = time.perf_counter()
+            latencies = list(executor.map(request, workload))
+            elapsed = time.perf_counter() - start
+        throughput.append(
+            {
+                "concurrency": concurrency,
+                "requests": len(workload),
+                "requests_per_s": round(len(workload) / elapsed, 1),
+                **percentiles(latencies),
+            }
+        )
+    return {
+        "direct": percentiles(direct_latencies),
+        "miss": percentiles(miss_latencies),
+        "hit": percentiles(hit_latencies),
+        "hit_rate": round(hit_rate, 4),
+        "throughput": throughput,
+    }
+
+
+def run_async(database, server, prompts, args) -> dict:
+    def client():
+        return openai.AsyncOpenAI(
+            api_key="sk-bench", base_url=server.base_url, max_retries=0
+        )
+
+    def adapted():
+        return AsyncOpenAIAdaptor(
+            module=client(), database=SharedDatabase(database)
+        ).get_adapted()
+
+    async def timed(target, messages):
+        start = time.perf_counter()
+        await target.chat.completions.create(model="gpt-4o", messages=messages)
+        return time.perf_counter() - start
+
+    async def main():
+        direct = client()
+        direct_latencies = [await timed(direct, messages) for messages in prompts]
+        cached = adapted()
+        miss_latencies = [await timed(cached, messages) for messages in prompts]
+        upstream_before = server.requests
+        hit_latencies = [await timed(cached, messages) for messages in prompts]
+        hit_rate = 1 - (server.requests - upstream_before) / len(prompts)
+
+        throughput = []
+        for concurrency in args.concurrency:
+            workload = prompts * max(1, args.throughput_requests // len(prompts))
+            queue = asyncio.Queue()
+            for messages in workload:
+                queue.put_nowait(messages)
+            latencies = []
+            clients = [adapted() for _ in range(concurrency)]
+            for worker_client, messages in zip(clients, prompts):
+                await timed(worker_client, messages)  # Warm the workers up
+
+            async def worker(worker_client):
+                while not queue.empty():
+                    latencies.append(await timed(worker_client, queue.get_nowait()))
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(c) for c in clients))
+            elapsed = time.perf_counter() - start
+            throughput.append(
+                {
+                    "concurrency": concurrency,
+                    "requests": len(workload),
+                    "requests_per_s": round(len(workload) / elapsed, 1),
+                    **percentiles(latencies),
+                }
+            )
+        return {
+            "direct": percentiles(direct_latencies),
+            "miss": percentiles(miss_latencies),
+            "hit": percentiles(hit_latencies),
+            "hit_rate": round(hit_rate, 4),
+            "throughput": throughput,
+        }
+
+    return asyncio.run(main())
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "openai": openai.__version__,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--aggregations", default=",".join(AGGREGATIONS))
+    parser.add_argument("--adaptors", default="sync,async")
+    parser.add_argument(
+        "--vectorizer", choices=["stub", "hashing", "fastembed"], default="stub"
+    )
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--throughput-requests", type=int, default=400)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--upstream-latency-ms", type=float, default=20.0)
+    parser.add_argument("--redis", default=os.environ.get("CACHELM_BENCH_REDIS"))
+    parser.add_argument(
+        "--clickhouse", default=os.environ.get("CACHELM_BENCH_CLICKHOUSE")
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON output file (default: stdout)")
+    args = parser.parse_args()
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    return args
+
+
+def main():
+    args = parse_args()
+    logger.remove()
+    server = StubOpenAIServer(args.upstream_latency_ms / 1000)
+    prompts = make_prompts(args.requests, args.seed)
+    results = []
+    skipped = {}
+    runners = {"sync": run_sync, "async": run_async}
+    try:
+        for backend in args.backends.split(","):
+            for aggregation in args.aggregations.split(","):
+                for adaptor in args.adaptors.split(","):
+                    vectorizer = make_vectorizer(args.vectorizer, aggregation)
+                    try:
+                        database = make_database(backend, vectorizer, args)
+                    except Exception as e:
+                        skipped[backend] = f"{type(e).__name__}: {e}"
+                        break
+                    try:
+                        result = runners[adaptor](database, server, prompts, args)
+                    finally:
+                        database.reset()
+                        database.disconnect()
+                    results.append(
+                        {
+                            "backend": backend,
+                            "aggregation": aggregation,
+                            "adaptor": adaptor,
+                            "vectorizer": args.vectorizer,
+                            "miss_overhead_p50_ms": round(
+                                result["miss"]["p50_ms"] - result["direct"]["p50_ms"],
+                                3,
+                            ),
+                            **result,
+                        }
+                    )
+                    print_row(results[-1])
+                if backend in skipped:
+                    print(f"skipped {backend}: {skipped[backend]}", file=sys.stderr)
+                    break
+    finally:
+        server.stop()
+
+    report = {
+        "environment": environment(),
+        "parameters": {
+            "requests": args.requests,
+            "throughput_requests": args.throughput_requests,
+            "concurrency": args.concurrency,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "vectorizer": args.vectorizer,
+            "seed": args.seed,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def print_row(result: dict):
+    if not getattr(print_row, "header", False):
+        print(
+            f"{'backend':<11} {'aggregation':<18} {'adaptor':<7} {'hit p50':>8}"
+            f" {'hit p99':>8} {'miss +ms':>9} {'hit rate':>9} {'max hits/s':>11}",
+            file=sys.stderr,
+        )
+        print_row.header = True
+    best = max(t["requests_per_s"] for t in result["throughput"])
+    print(
+        f"{result['backend']:<11} {result['aggregation']:<18} {result['adaptor']:<7}"
+        f" {result['hit']['p50_ms']:>8.2f} {result['hit']['p99_ms']:>8.2f}"
+        f" {result['miss_overhead_p50_ms']:>9.2f} {result['hit_rate']:>9.2f}"
+        f" {best:>11.1f}",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
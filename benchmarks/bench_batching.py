@@ -0,0 +1,89 @@
+"""
+Benchmark of the BatchingVectorizer under concurrency, against every request calling the model on its own.
+
+The model is simulated: every embed_many call costs a fixed overhead plus a small per-text cost, and
+releases the GIL like an ONNX session does. Real models (e.g. FastEmbed) have the same shape, with a
+per-call overhead making batches of 1 to 4 texts far less efficient than batches of 32 to 64.
+
+Run with: python benchmarks/bench_batching.py
+"""
+
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from loguru import logger
+
+from cachelm.vectorizers.batching import BatchingVectorizer
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+CALL_OVERHEAD = 0.002
+PER_TEXT = 0.0001
+DIMENSION = 8
+
+
+class SimulatedVectorizer(Vectorizer):
+    def __init__(self):
+        super().__init__()
+        self.lock = Lock()
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, text):
+        # A single session runs one batch at a time
+        with self.lock:
+            time.sleep(CALL_OVERHEAD + PER_TEXT * len(text))
+        return [[float(len(t))] * DIMENSION for t in text]
+
+
+def run(vectorizer: Vectorizer, concurrency: int, requests: int) -> tuple[float, list]:
+    latencies = []
+
+    def request(i):
+        start = time.perf_counter()
+        vectorizer.embed_weighted_average(
+            "msg:user: hi msg:assistant: hello msg:user: hey"
+        )
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(request, range(requests)))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    logger.remove()
+    requests = 512
+    print(
+        f"{'case':<24} {'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>10}"
+    )
+    for concurrency in (1, 8, 32):
+        cases = {
+            "direct": SimulatedVectorizer(),
+            "batching (2ms, 64)": BatchingVectorizer(
+                SimulatedVectorizer(), max_batch=64, max_wait_ms=2
+            ),
+        }
+        for name, vectorizer in cases.items():
+            elapsed, latencies = run(vectorizer, concurrency, requests)
+            latencies.sort()
+            mean_batch = (
+                vectorizer.stats()["mean_batch_size"]
+                if isinstance(vectorizer, BatchingVectorizer)
+                else 4.0
+            )
+            print(
+                f"{name:<24} {concurrency:>11} {requests / elapsed:>8.0f}"
+                f" {statistics.median(latencies) * 1e3:>8.2f}"
+                f" {latencies[int(len(latencies) * 0.99)] * 1e3:>8.2f}"
+                f" {mean_batch:>10.1f}"
+            )
+            if isinstance(vectorizer, BatchingVectorizer):
+                vectorizer.close()
+
+
+if __name__ == "__main__":
+    main()
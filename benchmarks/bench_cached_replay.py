@@ -0,0 +1,133 @@
+"""
+Microbenchmark of the cache hit path: building the response served for a cached message.
+
+Compares the nested pydantic construction used before, the openai `model_construct`
+(which walks the field annotations and ends up slower), the single `model_validate` call
+on a plain dict used now, and the JSON bytes handed to proxies.
+
+Run with: python benchmarks/bench_cached_replay.py
+"""
+
+import timeit
+from uuid import uuid4
+
+from openai.types.chat.chat_completion import ChatCompletion, Choice
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from openai.types.chat.chat_completion_message_tool_call import (
+    ChatCompletionMessageToolCall,
+    Function,
+)
+
+from cachelm.adaptors.openai.replay import (
+    build_chat_completion,
+    build_chat_completion_json,
+)
+from cachelm.utils.chat_history import Message, ToolCall
+
+
+def build_validated(cached: Message, model: str) -> ChatCompletion:
+    """
+    Response construction of the hit path before the replay module.
+    """
+    return ChatCompletion(
+        id=str(uuid4()),
+        choices=[
+            Choice(
+                index=0,
+                finish_reason="stop",
+                message=ChatCompletionMessage(
+                    role=cached.role,
+                    content=cached.content,
+                    tool_calls=(
+                        [
+                            ChatCompletionMessageToolCall(
+                                id=str(uuid4()),
+                                type="function",
+                                function=Function(
+                                    name=tool_call.tool,
+                                    arguments=tool_call.args,
+                                ),
+                            )
+                            for tool_call in cached.tool_calls
+                        ]
+                        if cached.tool_calls
+                        else None
+                    ),
+                ),
+            )
+        ],
+        created=0,
+        model=model,
+        object="chat.completion",
+    )
+
+
+def build_constructed(cached: Message, model: str) -> ChatCompletion:
+    """
+    Same construction with `model_construct`, skipping validation.
+    """
+    return ChatCompletion.model_construct(
+        id=str(uuid4()),
+        choices=[
+            Choice.model_construct(
+                index=0,
+                finish_reason="stop",
+                logprobs=None,
+                message=ChatCompletionMessage.model_construct(
+                    role=cached.role,
+                    content=cached.content,
+                    tool_calls=[
+                        ChatCompletionMessageToolCall.model_construct(
+                            id=str(uuid4()),
+                            type="function",
+                            function=Function.model_construct(
+                                name=tool_call.tool, arguments=tool_call.args
+                            ),
+                        )
+                        for tool_call in cached.tool_calls or []
+                    ]
+                    or None,
+                ),
+            )
+        ],
+        created=0,
+        model=model,
+        object="chat.completion",
+    )
+
+
+def main():
+    cached_json = Message(
+        role="assistant",
+        content=" ".join(["word"] * 500),
+        tool_calls=[
+            ToolCall("get_weather", '{"city": "Paris"}'),
+            ToolCall("get_time", '{"timezone": "Europe/Paris"}'),
+        ],
+    ).to_json_str()
+
+    cases = {
+        "validated": lambda: build_validated(
+            Message.from_json_str(cached_json), "gpt-4o"
+        ),
+        "model_construct": lambda: build_constructed(
+            Message.from_json_str(cached_json), "gpt-4o"
+        ),
+        "validate_dict": lambda: build_chat_completion(
+            Message.from_json_str(cached_json), "gpt-4o"
+        ),
+        "json_bytes": lambda: build_chat_completion_json(
+            Message.from_json_str(cached_json), "gpt-4o"
+        ),
+    }
+    number = 20000
+    baseline = None
+    print(f"{'case':<16} {'us/hit':>8} {'speedup':>8}")
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=number, repeat=5)) / number * 1e6
+        baseline = baseline or best
+        print(f"{name:<16} {best:>8.2f} {baseline / best:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark of the persistent embedding store: embedding a corpus cold, then again after a restart.
+
+The model is simulated with a fixed cost per text (0.5ms, the order of magnitude of bge-base on a
+CPU core), the numbers compare it with reading 768-dimensional float32 vectors from SQLite.
+
+Run with: python benchmarks/bench_embedding_store.py
+"""
+
+import os
+import tempfile
+import time
+
+from loguru import logger
+
+from cachelm.vectorizers.cached import CachedVectorizer
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+DIMENSION = 768
+PER_TEXT = 0.0005
+
+
+class SimulatedVectorizer(Vectorizer):
+    model_name = "simulated"
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, text):
+        time.sleep(PER_TEXT * len(text))
+        return [[float(len(t)) / 100] * DIMENSION for t in text]
+
+
+def main():
+    logger.remove()
+    texts = [f"message number {i} of a long conversation" for i in range(2000)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "embeddings.db")
+        print(f"{'case':<28} {'texts/s':>10}")
+
+        start = time.perf_counter()
+        SimulatedVectorizer().embed_many(texts)
+        print(f"{'model only':<28} {len(texts) / (time.perf_counter() - start):>10.0f}")
+
+        vectorizer = CachedVectorizer(SimulatedVectorizer(), path)
+        start = time.perf_counter()
+        vectorizer.prefetch(texts)
+        print(
+            f"{'cold store (prefetch)':<28} {len(texts) / (time.perf_counter() - start):>10.0f}"
+        )
+        vectorizer.close()
+
+        vectorizer = CachedVectorizer(SimulatedVectorizer(), path)
+        for batch_size in (4, 256):
+            start = time.perf_counter()
+            for i in range(0, len(texts), batch_size):
+                vectorizer.embed_many(texts[i : i + batch_size])
+            elapsed = time.perf_counter() - start
+            print(
+                f"{f'after restart, batch {batch_size}':<28} {len(texts) / elapsed:>10.0f}"
+            )
+        assert vectorizer.stats()["misses"] == 0
+        vectorizer.close()
+
+
+if __name__ == "__main__":
+    main()
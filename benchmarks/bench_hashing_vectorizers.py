@@ -0,0 +1,77 @@
+"""
+Benchmark of the model-free vectorizers: embedding latency per batch size, and how well they separate
+near-duplicate requests (typos, casing, punctuation) from unrelated ones.
+
+Run with: python benchmarks/bench_hashing_vectorizers.py
+"""
+
+import random
+import time
+
+import numpy as np
+
+from cachelm.vectorizers.hashing import HashingVectorizer, SimHashVectorizer
+
+TOPICS = [
+    "How do I reset my password",
+    "What is the refund policy for annual plans",
+    "Can I export my invoices as CSV",
+    "Why is the dashboard loading slowly",
+    "How do I invite a teammate to my workspace",
+    "Where can I change the billing address",
+    "Does the API support pagination",
+    "How do I delete my account",
+]
+
+
+def perturb(text: str, rng: random.Random) -> str:
+    """
+    A near-duplicate of text: changed casing, punctuation, or a swapped pair of letters.
+    """
+    choice = rng.randrange(3)
+    if choice == 0:
+        return text.lower() + "??"
+    if choice == 1:
+        return text.upper() + "!"
+    i = rng.randrange(1, len(text) - 2)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2 :] + "?"
+
+
+def best_of(function, repeat: int = 7) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    rng = random.Random(0)
+    vectorizers = [HashingVectorizer(), SimHashVectorizer()]
+
+    print(f"{'vectorizer':<22} {'batch':>6} {'ms':>8} {'µs/text':>8}")
+    for vectorizer in vectorizers:
+        for batch in (1, 16, 256):
+            texts = [f"{rng.choice(TOPICS)} (ticket {i})?" for i in range(batch)]
+            elapsed = best_of(lambda: vectorizer.embed_many(texts))
+            print(
+                f"{vectorizer.model_name:<22} {batch:>6} {elapsed * 1e3:>8.2f} "
+                f"{elapsed / batch * 1e6:>8.1f}"
+            )
+
+    print()
+    print(f"{'vectorizer':<22} {'near-dup cos':>13} {'unrelated cos':>14}")
+    originals = [topic + "?" for topic in TOPICS]
+    duplicates = [perturb(topic, rng) for topic in TOPICS]
+    for vectorizer in vectorizers:
+        a = np.array(vectorizer.embed_many(originals))
+        b = np.array(vectorizer.embed_many(duplicates))
+        similarities = a @ b.T
+        near = np.diag(similarities).mean()
+        unrelated = similarities[~np.eye(len(TOPICS), dtype=bool)].mean()
+        print(f"{vectorizer.model_name:<22} {near:>13.3f} {unrelated:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
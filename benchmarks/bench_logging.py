@@ -0,0 +1,65 @@
+"""
+Microbenchmark of the logging done on every request, eager f-strings vs `log_hot`, with INFO
+filtered out, logged to a sink, and logged with sampling.
+
+Run with: python benchmarks/bench_logging.py
+"""
+
+import io
+import timeit
+
+from loguru import logger
+
+from cachelm.utils.chat_history import Message
+from cachelm.utils.log import configure_hot_path_logging, log_hot
+
+
+def eager(history: list[Message], response: Message, response_str: str):
+    logger.info("Setting history")
+    logger.info(f"Writing to Chroma: {history} -> {response}")
+    logger.info(f"Distance: {0.04}")
+    logger.info(f"Found in Chroma: {response_str[:100]}...")
+    logger.info("Found cached response")
+
+
+def lazy(history: list[Message], response: Message, response_str: str):
+    log_hot("INFO", "Setting history")
+    log_hot("INFO", "Writing to Chroma: {} -> {}", history, response)
+    log_hot("INFO", "Distance: {}", 0.04)
+    log_hot("INFO", "Found in Chroma: {}", response_str)
+    log_hot("INFO", "Found cached response")
+
+
+def main():
+    history = [
+        Message("user" if i % 2 == 0 else "assistant", "Tell me more. " * 40)
+        for i in range(20)
+    ]
+    response = Message("assistant", "Here is a detailed answer. " * 80)
+    response_str = response.to_json_str()
+    number = 2000
+    print(f"{'logging':>16} {'eager us':>9} {'lazy us':>8}")
+    for name, level, sample_rate in (
+        ("INFO filtered", "WARNING", 1.0),
+        ("INFO logged", "INFO", 1.0),
+        ("INFO sampled 10%", "INFO", 0.1),
+    ):
+        logger.remove()
+        logger.add(io.StringIO(), level=level)
+        results = []
+        for log in (eager, lazy):
+            configure_hot_path_logging(sample_rate=sample_rate)
+            best = min(
+                timeit.repeat(
+                    lambda: log(history, response, response_str),
+                    number=number,
+                    repeat=5,
+                )
+            )
+            results.append(best / number * 1e6)
+        print(f"{name:>16} {results[0]:>9.1f} {results[1]:>8.1f}")
+    configure_hot_path_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark of the ProcessPoolVectorizer transport: texts and float32 vectors through shared memory,
+against a `multiprocessing.Pool` pickling the texts and the lists of floats.
+
+The vectorizer returns constant 768-dimensional vectors, so the numbers measure the cost of moving
+texts and vectors between processes, not inference. Throughput gains of the pool itself depend on
+the number of cores: run it on the target machine with a real model to size `workers`.
+
+Run with: python benchmarks/bench_process_pool.py
+"""
+
+import multiprocessing
+import time
+
+from loguru import logger
+
+from cachelm.vectorizers.process_pool import ProcessPoolVectorizer
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+DIMENSION = 768
+
+
+class ConstantVectorizer(Vectorizer):
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, text):
+        return [[0.5] * DIMENSION for _ in text]
+
+
+_pool_vectorizer = None
+
+
+def _pool_embed_many(texts):
+    global _pool_vectorizer
+    if _pool_vectorizer is None:
+        _pool_vectorizer = ConstantVectorizer()
+    return _pool_vectorizer.embed_many(texts)
+
+
+def best_of(function, repeat: int = 7) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    logger.remove()
+    vectorizer = ProcessPoolVectorizer(ConstantVectorizer, workers=1)
+    vectorizer.start()
+    pool = multiprocessing.get_context("spawn").Pool(1)
+    print(f"{'batch':>6} {'pickled ms':>11} {'shared ms':>10} {'speedup':>8}")
+    try:
+        for batch in (1, 8, 64, 512):
+            texts = [f"a message to embed, number {i}" * 4 for i in range(batch)]
+            calls = max(1, 2048 // batch)
+            vectorizer.embed_many(texts)
+            pool.apply(_pool_embed_many, (texts,))
+            pickled = best_of(
+                lambda: [pool.apply(_pool_embed_many, (texts,)) for _ in range(calls)]
+            )
+            shared = best_of(
+                lambda: [vectorizer.embed_many(texts) for _ in range(calls)]
+            )
+            print(
+                f"{batch:>6} {pickled / calls * 1e3:>11.3f} {shared / calls * 1e3:>10.3f}"
+                f" {pickled / shared:>7.2f}x"
+            )
+    finally:
+        pool.close()
+        vectorizer.close()
+
+
+if __name__ == "__main__":
+    main()
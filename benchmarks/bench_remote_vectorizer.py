@@ -0,0 +1,66 @@
+"""
+Benchmark of the RemoteVectorizer round trip against embedding in process.
+
+The vectorizer returns constant 768-dimensional vectors, so the numbers measure the overhead of the
+Unix socket transport (framing, float32 vectors, pooled connections), not inference.
+
+Run with: python benchmarks/bench_remote_vectorizer.py
+"""
+
+import os
+import tempfile
+import timeit
+
+from loguru import logger
+
+from cachelm.vectorizers.remote import EmbeddingServer, RemoteVectorizer
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+DIMENSION = 768
+
+
+class ConstantVectorizer(Vectorizer):
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, text):
+        return [[0.5] * DIMENSION for _ in text]
+
+
+def main():
+    logger.remove()
+    local = ConstantVectorizer()
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "embeddings.sock")
+        server = EmbeddingServer(ConstantVectorizer(), socket_path, max_wait_ms=0)
+        server.start()
+        remote = RemoteVectorizer(socket_path)
+        print(f"{'batch':>6} {'local us':>9} {'remote us':>10} {'overhead us':>12}")
+        try:
+            for batch in (1, 4, 16, 64):
+                texts = [f"a message to embed, number {i}" for i in range(batch)]
+                number = max(50, 4000 // batch)
+                timings = {}
+                for name, vectorizer in (("local", local), ("remote", remote)):
+                    timings[name] = (
+                        min(
+                            timeit.repeat(
+                                lambda: vectorizer.embed_many(texts),
+                                number=number,
+                                repeat=5,
+                            )
+                        )
+                        / number
+                        * 1e6
+                    )
+                print(
+                    f"{batch:>6} {timings['local']:>9.1f} {timings['remote']:>10.1f}"
+                    f" {timings['remote'] - timings['local']:>12.1f}"
+                )
+        finally:
+            remote.close()
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
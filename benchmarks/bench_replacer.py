@@ -0,0 +1,53 @@
+"""
+Microbenchmark of the Replacer middleware with a large replacement list, sequential vs compiled.
+
+Run with: python benchmarks/bench_replacer.py
+"""
+
+import random
+import timeit
+
+from cachelm.middlewares.replacer import Replacement, Replacer
+from cachelm.utils.chat_history import ChatHistory, Message
+
+
+def main():
+    random.seed(0)
+    history = ChatHistory()
+    print(f"{'rules':>6} {'sequential us':>14} {'compiled us':>12} {'compile ms':>11}")
+    for count in (10, 100, 1000, 5000):
+        replacements = [
+            Replacement(f"{{{{entity_{i}}}}}", f"Customer {i:05d}")
+            for i in range(count)
+        ] + [Replacement(f"{{{{sku_{i}}}}}", f"SKU-{i:06d}") for i in range(count)]
+        words = ["order", "status", "refund", "shipping", "please", "the", "is"]
+        content = " ".join(
+            (
+                f"Customer {random.randrange(count):05d}"
+                if random.random() < 0.05
+                else random.choice(words)
+            )
+            for _ in range(400)
+        )
+        sequential = Replacer(replacements)
+        start = timeit.default_timer()
+        compiled = Replacer(replacements, compiled=True)
+        compile_ms = (timeit.default_timer() - start) * 1e3
+        number = max(10, 20000 // count)
+        results = []
+        for replacer in (sequential, compiled):
+            best = min(
+                timeit.repeat(
+                    lambda: replacer.pre_cache_save(Message("user", content), history),
+                    number=number,
+                    repeat=5,
+                )
+            )
+            results.append(best / number * 1e6)
+        print(
+            f"{2 * count:>6} {results[0]:>14.1f} {results[1]:>12.1f} {compile_ms:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Microbenchmark of the per-request conversion path of a cache lookup, without the database:
+converting the OpenAI messages, setting the history, applying the middlewares, taking the
+window and formatting it as the databases do, with and without a Replacer middleware.
+The write path formats the same window again, which is measured separately.
+
+Run with: python benchmarks/bench_request_conversion.py
+"""
+
+import timeit
+
+import openai
+from loguru import logger
+
+from cachelm.adaptors.openai.sync_openai import SyncOpenAIAdaptor
+from cachelm.databases.database import Database
+from cachelm.middlewares.replacer import Replacement, Replacer
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+
+class NullVectorizer(Vectorizer):
+    def embed(self, text):
+        return [0.0]
+
+    def embed_many(self, text):
+        return [[0.0] for _ in text]
+
+
+class FormattingDatabase(Database):
+    """
+    Database formatting the window like the real backends do, and never hitting.
+    """
+
+    def connect(self) -> bool:
+        return True
+
+    def reset(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def write(self, history, response, namespace=None):
+        pass
+
+    def find(self, history, namespace=None):
+        "\n".join([msg.to_formatted_str() for msg in history])
+        return None
+
+    def size(self) -> int:
+        return 0
+
+
+def make_messages(turns: int) -> list[dict]:
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for i in range(turns):
+        messages.append(
+            {"role": "user", "content": f"Question {i}: what is {i} times {i + 1}?"}
+        )
+        messages.append(
+            {
+                "role": "assistant",
+                "content": f"{i} times {i + 1} is {i * (i + 1)}.",
+            }
+        )
+    messages.append({"role": "user", "content": "And what about 7 times 8?"})
+    return messages
+
+
+def main():
+    # Logging is measured separately, keep the conversion path alone
+    logger.remove()
+    configurations = {
+        "default": [],
+        "replacer(50)": [
+            Replacer([Replacement(f"{{{{name_{i}}}}}", f"Name{i}") for i in range(50)])
+        ],
+    }
+    print(f"{'middlewares':<13} {'turns':>6} {'us/request':>11} {'us/reformat':>11}")
+    for name, middlewares in configurations.items():
+        adaptor = SyncOpenAIAdaptor(
+            module=openai.OpenAI(api_key="sk-test"),
+            database=FormattingDatabase(NullVectorizer(window_size=4)),
+            middlewares=middlewares,
+        )
+        for turns in (2, 10, 50):
+            kwargs = {"model": "gpt-4o", "messages": make_messages(turns)}
+            number = 2000
+            best = min(
+                timeit.repeat(
+                    lambda: adaptor._lookup_chat(kwargs), number=number, repeat=15
+                )
+            )
+            window = adaptor.history.get_messages(adaptor.window_size)
+            format_best = min(
+                timeit.repeat(
+                    lambda: "\n".join([msg.to_formatted_str() for msg in window]),
+                    number=number,
+                    repeat=15,
+                )
+            )
+            print(
+                f"{name:<13} {turns:>6} {best / number * 1e6:>11.2f} "
+                f"{format_best / number * 1e6:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Microbenchmark of the serialization of cached responses.
+
+Measures encode and decode time and stored bytes per entry for every codec, for a short
+answer and a long answer with tool calls, as binary payloads and as the text stored by
+string-based databases.
+
+Run with: python benchmarks/bench_serializer.py
+"""
+
+import timeit
+
+from cachelm.utils.chat_history import Message, MessageSerializer, ToolCall
+
+MESSAGES = {
+    "short": Message(role="assistant", content="The capital of France is Paris."),
+    "long": Message(
+        role="assistant",
+        content=" ".join(
+            f"Paragraph {i}: the quick brown fox jumps over the lazy dog."
+            for i in range(300)
+        ),
+        tool_calls=[
+            ToolCall("get_weather", '{"city": "Paris", "unit": "celsius"}'),
+            ToolCall("get_time", '{"timezone": "Europe/Paris"}'),
+        ],
+    ),
+}
+
+SERIALIZERS = {
+    "to_json_str": None,
+    "json": ("json", None),
+    "orjson": ("orjson", None),
+    "msgpack": ("msgpack", None),
+    "orjson+zstd": ("orjson", 1024),
+    "msgpack+zstd": ("msgpack", 1024),
+}
+
+
+def measure(function, number: int = 20000) -> float:
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    print(
+        f"{'message':<8} {'serializer':<14} {'enc us':>8} {'dec us':>8} "
+        f"{'bytes':>7} {'text bytes':>10}"
+    )
+    for message_name, message in MESSAGES.items():
+        for name, config in SERIALIZERS.items():
+            if config is None:
+                encoded = text = message.to_json_str()
+                encode = lambda: message.to_json_str()
+                decode = lambda: Message.from_json_str(encoded)
+            else:
+                try:
+                    serializer = MessageSerializer(*config)
+                except ImportError as e:
+                    print(f"{message_name:<8} {name:<14} skipped: {e}")
+                    continue
+                encoded = serializer.dumps(message)
+                text = serializer.dumps_text(message)
+                encode = lambda: serializer.dumps(message)
+                decode = lambda: MessageSerializer.loads(encoded)
+            print(
+                f"{message_name:<8} {name:<14} {measure(encode):>8.2f} "
+                f"{measure(decode):>8.2f} {len(encoded):>7} {len(text):>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Microbenchmark of the Skipper middleware with many patterns: the previous `re.search` loop over
+raw pattern strings against the compiled alternation.
+
+Run with: python benchmarks/bench_skipper.py
+"""
+
+import random
+import re
+import timeit
+
+from cachelm.middlewares.skipper import Skipper
+from cachelm.utils.chat_history import ChatHistory, Message
+
+
+def search_loop(patterns: list[str], content: str) -> bool:
+    """
+    Pattern matching of Skipper before compilation.
+    """
+    for pattern in patterns:
+        if re.search(pattern, content):
+            return True
+    return False
+
+
+def main():
+    random.seed(0)
+    history = ChatHistory()
+    words = ["order", "status", "refund", "shipping", "please", "the", "is"]
+    content = " ".join(random.choice(words) for _ in range(400))
+    families = {
+        # Rules starting with literal text
+        "literal": lambda i: rf"internal_ticket_{i}\d+",
+        # Rules starting with a group
+        "group": lambda i: rf"(?:secret|private)[-_]key[-_]{i}",
+        # Rules with a backreference, searched one by one
+        "backref": lambda i: rf"(\w+)_{i} \1",
+    }
+    print(
+        f"{'family':<8} {'patterns':>8} {'loop us':>10} {'compiled us':>12} "
+        f"{'compile ms':>11}"
+    )
+    for family, make_pattern in families.items():
+        for count in (10, 100, 1000):
+            patterns = [make_pattern(i) for i in range(count)]
+            start = timeit.default_timer()
+            skipper = Skipper(patterns=patterns)
+            compile_ms = (timeit.default_timer() - start) * 1e3
+            message = Message("assistant", content)
+            number = max(5, 5000 // count)
+            loop = min(
+                timeit.repeat(
+                    lambda: search_loop(patterns, content), number=number, repeat=5
+                )
+            )
+            compiled = min(
+                timeit.repeat(
+                    lambda: skipper.pre_cache_save(message, history),
+                    number=number,
+                    repeat=5,
+                )
+            )
+            print(
+                f"{family:<8} {count:>8} {loop / number * 1e6:>10.1f} "
+                f"{compiled / number * 1e6:>12.1f} {compile_ms:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
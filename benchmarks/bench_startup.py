@@ -0,0 +1,127 @@
+"""
+Startup benchmark: import times of the cachelm modules, and the time until an adaptor is constructed
+and until it serves its first request, with a blocking or a background startup.
+
+The database connection (0.5s) and the model load (1s, paid on the first embedding) are simulated.
+Known model dimensions skip the probing embedding databases like Qdrant run on connect.
+
+Run with: python benchmarks/bench_startup.py
+"""
+
+import subprocess
+import sys
+import time
+
+import openai
+from loguru import logger
+
+from cachelm.adaptors.openai.sync_openai import SyncOpenAIAdaptor
+from cachelm.databases.database import Database
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+CONNECT_TIME = 0.5
+MODEL_LOAD_TIME = 1.0
+
+MODULES = [
+    "openai",
+    "cachelm.adaptors.openai.sync_openai",
+    "cachelm.vectorizers.fastembed",
+    "cachelm.databases.qdrant",
+]
+
+
+class SimulatedVectorizer(Vectorizer):
+    def __init__(self, model_name: str | None):
+        super().__init__()
+        self.model_name = model_name
+        self.loaded = False
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, text):
+        if not self.loaded:
+            time.sleep(MODEL_LOAD_TIME)
+            self.loaded = True
+        return [[1.0] * 768 for _ in text]
+
+
+class SimulatedDatabase(Database):
+    """
+    Database probing the vectorizer dimension on connect, like QdrantDatabase creating its collection.
+    """
+
+    def connect(self) -> bool:
+        time.sleep(CONNECT_TIME)
+        self.vectorizer.embedding_dimension()
+        return True
+
+    def disconnect(self):
+        pass
+
+    def reset(self):
+        pass
+
+    def write(self, history, response, namespace=None):
+        self.vectorizer.embed_many([m.content for m in history])
+
+    def find(self, history, namespace=None):
+        self.vectorizer.embed_many([m.content for m in history])
+        return None
+
+    def size(self) -> int:
+        return 0
+
+
+def import_time(module: str) -> float:
+    timings = []
+    for _ in range(5):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", f"import {module}"], capture_output=True
+        )
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            return float("nan")
+    return min(timings)
+
+
+def startup(model_name: str | None, **kwargs) -> tuple[float, float]:
+    start = time.perf_counter()
+    adaptor = SyncOpenAIAdaptor(
+        module=openai.OpenAI(api_key="sk-test"),
+        database=SimulatedDatabase(SimulatedVectorizer(model_name)),
+        **kwargs,
+    )
+    constructed = time.perf_counter() - start
+    adaptor._preprocess_chat(
+        model="gpt-4o", messages=[{"role": "user", "content": "Hello"}]
+    )
+    first_request = time.perf_counter() - start
+    adaptor.dispose()
+    return constructed, first_request
+
+
+def main():
+    logger.remove()
+    print(f"{'import':<40} {'seconds':>8}")
+    for module in MODULES:
+        print(f"{module:<40} {import_time(module):>8.3f}")
+
+    print()
+    print(f"{'startup':<40} {'init s':>8} {'1st req s':>10}")
+    cases = {
+        "blocking, dimension probed": (None, {}),
+        "blocking, known dimension": ("BAAI/bge-base-en", {}),
+        "background + warm-up": (
+            "BAAI/bge-base-en",
+            {"connect_in_background": True, "warm_up": True},
+        ),
+    }
+    for name, (model_name, kwargs) in cases.items():
+        constructed, first_request = startup(model_name, **kwargs)
+        print(f"{name:<40} {constructed:>8.3f} {first_request:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import math
+import random
+import time
 from typing import TypeVar, Generic
 from cachelm.databases.database import Database
 from loguru import logger
@@ -8,7 +13,10 @@ from cachelm.middlewares.deduper import Deduper
 from cachelm.middlewares.middleware import Middleware
 from cachelm.utils.async_wrap import async_wrap
 from cachelm.utils.chat_history import ChatHistory, Message
-from threading import Thread
+from cachelm.utils.circuit_breaker import CircuitBreaker
+from cachelm.utils.metrics import Metrics, timer
+from cachelm.utils.namespace import PartitionBy, namespace_from_kwargs
+from threading import Event, Lock, Thread
 
 T = TypeVar("T")
 
@@ -23,9 +31,17 @@ class Adaptor(ABC, Generic[T]):
         module: T,
         database: Database,
         dispose_on_sigint: bool = False,
-        middlewares: list[Middleware] = [],
+        middlewares: list[Middleware] | None = None,
         dedupe: bool = True,
         ignore_system_messages: bool = True,
+        partition_by: PartitionBy | None = None,
+        lookup_timeout: float | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        connect_in_background: bool = False,
+        warm_up: bool = False,
+        metrics: Metrics | None = None,
+        shadow: bool = False,
+        shadow_sample_rate: float = 1.0,
     ):
         """
         Initialize the adaptor with a module, database, and configuration options.
@@ -39,12 +55,39 @@ class Adaptor(ABC, Generic[T]):
             dedupe: If True, apply deduplication middleware (default: True).
             max_db_rows: Maximum number of rows in the database (default: 0, meaning no limit).
             ignore_system_messages: If True, ignore system messages in the chat history when saving and retrieving messages (default: True).
-        """
+            partition_by: Request keyword arguments (e.g. ["model", "temperature", "tools"]) or a callable
+                mapping the request kwargs to a namespace. Each namespace is stored in its own
+                partition of the database, so lookups only scan entries created with the same
+                parameters (default: None, a single shared partition).
+            lookup_timeout: Latency budget of a cache lookup in seconds. Lookups taking longer are
+                abandoned and the request goes upstream (default: None, no budget).
+            circuit_breaker: Circuit breaker bypassing the cache while the database fails or is slow.
+                If it has no probe, the database is probed with `size()` under the lookup budget (default: None).
+            connect_in_background: If True, the database is connected (and the vectorizer warmed up) in a
+                background thread, and requests bypass the cache until it's ready (default: False).
+            warm_up: If True, the vectorizer embeds a dummy text once connected, so the model is loaded
+                before the first request instead of during it (default: False).
+            metrics: Registry recording the duration of each lookup and write stage, and the
+                `lookup_stats` counters (default: None, no metrics).
+            shadow: If True, cached responses are never served: every request goes upstream, while the
+                cache is looked up in a background thread to measure the would-be hits, and the
+                responses keep populating the cache. See `shadow_report` (default: False).
+            shadow_sample_rate: Share of the requests looked up in shadow mode (default: 1.0, all of them).
+        """
+        middlewares = [] if middlewares is None else middlewares
         self._validate_inputs(
             database,
             middlewares,
             dedupe,
             ignore_system_messages,
+            partition_by,
+            lookup_timeout,
+            circuit_breaker,
+            connect_in_background,
+            warm_up,
+            metrics,
+            shadow,
+            shadow_sample_rate,
         )
         self._initialize_attributes(
             module,
@@ -52,7 +95,47 @@ class Adaptor(ABC, Generic[T]):
             middlewares,
             dedupe,
             ignore_system_messages,
+            partition_by,
+            lookup_timeout,
+            circuit_breaker,
+        )
+        self.warm_up = warm_up
+        self.metrics = metrics
+        self.shadow = shadow
+        self.shadow_sample_rate = shadow_sample_rate
+        self.shadow_stats = {
+            "requests": 0,
+            "sampled": 0,
+            "dropped": 0,
+            "bypassed": 0,
+            "lookups": 0,
+            "errors": 0,
+            "would_hit": 0,
+            "compared": 0,
+            "identical_answers": 0,
+            "answer_similarity_sum": 0.0,
+            "lookup_seconds_sum": 0.0,
+        }
+        self._shadow_lock = Lock()
+        self._shadow_pending = 0
+        # Shadow lookup of the request being served, consumed when its response is written
+        self._shadow_lookup: Future | None = None
+        # A single worker runs the shadow tasks in order: a response is written after its lookup
+        self._shadow_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="cachelm-shadow")
+            if shadow
+            else None
         )
+        self.startup_error: Exception | None = None
+        self._ready = Event()
+        self._startup_thread: Thread | None = None
+        if connect_in_background:
+            self._startup_thread = Thread(
+                target=self._start_in_background, name="cachelm-startup", daemon=True
+            )
+            self._startup_thread.start()
+        else:
+            self._start()
         if dispose_on_sigint:
             signal.signal(signal.SIGINT, self._handle_sigint)
 
@@ -70,6 +153,14 @@ class Adaptor(ABC, Generic[T]):
         middlewares: list[Middleware],
         dedupe: bool,
         ignore_system_messages: bool = True,
+        partition_by: PartitionBy | None = None,
+        lookup_timeout: float | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        connect_in_background: bool = False,
+        warm_up: bool = False,
+        metrics: Metrics | None = None,
+        shadow: bool = False,
+        shadow_sample_rate: float = 1.0,
     ):
         """
         Validate the inputs for the adaptor.
@@ -85,6 +176,34 @@ class Adaptor(ABC, Generic[T]):
             raise TypeError("Dedupe must be a boolean value")
         if not isinstance(ignore_system_messages, bool):
             raise TypeError("ignore_system_messages must be a boolean value")
+        if partition_by is not None and not callable(partition_by):
+            if isinstance(partition_by, str) or not all(
+                isinstance(key, str) for key in partition_by
+            ):
+                raise TypeError(
+                    "partition_by must be a list of keyword argument names or a callable"
+                )
+        if lookup_timeout is not None and (
+            not isinstance(lookup_timeout, (int, float)) or lookup_timeout <= 0
+        ):
+            raise TypeError("lookup_timeout must be a positive number of seconds")
+        if circuit_breaker is not None and not isinstance(
+            circuit_breaker, CircuitBreaker
+        ):
+            raise TypeError("circuit_breaker must be an instance of CircuitBreaker")
+        if not isinstance(connect_in_background, bool):
+            raise TypeError("connect_in_background must be a boolean value")
+        if not isinstance(warm_up, bool):
+            raise TypeError("warm_up must be a boolean value")
+        if metrics is not None and not isinstance(metrics, Metrics):
+            raise TypeError("metrics must be an instance of Metrics")
+        if not isinstance(shadow, bool):
+            raise TypeError("shadow must be a boolean value")
+        if (
+            not isinstance(shadow_sample_rate, (int, float))
+            or not 0 < shadow_sample_rate <= 1
+        ):
+            raise TypeError("shadow_sample_rate must be a number in (0, 1]")
 
     def _initialize_attributes(
         self,
@@ -93,24 +212,96 @@ class Adaptor(ABC, Generic[T]):
         middlewares: list[Middleware],
         dedupe: bool,
         ignore_system_messages: bool = True,
+        partition_by: PartitionBy | None = None,
+        lookup_timeout: float | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
     ):
         """
         Initialize the attributes for the adaptor.
         """
-        success = database.connect()
-        if not success:
-            raise Exception("Failed to connect to the database")
-        logger.info("Connected to the database")
         self.database = database
         self.module = module
         self.history = ChatHistory()
         self.window_size = database.vectorizer.window_size
-        self.middlewares = middlewares
+        # Copied so that the Deduper appended below doesn't leak into the caller's list
+        self.middlewares = list(middlewares)
         self.max_db_rows = database.max_size
         self.ignore_system_messages = ignore_system_messages
+        self.partition_by = (
+            partition_by
+            if partition_by is None or callable(partition_by)
+            else tuple(partition_by)
+        )
+        self.namespace: str | None = None
+        self.lookup_timeout = lookup_timeout
+        self.circuit_breaker = circuit_breaker
+        self.lookup_stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "not_ready": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "writes": 0,
+            "skipped_writes": 0,
+        }
+        self._lookup_executor = (
+            ThreadPoolExecutor(thread_name_prefix="cachelm-lookup")
+            if lookup_timeout is not None
+            else None
+        )
+        if circuit_breaker is not None:
+            # Backends log and swallow their errors, the breaker needs to see them
+            database.set_raise_errors(True)
+            if circuit_breaker.probe is None:
+                circuit_breaker.probe = self._probe_database
+        # Pre-cache outputs of history messages, keyed by message hash and pipeline version
+        self._middleware_memo: dict[tuple, tuple[str, str, Message]] = {}
+        self._middleware_version = 0
         if dedupe:
             self.middlewares.append(Deduper())
 
+    def _start(self):
+        """
+        Connect to the database and warm the vectorizer up if needed, then mark the cache ready.
+        """
+        success = self.database.connect()
+        if not success:
+            raise Exception("Failed to connect to the database")
+        logger.info("Connected to the database")
+        if self.warm_up:
+            start = time.monotonic()
+            self.database.vectorizer.embed_many(["cachelm warm-up"])
+            logger.info(f"Vectorizer warmed up in {time.monotonic() - start:.2f}s")
+        self._ready.set()
+
+    def _start_in_background(self):
+        try:
+            self._start()
+        except Exception as e:
+            self.startup_error = e
+            logger.error(f"Cache startup failed, requests will bypass the cache: {e}")
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether the database is connected and the cache is used.
+        """
+        return self._ready.is_set()
+
+    def wait_until_ready(self, timeout: float | None = None) -> bool:
+        """
+        Wait for a background startup to complete.
+        Args:
+            timeout: Maximum number of seconds to wait (default: None, no limit).
+        Returns:
+            bool: Whether the cache is ready. False if the startup failed.
+        """
+        if self._startup_thread is not None:
+            self._startup_thread.join(timeout)
+        return self.ready
+
     @abstractmethod
     def get_adapted(self) -> T:
         """
@@ -133,6 +324,21 @@ class Adaptor(ABC, Generic[T]):
         """
         self.history.set_messages(self._filter_out_system_messages(messages))
 
+    def set_namespace(self, request_kwargs: dict):
+        """
+        Set the cache namespace from the keyword arguments of the current request.
+        """
+        self.namespace = namespace_from_kwargs(request_kwargs, self.partition_by)
+
+    def _namespace_kwargs(self) -> dict:
+        """
+        Keyword arguments forwarded to the database so it can select the partition.
+        Empty when partitioning is disabled, which keeps custom databases without namespace support working.
+        """
+        if self.namespace is None:
+            return {}
+        return {"namespace": self.namespace}
+
     def add_user_message(self, message: Message):
         """
         Add a user message to the chat history.
@@ -162,41 +368,137 @@ class Adaptor(ABC, Generic[T]):
         Asynchronously add an assistant message to the chat history.
         Applies all middlewares to the message (pre-cache).
         """
+        with timer(self.metrics, "cachelm_stage", stage="write"):
+            self._write_assistant_message(message)
+
+    def _write_assistant_message(self, message: Message):
+        shadow_lookup, self._shadow_lookup = self._shadow_lookup, None
         try:
-            db_size = self.database.size() if self.max_db_rows > 0 else 0
-            if self.max_db_rows > 0 and db_size >= self.max_db_rows:
-                logger.warning(
-                    f"Database size {db_size} has reached the maximum limit of {self.max_db_rows}. "
-                    "Skipping saving the message to the database."
-                )
-                return
-            self._apply_pre_cache_to_history()
-            lastMessagesWindow = self.history.get_messages(self.window_size)
-            for middleware in self.middlewares:
-                message = middleware.pre_cache_save(message, self.history)
-                if message is None:
+            write = self._prepare_write(message)
+        except Exception as e:
+            logger.error(f"Error while adding assistant message: {e}")
+            write = None
+        if shadow_lookup is not None:
+            self._submit_shadow_task(
+                self._finish_shadow_lookup, shadow_lookup, message, write
+            )
+        elif write is not None:
+            self._write(*write)
+
+    def _capture_request(self) -> tuple:
+        """
+        Capture the window and namespace of the current request, so its response can be written
+        after other requests replaced them (e.g. concurrent async requests on the same adaptor).
+        Returns:
+            tuple: The window of history messages and the namespace kwargs, for `_prepare_write`.
+        """
+        return self.history.window(self.window_size), self._namespace_kwargs()
+
+    def _prepare_write(
+        self, message: Message, request: tuple | None = None
+    ) -> tuple | None:
+        """
+        Apply the pre-cache middlewares to a response and get what to write to the database.
+        Args:
+            message (Message): The response.
+            request (tuple | None): The request captured by `_capture_request`
+                (default: the current history and namespace).
+        Returns:
+            tuple | None: The window, the processed response and the namespace kwargs, or None if
+                the response is not written.
+        """
+        if not self._ready.is_set() or (
+            self.circuit_breaker is not None and self.circuit_breaker.is_open()
+        ):
+            self._count("skipped_writes")
+            return None
+        window, kwargs = request or (None, self._namespace_kwargs())
+        lastMessagesWindow = self._pre_cache_window(window)
+        for middleware in self.middlewares:
+            message = middleware.pre_cache_save(message, self.history)
+            if message is None:
+                return None
+        return lastMessagesWindow, message, kwargs
+
+    def _write(self, window: tuple[Message, ...], message: Message, kwargs: dict):
+        """
+        Write a prepared response, unless the database is full.
+        In shadow mode, runs on the shadow worker, off the request path.
+        """
+        try:
+            if self.max_db_rows > 0:
+                db_size = self.database.size()
+                if db_size >= self.max_db_rows:
+                    logger.warning(
+                        f"Database size {db_size} has reached the maximum limit of {self.max_db_rows}. "
+                        "Skipping saving the message to the database."
+                    )
                     return
-            self.database.write(lastMessagesWindow, message)
+            self.database.write(window, message, **kwargs)
+            self._count("writes")
         except Exception as e:
             logger.error(f"Error while adding assistant message: {e}")
-            return
 
-    def _apply_pre_cache_to_history(self):
+    MIDDLEWARE_MEMO_SIZE = 4096
+
+    def invalidate_middleware_cache(self):
         """
-        Apply pre-cache middlewares to the history.
-        This is used before saving the history to the database.
+        Forget the memoized middleware outputs.
+        Call it after changing the configuration of a middleware in place (e.g. its replacements).
+        Adding, removing or reordering middlewares is detected automatically.
         """
-        messages = self.history.messages
-        for i, message in enumerate(messages):
-            for middleware in self.middlewares:
-                newMessage = middleware.pre_cache_save(message, self.history)
-                if newMessage is not None:
-                    messages[i] = newMessage
-                else:
-                    break
-        # Set the modified messages back to the history
-        # This ensures that the history is updated with the pre-cache modifications
-        self.history.set_messages(messages)
+        self._middleware_version += 1
+        self._middleware_memo.clear()
+
+    def _pre_cache_window(
+        self, window: tuple[Message, ...] | None = None
+    ) -> tuple[Message, ...]:
+        """
+        Apply the pre-cache middlewares to the messages of the window used as the cache key
+        (default: the window of the current history).
+        Only the window is processed, and the history messages are left untouched: middlewares
+        work on copies. When every middleware is history independent, the output of each message
+        is memoized by content hash, so a message is processed once however many requests it's part of.
+        """
+        if window is None:
+            window = self.history.window(self.window_size)
+        if not self.middlewares:
+            return window
+        memoize = all(m.history_independent for m in self.middlewares)
+        pipeline = (self._middleware_version, tuple(map(id, self.middlewares)))
+        return tuple(
+            (
+                message
+                if message is ChatHistory.PAD
+                else self._pre_cache_history_message(message, pipeline, memoize)
+            )
+            for message in window
+        )
+
+    def _pre_cache_history_message(
+        self, message: Message, pipeline: tuple, memoize: bool
+    ) -> Message:
+        """
+        Run the pre-cache middlewares on a copy of a history message.
+        A middleware returning None leaves the message as the previous middlewares made it.
+        """
+        if memoize:
+            key = (pipeline, message.content_hash)
+            memoized = self._middleware_memo.get(key)
+            # Hashes can collide, the whole key (tool calls included) must match
+            if memoized is not None and memoized[0] == message.content_key:
+                return memoized[1]
+        processed = message.copy()
+        for middleware in self.middlewares:
+            output = middleware.pre_cache_save(processed, self.history)
+            if output is None:
+                break
+            processed = output
+        if memoize:
+            if len(self._middleware_memo) >= self.MIDDLEWARE_MEMO_SIZE:
+                self._middleware_memo.clear()
+            self._middleware_memo[key] = (message.content_key, processed)
+        return processed
 
     def _apply_post_cache_middlewares(self, message: Message):
         """
@@ -225,21 +527,224 @@ class Adaptor(ABC, Generic[T]):
 
         If the cache is empty, return None.
         If the cache is not empty, add it to the history.
-
+        In shadow mode, the lookup runs in the background and None is always returned.
         """
-        self._apply_pre_cache_to_history()
-        cache = self.database.find(self.history.get_messages(self.window_size))
+        if self.shadow:
+            self._start_shadow_lookup()
+            return None
+        with timer(self.metrics, "cachelm_stage", stage="get_cache"):
+            return self._get_cache()
+
+    def _get_cache(self):
+        with timer(self.metrics, "cachelm_stage", stage="pre_cache_middleware"):
+            window = self._pre_cache_window()
+        cache = self._find_in_database(window)
         if not cache:
             return None
+        self._count("hits")
 
         # Apply post-cache middlewares to the cache
-        cache = self._apply_post_cache_middlewares(cache)
+        with timer(self.metrics, "cachelm_stage", stage="post_cache_middleware"):
+            cache = self._apply_post_cache_middlewares(cache)
         if cache is None:
             return None
         # Add the cache to the history
         self.history.add_assistant_message(cache)
         return cache
 
+    def _find_in_database(self, window: list[Message]) -> Message | None:
+        """
+        Look the window up in the database, within the latency budget and circuit breaker.
+        Returns None when the lookup is bypassed, times out or fails, so the request goes upstream.
+        """
+        self._count("lookups")
+        if not self._ready.is_set():
+            self._count("not_ready")
+            return None
+        breaker = self.circuit_breaker
+        if breaker is not None and not breaker.allow():
+            self._count("bypassed")
+            return None
+        start = time.monotonic()
+        try:
+            with timer(self.metrics, "cachelm_stage", stage="lookup"):
+                if self._lookup_executor is None:
+                    cache = self.database.find(window, **self._namespace_kwargs())
+                else:
+                    future = self._lookup_executor.submit(
+                        self.database.find, window, **self._namespace_kwargs()
+                    )
+                    cache = future.result(timeout=self.lookup_timeout)
+        except FutureTimeoutError:
+            self._count("timeouts")
+            logger.warning(
+                f"Cache lookup exceeded its {self.lookup_timeout}s budget, going upstream"
+            )
+            if breaker is not None:
+                breaker.record_failure()
+            return None
+        except Exception as e:
+            self._count("errors")
+            logger.error(f"Error while looking up the cache: {e}")
+            if breaker is not None:
+                breaker.record_failure()
+            return None
+        if breaker is not None:
+            breaker.record_success(time.monotonic() - start)
+        if cache is None:
+            self._count("misses")
+        return cache
+
+    def _count(self, stat: str):
+        """
+        Increment a lookup statistic, and its "cachelm_<stat>_total" counter when metrics are enabled.
+        """
+        self.lookup_stats[stat] += 1
+        if self.metrics is not None:
+            self.metrics.increment(f"cachelm_{stat}_total")
+
+    def _count_shadow(self, stat: str, value: float = 1):
+        """
+        Increment a shadow statistic, and its "cachelm_shadow_<stat>_total" counter when metrics are enabled.
+        """
+        with self._shadow_lock:
+            self.shadow_stats[stat] += value
+        if self.metrics is not None:
+            self.metrics.increment(f"cachelm_shadow_{stat}_total", value)
+
+    def _submit_shadow_task(self, task, *args):
+        with self._shadow_lock:
+            self._shadow_pending += 1
+        return self._shadow_executor.submit(self._run_shadow_task, task, *args)
+
+    def _run_shadow_task(self, task, *args):
+        try:
+            return task(*args)
+        finally:
+            with self._shadow_lock:
+                self._shadow_pending -= 1
+
+    SHADOW_MAX_PENDING = 1000
+
+    def _start_shadow_lookup(self):
+        """
+        Schedule the lookup of the current request in the background, if it's sampled.
+        """
+        self._shadow_lookup = None
+        self._count_shadow("requests")
+        if not self._ready.is_set():
+            return
+        if self.circuit_breaker is not None and self.circuit_breaker.is_open():
+            self._count_shadow("bypassed")
+            return
+        if random.random() >= self.shadow_sample_rate:
+            return
+        if self._shadow_pending >= self.SHADOW_MAX_PENDING:
+            # The database can't keep up, don't let the backlog grow
+            self._count_shadow("dropped")
+            return
+        self._count_shadow("sampled")
+        self._shadow_lookup = self._submit_shadow_task(
+            self._shadow_find, self._pre_cache_window(), self._namespace_kwargs()
+        )
+
+    def _shadow_find(
+        self, window: tuple[Message, ...], kwargs: dict
+    ) -> tuple[Message, float] | None:
+        start = time.perf_counter()
+        try:
+            found = self.database.find_with_distance(window, **kwargs)
+        except Exception as e:
+            self._count_shadow("errors")
+            logger.error(f"Error while looking up the cache in shadow mode: {e}")
+            return None
+        elapsed = time.perf_counter() - start
+        self._count_shadow("lookups")
+        self._count_shadow("lookup_seconds_sum", elapsed)
+        if self.metrics is not None:
+            self.metrics.observe("cachelm_shadow_lookup_seconds", elapsed)
+        if found is not None:
+            self._count_shadow("would_hit")
+        return found
+
+    def _finish_shadow_lookup(self, lookup: Future, live: Message, write: tuple | None):
+        """
+        Compare the would-be cached response with the live one, or write the live one on a would-be miss.
+        Like outside shadow mode, would-be hits are not written again, so the cache doesn't fill up
+        with near-duplicates. Runs after the lookup on the shadow worker.
+        """
+        try:
+            found = lookup.result()
+        except Exception as e:
+            logger.error(f"Error while looking up the cache in shadow mode: {e}")
+            found = None
+        if found is not None:
+            try:
+                self._compare_shadow_answer(found[0], live)
+            except Exception as e:
+                logger.error(f"Error while comparing answers in shadow mode: {e}")
+            return
+        if write is not None:
+            self._write(*write)
+
+    def _compare_shadow_answer(self, cached: Message, live: Message):
+        if cached.content == live.content:
+            similarity = 1.0
+            self._count_shadow("identical_answers")
+        elif not cached.content or not live.content:
+            similarity = 0.0
+        else:
+            a, b = self.database.vectorizer.embed_many([cached.content, live.content])
+            norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(x * x for x in b))
+            similarity = sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+        self._count_shadow("compared")
+        self._count_shadow("answer_similarity_sum", similarity)
+        if self.metrics is not None:
+            self.metrics.observe("cachelm_shadow_answer_similarity", similarity)
+
+    def shadow_report(self) -> dict:
+        """
+        Summarize the shadow mode statistics.
+        Returns:
+            dict: The `shadow_stats` counters, with the would-hit rate of the sampled lookups, the mean
+                similarity between the would-be cached and the live responses, and the mean lookup latency.
+        """
+        with self._shadow_lock:
+            stats = dict(self.shadow_stats)
+            stats["pending"] = self._shadow_pending
+        lookups = stats["lookups"]
+        compared = stats["compared"]
+        stats["would_hit_rate"] = stats["would_hit"] / lookups if lookups else 0.0
+        stats["mean_answer_similarity"] = (
+            stats["answer_similarity_sum"] / compared if compared else None
+        )
+        stats["mean_lookup_ms"] = (
+            1000 * stats["lookup_seconds_sum"] / lookups if lookups else None
+        )
+        return stats
+
+    _PROBE_WINDOW = (Message("user", "cachelm health probe"),)
+
+    def _probe_database(self) -> bool:
+        """
+        Health probe used by the circuit breaker: a lookup succeeds within the lookup budget,
+        and isn't slower than the breaker's `slow_call_duration`. Errors are raised to the breaker.
+        """
+        start = time.monotonic()
+        if self._lookup_executor is None:
+            self.database.find_with_distance(self._PROBE_WINDOW)
+        else:
+            try:
+                self._lookup_executor.submit(
+                    self.database.find_with_distance, self._PROBE_WINDOW
+                ).result(timeout=self.lookup_timeout)
+            except FutureTimeoutError:
+                return False
+        slow_call_duration = self.circuit_breaker.slow_call_duration
+        return (
+            slow_call_duration is None or time.monotonic() - start <= slow_call_duration
+        )
+
     async def get_cache_async(self):
         """
         Asynchronously get the cache from the database.
@@ -248,11 +753,21 @@ class Adaptor(ABC, Generic[T]):
         If the cache is empty, return None.
         If the cache is not empty, add it to the history.
         """
+        if self.shadow:
+            # Only schedules the lookup, no need for a thread
+            return self.get_cache()
         return await async_wrap(self.get_cache)()
 
     def dispose(self):
         """
         Dispose of the adaptor.
         """
+        if self._startup_thread is not None:
+            self._startup_thread.join()
+        if self._shadow_executor is not None:
+            # Let the pending shadow lookups and writes finish
+            self._shadow_executor.shutdown(wait=True)
         self.database.disconnect()
+        if self._lookup_executor is not None:
+            self._lookup_executor.shutdown(wait=False)
         logger.info("Disconnected from the database")
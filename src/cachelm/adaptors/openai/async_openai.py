@@ -1,178 +1,316 @@
-from uuid import uuid4
+import asyncio
 import openai
-from openai.types.chat.chat_completion import ChatCompletion, Choice
-from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from openai.types.chat.chat_completion import ChatCompletion
 import openai.types.chat.chat_completion_chunk as chat_completion_chunk
-from typing import Any, Literal
+from typing import Any, Awaitable, Callable, Literal
 from cachelm.adaptors.adaptor import Adaptor
 from openai import NotGiven
 from loguru import logger
+from cachelm.utils.async_wrap import async_wrap
+from cachelm.utils.log import log_hot
 from cachelm.utils.chat_history import Message, ToolCall
-from openai.types.chat.chat_completion_message_tool_call import (
-    ChatCompletionMessageToolCall,
-    Function,
+from cachelm.utils.metrics import timer
+from cachelm.adaptors.openai.capture import StreamCapture
+from cachelm.adaptors.openai.replay import (
+    StreamReplayer,
+    build_chat_completion,
+    build_chat_completion_json,
 )
 
 
 class AsyncOpenAIAdaptor(Adaptor[openai.AsyncOpenAI]):
-    async def _preprocess_chat(self, *args, **kwargs) -> ChatCompletion | None:
+    def __init__(
+        self,
+        *args,
+        hedge: bool = False,
+        hedge_delay: float = 0.0,
+        stream_replay: StreamReplayer | None = None,
+        **kwargs,
+    ):
+        """
+        Initialize the AsyncOpenAIAdaptor.
+        Args:
+            *args: Positional arguments for the Adaptor.
+            hedge: If True, the upstream call is started speculatively while the cache lookup runs,
+                and whichever finishes first with a usable answer wins (default: False).
+            hedge_delay: Seconds to wait for the cache lookup before starting the speculative
+                upstream call (default: 0, start immediately).
+            stream_replay: How cached responses are replayed to streaming requests
+                (default: one word per chunk, no pacing).
+            **kwargs: Keyword arguments for the Adaptor.
+        """
+        if not isinstance(hedge, bool):
+            raise TypeError("hedge must be a boolean value")
+        if not isinstance(hedge_delay, (int, float)) or hedge_delay < 0:
+            raise TypeError("hedge_delay must be a non-negative number of seconds")
+        if stream_replay is not None and not isinstance(stream_replay, StreamReplayer):
+            raise TypeError("stream_replay must be an instance of StreamReplayer")
+        if hedge and kwargs.get("shadow", False):
+            raise ValueError(
+                "hedge and shadow can't be combined: shadow mode never serves cached responses"
+            )
+        super().__init__(*args, **kwargs)
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.stream_replay = stream_replay or StreamReplayer()
+        self.hedge_stats = {
+            "hedged_requests": 0,
+            "upstream_started": 0,
+            "cache_won": 0,
+            "upstream_won": 0,
+            "upstream_failed": 0,
+            "wasted_upstream_calls": 0,
+        }
+        self._background_tasks: set[asyncio.Task] = set()
+        if self.metrics is not None:
+            self.metrics.register_gauge(
+                "cachelm_background_tasks", lambda: len(self._background_tasks)
+            )
+
+    def _count_hedge(self, stat: str):
+        """
+        Increment a hedging statistic, and its "cachelm_hedge_<stat>_total" counter when metrics are enabled.
+        """
+        self.hedge_stats[stat] += 1
+        if self.metrics is not None:
+            self.metrics.increment(f"cachelm_hedge_{stat}_total")
+
+    async def _hedged_call(
+        self,
+        lookup: Awaitable[Any],
+        upstream: Callable[[], Awaitable[Any]],
+        on_upstream_response: Callable[[Any, "asyncio.Task | None"], Awaitable[Any]],
+    ) -> Any:
+        """
+        Race the cache lookup against a speculative upstream call.
+        Args:
+            lookup: The cache lookup, resolving to the cached response or None.
+            upstream: Starts the upstream call.
+            on_upstream_response: Post-processes an upstream response and returns what to serve.
+                Receives the lookup task when the lookup is still running, so the cache is only
+                written once the lookup is done.
+        Returns:
+            The cached response if the lookup hits first, the upstream response otherwise.
+        """
+        self._count_hedge("hedged_requests")
+        lookup_task = asyncio.ensure_future(lookup)
+        if self.hedge_delay > 0:
+            done, _ = await asyncio.wait({lookup_task}, timeout=self.hedge_delay)
+            if done:
+                cached = self._lookup_result(lookup_task)
+                if cached is not None:
+                    self._count_hedge("cache_won")
+                    return cached
+                return await on_upstream_response(await upstream(), None)
+
+        upstream_task = asyncio.ensure_future(upstream())
+        self._count_hedge("upstream_started")
+        done, _ = await asyncio.wait(
+            {lookup_task, upstream_task}, return_when=asyncio.FIRST_COMPLETED
+        )
+        if lookup_task in done:
+            cached = self._lookup_result(lookup_task)
+            if cached is not None:
+                self._count_hedge("cache_won")
+                self._count_hedge("wasted_upstream_calls")
+                upstream_task.cancel()
+                upstream_task.add_done_callback(self._close_cancelled_upstream)
+                return cached
+            try:
+                response = await upstream_task
+            except Exception:
+                self._count_hedge("upstream_failed")
+                raise
+            self._count_hedge("upstream_won")
+            return await on_upstream_response(response, None)
+
+        try:
+            response = upstream_task.result()
+        except Exception:
+            self._count_hedge("upstream_failed")
+            # The upstream call failed, the cache may still answer
+            await asyncio.wait({lookup_task})
+            cached = self._lookup_result(lookup_task)
+            if cached is not None:
+                self._count_hedge("cache_won")
+                return cached
+            raise
+        self._count_hedge("upstream_won")
+        return await on_upstream_response(response, lookup_task)
+
+    @staticmethod
+    def _lookup_result(lookup_task: asyncio.Task) -> Any:
+        """
+        Get the result of a finished lookup, a failed lookup counts as a miss.
+        """
+        try:
+            return lookup_task.result()
+        except Exception as e:
+            logger.error(f"Error while looking up the cache: {e}")
+            return None
+
+    @staticmethod
+    def _close_cancelled_upstream(upstream_task: asyncio.Task):
+        """
+        Close a stream opened by an upstream call that lost the race.
+        """
+        if upstream_task.cancelled() or upstream_task.exception() is not None:
+            return
+        response = upstream_task.result()
+        if isinstance(response, openai.AsyncStream):
+            asyncio.ensure_future(response.close())
+
+    def _run_in_background(self, coroutine: Awaitable[Any]):
+        """
+        Run a coroutine off the response path, keeping a reference until it's done.
+        """
+        task = asyncio.ensure_future(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _write_hedged(
+        self, message: Message, request: tuple, lookup_task: "asyncio.Task | None"
+    ):
+        """
+        Write the upstream response of a hedged request, once its lookup is done and unless it hit.
+        The write is prepared from the request captured when it started: by the time the lookup is
+        done, concurrent requests may have replaced the history and namespace of the adaptor.
+        """
+        try:
+            write = await async_wrap(self._prepare_write)(message, request)
+        except Exception as e:
+            logger.error(f"Error while adding assistant message: {e}")
+            return
+        if write is None:
+            return
+        if lookup_task is not None:
+            await asyncio.wait({lookup_task})
+            if self._lookup_result(lookup_task) is not None:
+                # The cache already holds an answer for this request
+                return
+        await async_wrap(self._timed_write)(write)
+
+    def _timed_write(self, write: tuple):
+        with timer(self.metrics, "cachelm_stage", stage="write"):
+            self._write(*write)
+
+    async def _postprocess_hedged_chat(
+        self,
+        completion: ChatCompletion,
+        lookup_task: "asyncio.Task | None",
+        request: tuple,
+    ) -> ChatCompletion:
+        """
+        Populate the cache with an upstream completion that won the race, once the lookup is done.
+        """
+        message = self._completion_message(completion)
+        if message is None:
+            return completion
+        if lookup_task is None:
+            await self._write_hedged(message, request, None)
+        else:
+            self._run_in_background(self._write_hedged(message, request, lookup_task))
+        return completion
+
+    def _set_request(self, kwargs: dict) -> tuple:
+        """
+        Set the history and namespace from the request.
+        Returns:
+            tuple: The captured request, to write its response after other requests replaced them.
+        """
         if kwargs.get("messages") is not None:
-            logger.info("Setting history")
-            messages = [
-                (
-                    msg
-                    if isinstance(msg, Message)
-                    else Message(
-                        role=msg.get("role", ""),
-                        content=msg.get("content", ""),
-                        tool_calls=msg.get("tool_calls"),
-                    )
-                )
-                for msg in kwargs["messages"]
-            ]
+            log_hot("INFO", "Setting history")
+            messages = [Message.from_openai(msg) for msg in kwargs["messages"]]
             self.set_history(messages)
+        self.set_namespace(kwargs)
+        return self._capture_request()
+
+    async def _lookup_chat(self, kwargs: dict) -> Message | None:
+        """
+        Set the history and namespace from the request, then look the request up in the cache.
+        """
+        self._set_request(kwargs)
+        return await self.get_cache_async()
+
+    async def _preprocess_chat(self, *args, **kwargs) -> ChatCompletion | None:
+        self._set_request(kwargs)
+        return await self._cached_chat(kwargs)
+
+    async def _cached_chat(self, kwargs: dict) -> ChatCompletion | None:
+        """
+        Look the current request up in the cache and build the completion of a hit.
+        """
         cached = await self.get_cache_async()
         if cached is not None:
-            logger.info("Found cached response")
-            res = ChatCompletion(
-                id=str(uuid4()),
-                choices=[
-                    Choice(
-                        index=0,
-                        finish_reason="stop",
-                        message=ChatCompletionMessage(
-                            role=cached.role,
-                            content=cached.content,
-                            tool_calls=(
-                                [
-                                    ChatCompletionMessageToolCall(
-                                        id=str(uuid4()),
-                                        function=Function(
-                                            name=tool_call.tool,
-                                            arguments=tool_call.args,
-                                        ),
-                                    )
-                                    for tool_call in cached.tool_calls
-                                ]
-                                if cached.tool_calls
-                                else None
-                            ),
-                        ),
-                    )
-                ],
-                created=0,
-                model=kwargs["model"],
-                object="chat.completion",
-            )
-            return res
+            log_hot("INFO", "Found cached response")
+            with timer(self.metrics, "cachelm_stage", stage="response"):
+                return build_chat_completion(cached, kwargs["model"])
         return None
 
+    async def cached_completion_json(self, **kwargs) -> bytes | None:
+        """
+        Look a chat completion request up in the cache and return the cached completion as JSON bytes.
+        Meant for proxies: no pydantic object is built on a hit, the bytes can be sent as the response body.
+        Args:
+            **kwargs: The keyword arguments of `chat.completions.create`.
+        Returns:
+            bytes | None: The JSON body of the completion, or None on a miss.
+        """
+        cached = await self._lookup_chat(kwargs)
+        if cached is None:
+            return None
+        with timer(self.metrics, "cachelm_stage", stage="response"):
+            return build_chat_completion_json(cached, kwargs["model"])
+
     async def _preprocess_streaming_chat_async(
         self, *args, **kwargs
     ) -> openai.AsyncStream[chat_completion_chunk.ChatCompletionChunk] | None:
-        if kwargs.get("messages") is not None:
-            logger.info("Setting history")
-            messages = [
-                (
-                    msg
-                    if isinstance(msg, Message)
-                    else Message(
-                        role=msg.get("role", ""),
-                        content=msg.get("content", ""),
-                        tool_calls=[
-                            ToolCall(
-                                tool_call.get("function", {}).get("name", ""),
-                                tool_call.get("function", {}).get("arguments", ""),
-                            )
-                            for tool_call in msg.get("tool_calls", [])
-                        ],
-                    )
-                )
-                for msg in kwargs["messages"]
-            ]
-            self.set_history(messages)
+        self._set_request(kwargs)
+        return await self._cached_stream(kwargs)
+
+    async def _cached_stream(
+        self, kwargs: dict
+    ) -> openai.AsyncStream[chat_completion_chunk.ChatCompletionChunk] | None:
+        """
+        Look the current request up in the cache and replay the response of a hit.
+        """
         cached = await self.get_cache_async()
         if cached is not None:
-            logger.info("Found cached response")
-
-            async def cached_iterator():
-                splitted_content = cached.content.split(" ")
-                for i in range(len(splitted_content)):
-                    content_chunk = " " + splitted_content[i]
-                    tool_calls = (
-                        [
-                            chat_completion_chunk.ChoiceDeltaToolCall(
-                                id=str(uuid4()),
-                                index=0,
-                                function=chat_completion_chunk.ChoiceDeltaToolCallFunction(
-                                    name=tool_call.tool,
-                                    arguments=tool_call.args,
-                                ),
-                            )
-                            for tool_call in cached.tool_calls
-                        ]
-                        if cached.tool_calls is not None
-                        and i == len(splitted_content) - 1
-                        else None
-                    )
-                    yield chat_completion_chunk.ChatCompletionChunk(
-                        id=str(uuid4()),
-                        choices=[
-                            chat_completion_chunk.Choice(
-                                index=0,
-                                finish_reason="stop",
-                                delta=chat_completion_chunk.ChoiceDelta(
-                                    role=cached.role,
-                                    content=content_chunk,
-                                    tool_calls=tool_calls,
-                                ),
-                            )
-                        ],
-                        created=0,
-                        model=kwargs["model"],
-                        object="chat.completion.chunk",
-                    )
-
-            return cached_iterator()
+            log_hot("INFO", "Found cached response")
+            return self.stream_replay.aiter_chunks(cached, kwargs["model"])
         return None
 
     async def _postprocess_streaming_chat_async(
-        self, response: openai.AsyncStream[chat_completion_chunk.ChatCompletionChunk]
+        self,
+        response: openai.AsyncStream[chat_completion_chunk.ChatCompletionChunk],
+        pending_lookup: "asyncio.Task | None" = None,
+        request: tuple | None = None,
     ) -> Any:
-        full_content = ""
-        tool_name = None
-        tool_params = ""
-        tool_calls = None
-        role = "assistant"
+        capture = StreamCapture(record_chunks=self.stream_replay.records_chunks)
         async for chunk in response:
-            if chunk.choices is None or len(chunk.choices) == 0:
-                logger.warning("No choices in completion, skipping postprocessing.")
-                yield chunk
-                continue
-            delta = chunk.choices[0].delta
-            if delta.content:
-                full_content += delta.content
-            if delta.tool_calls:
-                for tool_call in delta.tool_calls:
-                    if tool_call.function.name:
-                        tool_name = tool_call.function.name
-                    if tool_call.function.arguments:
-                        tool_params += tool_call.function.arguments
-            if delta.role:
-                role = delta.role
+            capture.add(chunk)
             yield chunk
-        if tool_name and tool_params:
-            tool_calls = [ToolCall(tool_name, tool_params)]
-        await self.add_assistant_message_async(
-            Message(role=role, content=full_content, tool_calls=tool_calls)
-        )
+        if request is not None:
+            # Hedged request
+            await self._write_hedged(capture.to_message(), request, pending_lookup)
+            return
+        await self.add_assistant_message_async(capture.to_message())
 
     async def _postprocess_chat(self, completion: ChatCompletion) -> None:
+        message_obj = self._completion_message(completion)
+        if message_obj is not None:
+            await self.add_assistant_message_async(message_obj)
+
+    @staticmethod
+    def _completion_message(completion: ChatCompletion) -> Message | None:
+        """
+        Get the message of the first choice of a completion, or None if it has no choices.
+        """
         if completion.choices is None or len(completion.choices) == 0:
             logger.warning("No choices in completion, skipping postprocessing.")
-            return
+            return None
         msg = completion.choices[0].message
-        message_obj = Message(
+        return Message(
             role=msg.role,
             content=msg.content,
             tool_calls=(
@@ -184,7 +322,6 @@ class AsyncOpenAIAdaptor(Adaptor[openai.AsyncOpenAI]):
                 else None
             ),
         )
-        await self.add_assistant_message_async(message_obj)
 
     def get_adapted(self) -> openai.AsyncOpenAI:
         base = self.module
@@ -193,6 +330,20 @@ class AsyncOpenAIAdaptor(Adaptor[openai.AsyncOpenAI]):
 
         class AdaptedCompletions(completions.__class__):
             async def create_with_stream(self, *args, stream: Literal[True], **kwargs):
+                if adaptorSelf.hedge:
+                    upstream = super().create
+                    request = adaptorSelf._set_request(kwargs)
+
+                    async def on_upstream_response(res, lookup_task):
+                        return adaptorSelf._postprocess_streaming_chat_async(
+                            res, pending_lookup=lookup_task, request=request
+                        )
+
+                    return await adaptorSelf._hedged_call(
+                        adaptorSelf._cached_stream(kwargs),
+                        lambda: upstream(*args, stream=stream, **kwargs),
+                        on_upstream_response,
+                    )
                 cached = await adaptorSelf._preprocess_streaming_chat_async(
                     *args, stream=stream, **kwargs
                 )
@@ -202,6 +353,16 @@ class AsyncOpenAIAdaptor(Adaptor[openai.AsyncOpenAI]):
                 return adaptorSelf._postprocess_streaming_chat_async(res)
 
             async def create_without_stream(self, *args, stream=NotGiven, **kwargs):
+                if adaptorSelf.hedge:
+                    upstream = super().create
+                    request = adaptorSelf._set_request(kwargs)
+                    return await adaptorSelf._hedged_call(
+                        adaptorSelf._cached_chat(kwargs),
+                        lambda: upstream(*args, **kwargs),
+                        lambda res, lookup_task: adaptorSelf._postprocess_hedged_chat(
+                            res, lookup_task, request
+                        ),
+                    )
                 cached = await adaptorSelf._preprocess_chat(
                     *args, stream=stream, **kwargs
                 )
@@ -0,0 +1,97 @@
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+from loguru import logger
+
+from cachelm.utils.chat_history import Message, ToolCall
+
+
+class _ToolCallAssembler:
+    """
+    Accumulates the deltas of a single streamed tool call.
+    """
+
+    def __init__(self):
+        self.name = ""
+        self.argument_parts: list[str] = []
+
+    def add(self, name: str | None, arguments: str | None):
+        if name:
+            self.name = name
+        if arguments:
+            self.argument_parts.append(arguments)
+
+    def to_tool_call(self) -> ToolCall:
+        return ToolCall(self.name, "".join(self.argument_parts))
+
+
+class StreamCapture:
+    """
+    Tee capturing a streamed chat completion while it's forwarded to the caller, to cache it once it ends.
+
+    Content deltas are appended to a list and joined once, so capturing a stream is linear in its length.
+    Tool calls are assembled per index, which keeps parallel tool calls apart.
+
+    Example:
+        capture = StreamCapture()
+        for chunk in stream:
+            capture.add(chunk)
+            yield chunk
+        message = capture.to_message()
+    """
+
+    def __init__(self, record_chunks: bool = False):
+        """
+        Initialize the capture.
+        Args:
+            record_chunks (bool): If True, the lengths of the content deltas are kept on the message,
+                so the stream can be replayed with its original boundaries (default: False).
+        """
+        self.record_chunks = record_chunks
+        self.role = "assistant"
+        self.content_parts: list[str] = []
+        self.tool_calls: dict[int, _ToolCallAssembler] = {}
+
+    def add(self, chunk: ChatCompletionChunk):
+        """
+        Capture a chunk of the stream. Only the first choice is captured.
+        """
+        choices = chunk.choices
+        if not choices:
+            logger.warning("No choices in completion, skipping postprocessing.")
+            return
+        choice = choices[0]
+        if choice.index != 0:
+            choice = next((c for c in choices if c.index == 0), None)
+            if choice is None:
+                return
+        delta = choice.delta
+        if delta.content:
+            self.content_parts.append(delta.content)
+        if delta.role:
+            self.role = delta.role
+        if delta.tool_calls:
+            for tool_call in delta.tool_calls:
+                assembler = self.tool_calls.get(tool_call.index)
+                if assembler is None:
+                    assembler = self.tool_calls[tool_call.index] = _ToolCallAssembler()
+                if tool_call.function is not None:
+                    assembler.add(tool_call.function.name, tool_call.function.arguments)
+
+    def to_message(self) -> Message:
+        """
+        Build the captured message.
+        """
+        tool_calls = [
+            self.tool_calls[index].to_tool_call()
+            for index in sorted(self.tool_calls)
+            if self.tool_calls[index].name
+        ]
+        return Message(
+            role=self.role,
+            content="".join(self.content_parts),
+            tool_calls=tool_calls or None,
+            chunk_lengths=(
+                [len(part) for part in self.content_parts]
+                if self.record_chunks
+                else None
+            ),
+        )
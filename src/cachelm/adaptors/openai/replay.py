@@ -0,0 +1,262 @@
+import asyncio
+import json
+import re
+import time
+from typing import AsyncIterator, Iterator, Literal
+from uuid import uuid4
+
+from openai.types.chat.chat_completion import ChatCompletion
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+
+from cachelm.utils.chat_history import Message
+
+
+def _new_ids(cached: Message) -> tuple[str, list[str]]:
+    """
+    Generate the ids of a replayed response: a single uuid per response, tool call ids derive from it.
+    """
+    token = uuid4().hex
+    completion_id = f"chatcmpl-{token}"
+    tool_call_ids = [
+        f"call_{token[:24]}{i}" for i in range(len(cached.tool_calls or []))
+    ]
+    return completion_id, tool_call_ids
+
+
+def _finish_reason(cached: Message) -> str:
+    return "tool_calls" if cached.tool_calls else "stop"
+
+
+def _chat_completion_dict(cached: Message, model: str) -> dict:
+    """
+    Build the plain dict body of a chat completion serving a cached message.
+    """
+    completion_id, tool_call_ids = _new_ids(cached)
+    message = {"role": cached.role, "content": cached.content, "refusal": None}
+    if cached.tool_calls:
+        message["tool_calls"] = [
+            {
+                "id": tool_call_id,
+                "type": "function",
+                "function": {"name": tool_call.tool, "arguments": tool_call.args},
+            }
+            for tool_call_id, tool_call in zip(tool_call_ids, cached.tool_calls)
+        ]
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": 0,
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": message,
+                "logprobs": None,
+                "finish_reason": _finish_reason(cached),
+            }
+        ],
+    }
+
+
+def build_chat_completion(cached: Message, model: str) -> ChatCompletion:
+    """
+    Build a ChatCompletion serving a cached message.
+    The completion is validated from a plain dict in a single pydantic-core call, instead of
+    instantiating every nested model one by one.
+    Args:
+        cached (Message): The cached response.
+        model (str): The model of the request.
+    Returns:
+        ChatCompletion: The completion to return to the caller.
+    """
+    return ChatCompletion.model_validate(_chat_completion_dict(cached, model))
+
+
+def build_chat_completion_json(cached: Message, model: str) -> bytes:
+    """
+    Serialize a cached message as the JSON body of a chat completion, without building any pydantic object.
+    Useful for proxies forwarding the bytes to their clients as is.
+    Args:
+        cached (Message): The cached response.
+        model (str): The model of the request.
+    Returns:
+        bytes: The UTF-8 encoded JSON body.
+    """
+    return json.dumps(_chat_completion_dict(cached, model)).encode()
+
+
+_WORD = re.compile(r"\s*\S+")
+
+
+def split_words(content: str) -> list[str]:
+    """
+    Split a text into words keeping their leading whitespace, so joining the pieces gives the text back.
+    Trailing whitespace is kept on the last piece.
+    """
+    pieces = _WORD.findall(content)
+    consumed = sum(len(piece) for piece in pieces)
+    if consumed < len(content):
+        if pieces:
+            pieces[-1] += content[consumed:]
+        else:
+            pieces.append(content[consumed:])
+    return pieces
+
+
+class StreamReplayer:
+    """
+    Replays a cached message as a stream of ChatCompletionChunk.
+
+    Chunking modes:
+        - "single": the whole content in one chunk, the cheapest option.
+        - "words": `chunk_size` words per chunk. A word is a rough stand-in for a token.
+        - "chars": `chunk_size` characters per chunk.
+        - "recorded": the chunk boundaries of the upstream stream, recorded when the response was
+          cached. Messages cached without boundaries are replayed as words.
+
+    The content is replayed exactly, whitespace included. Every chunk of a response shares the same id,
+    the role is only sent with the first chunk and the finish reason with the last one.
+
+    Example:
+        from cachelm.adaptors.openai.replay import StreamReplayer
+
+        adaptor = OpenAIAdaptor(
+            ...,
+            stream_replay=StreamReplayer(chunking="words", chunk_size=4, chunk_delay=0.01),
+        )
+    """
+
+    CHUNKINGS = ("single", "words", "chars", "recorded")
+
+    def __init__(
+        self,
+        chunking: Literal["single", "words", "chars", "recorded"] = "words",
+        chunk_size: int = 1,
+        chunk_delay: float = 0.0,
+    ):
+        """
+        Initialize the stream replayer.
+        Args:
+            chunking (str): How the cached content is split into chunks (default: "words").
+            chunk_size (int): Words or characters per chunk in "words" and "chars" modes (default: 1).
+            chunk_delay (float): Seconds to wait between two chunks, to pace the replay like a live
+                stream (default: 0, no pacing).
+        """
+        if chunking not in self.CHUNKINGS:
+            raise ValueError(f"Invalid chunking: {chunking}")
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+        if chunk_delay < 0:
+            raise ValueError("chunk_delay must be a non-negative number of seconds")
+        self.chunking = chunking
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+
+    @property
+    def records_chunks(self) -> bool:
+        """
+        Whether the chunk boundaries of upstream streams should be recorded when caching them.
+        """
+        return self.chunking == "recorded"
+
+    def split(self, cached: Message) -> list[str]:
+        """
+        Split the cached content into the contents of the chunks.
+        """
+        content = cached.content or ""
+        if not content:
+            return []
+        if self.chunking == "single":
+            return [content]
+        if self.chunking == "chars":
+            size = self.chunk_size
+            return [content[i : i + size] for i in range(0, len(content), size)]
+        if self.chunking == "recorded":
+            lengths = cached.chunk_lengths
+            # Middlewares may have changed the content since the boundaries were recorded
+            if lengths and sum(lengths) == len(content):
+                pieces = []
+                start = 0
+                for length in lengths:
+                    pieces.append(content[start : start + length])
+                    start += length
+                return pieces
+        words = split_words(content)
+        if self.chunk_size == 1:
+            return words
+        size = self.chunk_size
+        return ["".join(words[i : i + size]) for i in range(0, len(words), size)]
+
+    def chunk_dicts(self, cached: Message, model: str) -> Iterator[dict]:
+        """
+        Generate the plain dict bodies of the chunks replaying a cached message.
+        """
+        completion_id, tool_call_ids = _new_ids(cached)
+        template = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": model,
+        }
+
+        def chunk(delta: dict, finish_reason: str | None = None) -> dict:
+            return {
+                **template,
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+
+        pieces = self.split(cached)
+        yield chunk({"role": cached.role, "content": pieces[0] if pieces else ""})
+        for piece in pieces[1:]:
+            yield chunk({"content": piece})
+        for i, (tool_call_id, tool_call) in enumerate(
+            zip(tool_call_ids, cached.tool_calls or [])
+        ):
+            yield chunk(
+                {
+                    "tool_calls": [
+                        {
+                            "index": i,
+                            "id": tool_call_id,
+                            "type": "function",
+                            "function": {
+                                "name": tool_call.tool,
+                                "arguments": tool_call.args,
+                            },
+                        }
+                    ]
+                }
+            )
+        yield chunk({}, _finish_reason(cached))
+
+    def iter_chunks(self, cached: Message, model: str) -> Iterator[ChatCompletionChunk]:
+        """
+        Replay a cached message as ChatCompletionChunk objects.
+        Args:
+            cached (Message): The cached response.
+            model (str): The model of the request.
+        Returns:
+            Iterator[ChatCompletionChunk]: The chunks, paced by `chunk_delay`.
+        """
+        for i, body in enumerate(self.chunk_dicts(cached, model)):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield ChatCompletionChunk.model_validate(body)
+
+    async def aiter_chunks(
+        self, cached: Message, model: str
+    ) -> AsyncIterator[ChatCompletionChunk]:
+        """
+        Replay a cached message as ChatCompletionChunk objects, asynchronously.
+        Args:
+            cached (Message): The cached response.
+            model (str): The model of the request.
+        Returns:
+            AsyncIterator[ChatCompletionChunk]: The chunks, paced by `chunk_delay`.
+        """
+        for i, body in enumerate(self.chunk_dicts(cached, model)):
+            if i and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield ChatCompletionChunk.model_validate(body)
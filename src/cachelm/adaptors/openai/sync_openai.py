@@ -1,139 +1,77 @@
-from uuid import uuid4
 import openai
-from openai.types.chat.chat_completion import ChatCompletion, Choice
-from openai.types.chat.chat_completion_message import ChatCompletionMessage
+from openai.types.chat.chat_completion import ChatCompletion
 import openai.types.chat.chat_completion_chunk as chat_completion_chunk
 from typing import Any, Literal
 from cachelm.adaptors.adaptor import Adaptor
 from openai import NotGiven
 from loguru import logger
+from cachelm.utils.log import log_hot
 from cachelm.utils.chat_history import Message, ToolCall  # Use correct import
-from openai.types.chat.chat_completion_message_tool_call import (
-    ChatCompletionMessageToolCall,
-    Function,
+from cachelm.utils.metrics import timer
+from cachelm.adaptors.openai.capture import StreamCapture
+from cachelm.adaptors.openai.replay import (
+    StreamReplayer,
+    build_chat_completion,
+    build_chat_completion_json,
 )
 
 
 class SyncOpenAIAdaptor(Adaptor[openai.OpenAI]):
-    def _preprocess_chat(self, *args, **kwargs) -> ChatCompletion | None:
+    def __init__(self, *args, stream_replay: StreamReplayer | None = None, **kwargs):
+        """
+        Initialize the SyncOpenAIAdaptor.
+        Args:
+            *args: Positional arguments for the Adaptor.
+            stream_replay: How cached responses are replayed to streaming requests
+                (default: one word per chunk, no pacing).
+            **kwargs: Keyword arguments for the Adaptor.
+        """
+        if stream_replay is not None and not isinstance(stream_replay, StreamReplayer):
+            raise TypeError("stream_replay must be an instance of StreamReplayer")
+        super().__init__(*args, **kwargs)
+        self.stream_replay = stream_replay or StreamReplayer()
+
+    def _lookup_chat(self, kwargs: dict) -> Message | None:
+        """
+        Set the history and namespace from the request, then look the request up in the cache.
+        """
         if kwargs.get("messages") is not None:
-            logger.info("Setting history")
-            messages = [
-                (
-                    msg
-                    if isinstance(msg, Message)
-                    else Message(
-                        role=msg.get("role", ""),
-                        content=msg.get("content", ""),
-                        tool_calls=msg.get("tool_calls"),
-                    )
-                )
-                for msg in kwargs["messages"]
-            ]
+            log_hot("INFO", "Setting history")
+            messages = [Message.from_openai(msg) for msg in kwargs["messages"]]
             self.set_history(messages)
-        cached = self.get_cache()
+        self.set_namespace(kwargs)
+        return self.get_cache()
+
+    def _preprocess_chat(self, *args, **kwargs) -> ChatCompletion | None:
+        cached = self._lookup_chat(kwargs)
         if cached is not None:
-            logger.info("Found cached response")
-            res = ChatCompletion(
-                id=str(uuid4()),
-                choices=[
-                    Choice(
-                        index=0,
-                        finish_reason="stop",
-                        message=ChatCompletionMessage(
-                            role=cached.role,
-                            content=cached.content,
-                            tool_calls=(
-                                [
-                                    ChatCompletionMessageToolCall(
-                                        id=str(uuid4()),
-                                        function=Function(
-                                            name=tool_call.tool,
-                                            arguments=tool_call.args,
-                                        ),
-                                    )
-                                    for tool_call in cached.tool_calls
-                                ]
-                                if cached.tool_calls
-                                else None
-                            ),
-                        ),
-                    )
-                ],
-                created=0,
-                model=kwargs["model"],
-                object="chat.completion",
-            )
-            return res
+            log_hot("INFO", "Found cached response")
+            with timer(self.metrics, "cachelm_stage", stage="response"):
+                return build_chat_completion(cached, kwargs["model"])
         return None
 
+    def cached_completion_json(self, **kwargs) -> bytes | None:
+        """
+        Look a chat completion request up in the cache and return the cached completion as JSON bytes.
+        Meant for proxies: no pydantic object is built on a hit, the bytes can be sent as the response body.
+        Args:
+            **kwargs: The keyword arguments of `chat.completions.create`.
+        Returns:
+            bytes | None: The JSON body of the completion, or None on a miss.
+        """
+        cached = self._lookup_chat(kwargs)
+        if cached is None:
+            return None
+        with timer(self.metrics, "cachelm_stage", stage="response"):
+            return build_chat_completion_json(cached, kwargs["model"])
+
     def _preprocess_streaming_chat(
         self, *args, **kwargs
     ) -> openai.Stream[chat_completion_chunk.ChatCompletionChunk] | None:
-        if kwargs.get("messages") is not None:
-            logger.info("Setting history")
-            messages = [
-                (
-                    msg
-                    if isinstance(msg, Message)
-                    else Message(
-                        role=msg.get("role", ""),
-                        content=msg.get("content", ""),
-                        tool_calls=[
-                            ToolCall(
-                                tool_call.get("function", {}).get("name", ""),
-                                tool_call.get("function", {}).get("arguments", {}),
-                            )
-                            for tool_call in msg.get("tool_calls", [])
-                        ],
-                    )
-                )
-                for msg in kwargs["messages"]
-            ]
-            self.set_history(messages)
-        cached = self.get_cache()
+        cached = self._lookup_chat(kwargs)
         if cached is not None:
-            logger.info("Found cached response")
-
-            def cached_iterator():
-                splitted_content = cached.content.split(" ")
-                for i in range(len(splitted_content)):
-                    content_chunk = " " + splitted_content[i]
-                    tool_calls = (
-                        [
-                            chat_completion_chunk.ChoiceDeltaToolCall(
-                                id=str(uuid4()),
-                                index=0,
-                                function=chat_completion_chunk.ChoiceDeltaToolCallFunction(
-                                    name=tool_call.tool,
-                                    arguments=tool_call.args,
-                                ),
-                            )
-                            for tool_call in cached.tool_calls
-                        ]
-                        if cached.tool_calls is not None
-                        and i == len(splitted_content) - 1
-                        else None
-                    )
-                    yield chat_completion_chunk.ChatCompletionChunk(
-                        id=str(uuid4()),
-                        choices=[
-                            chat_completion_chunk.Choice(
-                                index=0,
-                                finish_reason="stop",
-                                delta=chat_completion_chunk.ChoiceDelta(
-                                    role=cached.role,
-                                    content=content_chunk,
-                                    tool_calls=tool_calls,
-                                ),
-                            )
-                        ],
-                        created=0,
-                        model=kwargs["model"],
-                        object="chat.completion.chunk",
-                    )
-
-            return cached_iterator()
+            log_hot("INFO", "Found cached response")
+            return self.stream_replay.iter_chunks(cached, kwargs["model"])
         return None
 
     def _postprocess_chat(self, completion: ChatCompletion) -> None:
@@ -158,33 +96,11 @@ class SyncOpenAIAdaptor(Adaptor[openai.OpenAI]):
     def _postprocess_streaming_chat(
         self, response: openai.Stream[chat_completion_chunk.ChatCompletionChunk]
     ) -> Any:
-        full_content = ""
-        tool_name = None
-        tool_params = ""
-        tool_calls = None
-        role = "assistant"
+        capture = StreamCapture(record_chunks=self.stream_replay.records_chunks)
         for chunk in response:
-            if chunk.choices is None or len(chunk.choices) == 0:
-                logger.warning("No choices in completion, skipping postprocessing.")
-                yield chunk
-                continue
-            delta = chunk.choices[0].delta
-            if delta.content:
-                full_content += delta.content
-            if delta.tool_calls:
-                for tool_call in delta.tool_calls:
-                    if tool_call.function.name:
-                        tool_name = tool_call.function.name
-                    if tool_call.function.arguments:
-                        tool_params += tool_call.function.arguments
-            if delta.role:
-                role = delta.role
+            capture.add(chunk)
             yield chunk
-        if tool_name and tool_params:
-            tool_calls = [ToolCall(tool_name, tool_params)]
-        self.add_assistant_message(
-            Message(role=role, content=full_content, tool_calls=tool_calls)
-        )
+        self.add_assistant_message(capture.to_message())
 
     def get_adapted(self) -> openai.OpenAI:
         base = self.module
@@ -1,13 +1,18 @@
 from uuid import uuid4
 
-import chromadb.config
-from cachelm.utils.chat_history import Message  # Use the correct import
+from cachelm.utils.chat_history import (
+    Message,
+    MessageSerializer,
+)  # Use the correct import
 from cachelm.databases.database import Database
 from cachelm.vectorizers.vectorizer import Vectorizer
 from loguru import logger
+from cachelm.utils.log import log_hot
+from cachelm.utils.namespace import NAMESPACE_SEPARATOR, namespace_name
 
 try:
     import chromadb
+    import chromadb.config
 except ImportError:
     raise ImportError(
         "ChromaDB library is not installed. Run `pip install chromadb` to install it."
@@ -23,15 +28,21 @@ class ChromaDatabase(Database):
         self,
         vectorizer: Vectorizer,
         unique_id: str = "cachelm",
-        chromaSettings: chromadb.config.Settings = chromadb.config.Settings(),
+        chromaSettings: chromadb.config.Settings | None = None,
         distance_threshold: float = 0.1,
         max_size: int = 100,
+        serializer: MessageSerializer | None = None,
     ):
-        super().__init__(vectorizer, unique_id, distance_threshold, max_size)
+        super().__init__(
+            vectorizer, unique_id, distance_threshold, max_size, serializer
+        )
         self.client = None
         self.collection = None
+        self.namespace_collections = {}
         self.unique_id = unique_id
-        self.chromaSettings = chromaSettings
+        self.chromaSettings = (
+            chromaSettings if chromaSettings is not None else chromadb.config.Settings()
+        )
 
     def __get_adapted_embedding_function(self, vectorizer: Vectorizer):
         class AdaptedEmbeddingFunction(chromadb.EmbeddingFunction):
@@ -40,20 +51,49 @@ class ChromaDatabase(Database):
 
         return AdaptedEmbeddingFunction()
 
+    def _get_collection(self, namespace: str | None = None):
+        """
+        Get the collection backing a namespace.
+        Every namespace lives in its own collection, so queries only scan the entries of that namespace.
+        """
+        if namespace is None:
+            return self.collection
+        name = namespace_name(self.unique_id, namespace)
+        collection = self.namespace_collections.get(name)
+        if collection is None:
+            collection = self._open_collection(name)
+            self.namespace_collections[name] = collection
+        return collection
+
+    def _open_collection(self, name: str):
+        return self.client.get_or_create_collection(
+            name,
+            embedding_function=self.__get_adapted_embedding_function(self.vectorizer),
+        )
+
+    def _discover_namespace_collections(self):
+        """
+        Open the namespace collections created before a restart, so `size` counts their entries.
+        """
+        prefix = f"{self.unique_id}{NAMESPACE_SEPARATOR}"
+        for collection in self.client.list_collections():
+            # Collection objects since Chroma 0.6, names before
+            name = getattr(collection, "name", collection)
+            if name.startswith(prefix):
+                self.namespace_collections[name] = self._open_collection(name)
+
     def reset(self):
         """
         Reset the database.
         """
         try:
             if self.client:
+                for name in list(self.namespace_collections):
+                    self.client.delete_collection(name)
+                self.namespace_collections = {}
                 self.client.delete_collection(self.unique_id)
                 logger.info("Chroma database reset.")
-                self.collection = self.client.get_or_create_collection(
-                    self.unique_id,
-                    embedding_function=self.__get_adapted_embedding_function(
-                        self.vectorizer
-                    ),
-                )
+                self.collection = self._open_collection(self.unique_id)
                 logger.info("Chroma database reconnected.")
         except Exception as e:
             logger.error(f"Error resetting Chroma: {e}")
@@ -61,12 +101,9 @@ class ChromaDatabase(Database):
     def connect(self) -> bool:
         try:
             self.client = chromadb.Client(settings=self.chromaSettings)
-            self.collection = self.client.get_or_create_collection(
-                self.unique_id,
-                embedding_function=self.__get_adapted_embedding_function(
-                    self.vectorizer
-                ),
-            )
+            self.namespace_collections = {}
+            self.collection = self._open_collection(self.unique_id)
+            self._discover_namespace_collections()
             return True
         except Exception as e:
             logger.error(f"Error connecting to Chroma: {e}")
@@ -75,42 +112,57 @@ class ChromaDatabase(Database):
     def disconnect(self):
         pass
 
-    def write(self, history: list[Message], response: Message):
-        logger.info(f"Writing to Chroma: {history} -> {response}")
+    def write(
+        self, history: list[Message], response: Message, namespace: str | None = None
+    ):
+        log_hot("INFO", "Writing to Chroma: {} -> {}", history, response)
         try:
             history_strs = [msg.to_formatted_str() for msg in history]
-            self.collection.add(
+            self._get_collection(namespace).add(
                 ids=[str(uuid4())],
                 documents=["\n".join(history_strs)],
-                metadatas=[{"response": response.to_json_str()}],
+                metadatas=[{"response": self.serializer.dumps_text(response)}],
             )
         except Exception as e:
             logger.error(f"Error writing to Chroma: {e}")
 
-    def find(self, history: list[Message]) -> Message | None:
+    def find(
+        self, history: list[Message], namespace: str | None = None
+    ) -> Message | None:
+        found = self.find_with_distance(history, namespace)
+        return found[0] if found is not None else None
+
+    def find_with_distance(
+        self, history: list[Message], namespace: str | None = None
+    ) -> tuple[Message, float] | None:
         try:
             history_strs = [msg.to_formatted_str() for msg in history]
-            res = self.collection.query(
+            res = self._get_collection(namespace).query(
                 query_texts=["\n".join(history_strs)], n_results=1
             )
             if res is not None and len(res.get("ids", [[]])[0]) > 0:
                 distance = res.get("distances", [[1.0]])[0][0]
-                logger.info(f"Distance: {distance}")
+                log_hot("INFO", "Distance: {}", distance)
                 if distance > self.distance_threshold:
-                    logger.info(
-                        f"Distance too high: {distance} > {self.distance_threshold}"
+                    log_hot(
+                        "INFO",
+                        "Distance too high: {} > {}",
+                        distance,
+                        self.distance_threshold,
                     )
                     return
                 response_str = res.get("metadatas", [[{}]])[0][0].get("response", None)
                 if response_str is None:
-                    logger.info("No response found")
+                    log_hot("INFO", "No response found")
                     return
-                logger.info(f"Found in Chroma: {response_str[:100]}...")
-                return Message.from_json_str(response_str)
-            logger.info(f"Found in Chroma: {res}...")
+                log_hot("INFO", "Found in Chroma: {}", response_str)
+                return self.serializer.loads(response_str), distance
+            log_hot("INFO", "No match found in Chroma: {}", res)
             return
         except Exception as e:
             logger.error(f"Error finding from Chroma: {e}")
+            if self.raise_errors:
+                raise
             return
 
     def size(self) -> int:
@@ -118,7 +170,11 @@ class ChromaDatabase(Database):
         Get the size of the database.
         """
         try:
-            return self.collection.count()
+            return self.collection.count() + sum(
+                collection.count() for collection in self.namespace_collections.values()
+            )
         except Exception as e:
             logger.error(f"Error getting size of Chroma: {e}")
+            if self.raise_errors:
+                raise
             return 0
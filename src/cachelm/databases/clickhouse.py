@@ -1,6 +1,7 @@
 from loguru import logger
+from cachelm.utils.log import log_hot
 
-from cachelm.utils.chat_history import Message  # Correct import
+from cachelm.utils.chat_history import Message, MessageSerializer  # Correct import
 
 try:
     import clickhouse_connect
@@ -28,8 +29,11 @@ class ClickHouse(Database):
         unique_id: str = "cachelm",
         distance_threshold: float = 0.1,
         max_size: int = 100,
+        serializer: MessageSerializer | None = None,
     ):
-        super().__init__(vectorizer, unique_id, distance_threshold, max_size)
+        super().__init__(
+            vectorizer, unique_id, distance_threshold, max_size, serializer
+        )
         self.host = host
         self.port = port
         self.user = user
@@ -38,6 +42,26 @@ class ClickHouse(Database):
         self.client = None
         self.table = f"{self.database}.{self.unique_id}_cache"
 
+    def _create_table(self):
+        """
+        Create the cache table.
+        Rows are ordered by namespace first, so a lookup only reads the granules of its own namespace.
+        """
+        self.client.command(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                id UUID DEFAULT generateUUIDv4(),
+                namespace LowCardinality(String) DEFAULT '',
+                prompt String,
+                response String,
+                embedding Array(Float32)
+            ) ENGINE = MergeTree()
+            ORDER BY (namespace, id)
+            """)
+        # Tables created before namespaces were introduced
+        self.client.command(
+            f"ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS namespace LowCardinality(String) DEFAULT ''"
+        )
+
     def connect(self) -> bool:
         try:
             self.client = clickhouse_connect.get_client(
@@ -48,17 +72,7 @@ class ClickHouse(Database):
                 database="default",
             )
             self.client.command(f"CREATE DATABASE IF NOT EXISTS {self.database}")
-            self.client.command(
-                f"""
-                CREATE TABLE IF NOT EXISTS {self.table} (
-                    id UUID DEFAULT generateUUIDv4(),
-                    prompt String,
-                    response String,
-                    embedding Array(Float32)
-                ) ENGINE = MergeTree()
-                ORDER BY id
-                """
-            )
+            self._create_table()
             return True
         except Exception as e:
             logger.error(f"Error connecting to ClickHouse: {e}")
@@ -71,17 +85,7 @@ class ClickHouse(Database):
         try:
             self.client.command(f"DROP TABLE IF EXISTS {self.table}")
             logger.info("ClickHouse database reset.")
-            self.client.command(
-                f"""
-                CREATE TABLE IF NOT EXISTS {self.table} (
-                    id UUID DEFAULT generateUUIDv4(),
-                    prompt String,
-                    response String,
-                    embedding Array(Float32)
-                ) ENGINE = MergeTree()
-                ORDER BY id
-                """
-            )
+            self._create_table()
         except Exception as e:
             logger.error(f"Error resetting ClickHouse: {e}")
 
@@ -91,14 +95,16 @@ class ClickHouse(Database):
         """
         self.client = None
 
-    def write(self, history: list[Message], response: Message):
+    def write(
+        self, history: list[Message], response: Message, namespace: str | None = None
+    ):
         """
         Write data to the ClickHouse database.
         """
         # Serialize history as a JSON string of message JSONs
         prompt = "\n".join([msg.to_formatted_str() for msg in history])
-        response_str = response.to_json_str()
-        logger.info(f"Writing to ClickHouse: {prompt} -> {response_str}")
+        response_str = self.serializer.dumps_text(response)
+        log_hot("INFO", "Writing to ClickHouse: {} -> {}", prompt, response_str)
         try:
             # For embedding, you may want to use only the text content
             prompt_text = " ".join([msg.content for msg in history])
@@ -106,37 +112,51 @@ class ClickHouse(Database):
             self.client.insert(
                 self.table,
                 [
-                    [prompt, response_str, embedding],
+                    [namespace or "", prompt, response_str, embedding],
                 ],
-                column_names=["prompt", "response", "embedding"],
+                column_names=["namespace", "prompt", "response", "embedding"],
             )
         except Exception as e:
             logger.error(f"Error writing to ClickHouse: {e}")
 
-    def find(self, history: list[Message]) -> Message | None:
+    def find(
+        self, history: list[Message], namespace: str | None = None
+    ) -> Message | None:
+        found = self.find_with_distance(history, namespace)
+        return found[0] if found is not None else None
+
+    def find_with_distance(
+        self, history: list[Message], namespace: str | None = None
+    ) -> tuple[Message, float] | None:
         """
         Find data in the ClickHouse database using cosine similarity.
         """
         try:
             prompt_text = "\n".join([msg.to_formatted_str() for msg in history])
             embedding = self.vectorizer.embed(prompt_text)
-            logger.debug(f"Finding in ClickHouse: {prompt_text}")
+            log_hot("DEBUG", "Finding in ClickHouse: {}", prompt_text)
             query = f"""
                 SELECT response, 
                     1 - (dotProduct(embedding, %(embedding)s) / (length(embedding) * length(%(embedding)s))) AS similarity
                 FROM {self.table}
+                WHERE namespace = %(namespace)s
                 ORDER BY similarity DESC
                 LIMIT 1
             """
-            result = self.client.query(query, parameters={"embedding": embedding})
+            result = self.client.query(
+                query,
+                parameters={"embedding": embedding, "namespace": namespace or ""},
+            )
             if result.result_rows and len(result.result_rows) > 0:
                 response_str, similarity = result.result_rows[0]
                 if similarity >= (1 - self.distance_threshold):
-                    logger.info(f"Found in ClickHouse: {response_str[0:50]}...")
-                    return Message.from_json_str(response_str)
+                    log_hot("INFO", "Found in ClickHouse: {}", response_str)
+                    return self.serializer.loads(response_str), 1 - similarity
             return None
         except Exception as e:
             logger.error(f"Error finding from ClickHouse: {e}")
+            if self.raise_errors:
+                raise
             return None
 
     def size(self) -> int:
@@ -149,4 +169,6 @@ class ClickHouse(Database):
             return result.result_rows[0][0] if result.result_rows else 0
         except Exception as e:
             logger.error(f"Error getting size of ClickHouse: {e}")
+            if self.raise_errors:
+                raise
             return 0
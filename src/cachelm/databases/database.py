@@ -1,18 +1,22 @@
 from abc import ABC, abstractmethod
 from cachelm.utils import async_wrap
-from cachelm.utils.chat_history import Message
+from cachelm.utils.chat_history import Message, MessageSerializer
 from cachelm.vectorizers.vectorizer import Vectorizer
 
 
 class Database(ABC):
     """Abstract base class for a database."""
 
+    # Re-raise lookup errors after logging them instead of reporting a miss, see `set_raise_errors`
+    raise_errors = False
+
     def __init__(
         self,
         vectorizer: Vectorizer,
         unique_id: str = "cachelm",
         distance_threshold: float = 0.1,
         max_size: int = 100,
+        serializer: MessageSerializer | None = None,
     ):
         """
         Initialize the database.
@@ -21,11 +25,14 @@ class Database(ABC):
             unique_id (str): Unique identifier for the database instance.
             distance_threshold (float): Similarity threshold for cache retrieval.
             max_size (int): Maximum number of rows in the database.
+            serializer (MessageSerializer | None): Serializer of the cached responses
+                (default: JSON, encoded with orjson when it's installed).
         """
         self.vectorizer = vectorizer
         self.unique_id = unique_id
         self.distance_threshold = distance_threshold
         self.max_size = max_size
+        self.serializer = serializer or MessageSerializer()
 
     @abstractmethod
     def connect(self) -> bool:
@@ -43,15 +50,55 @@ class Database(ABC):
         raise NotImplementedError("Subclasses must implement this method.")
 
     @abstractmethod
-    def write(self, history: list[Message], response: Message):
-        """Write data to the database."""
+    def write(
+        self, history: list[Message], response: Message, namespace: str | None = None
+    ):
+        """Write data to the database.
+        Args:
+            history (list[Message]): The chat history window used as the key.
+            response (Message): The response to cache.
+            namespace (str | None): The cache partition to write to (None for the default partition).
+        """
         raise NotImplementedError("Subclasses must implement this method.")
 
     @abstractmethod
-    def find(self, history: list[Message]) -> Message | None:
-        """Find data in the database."""
+    def find(
+        self, history: list[Message], namespace: str | None = None
+    ) -> Message | None:
+        """Find data in the database.
+        Args:
+            history (list[Message]): The chat history window to look up.
+            namespace (str | None): The cache partition to search (None for the default partition).
+        """
         raise NotImplementedError("Subclasses must implement this method.")
 
+    def find_with_distance(
+        self, history: list[Message], namespace: str | None = None
+    ) -> tuple[Message, float] | None:
+        """Find data in the database along with its distance to the query.
+        Databases that can't report distances return 0.0 for every hit.
+        Args:
+            history (list[Message]): The chat history window to look up.
+            namespace (str | None): The cache partition to search (None for the default partition).
+        Returns:
+            tuple[Message, float] | None: The cached response and its distance, or None on a miss.
+        """
+        kwargs = {"namespace": namespace} if namespace is not None else {}
+        message = self.find(history, **kwargs)
+        if message is None:
+            return None
+        return message, 0.0
+
+    def set_raise_errors(self, raise_errors: bool = True):
+        """
+        Make `find`, `find_with_distance` and `size` re-raise the errors they log instead of
+        returning a miss. Adaptors with a circuit breaker turn it on so failures reach the breaker.
+        Databases wrapping other databases forward it to them.
+        Args:
+            raise_errors (bool): Whether lookup errors are re-raised (default: True).
+        """
+        self.raise_errors = raise_errors
+
     @abstractmethod
     def size(self) -> int:
         """Get the size of the database."""
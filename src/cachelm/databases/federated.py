@@ -0,0 +1,218 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+
+from loguru import logger
+
+from cachelm.databases.database import Database
+from cachelm.utils.chat_history import Message
+
+
+class FederatedDatabase(Database):
+    """
+    Database querying several databases concurrently, the first hit wins.
+
+    Useful to combine cache tiers (e.g. a shared regional cache and a per-service cache) without
+    adding their latencies: every database is queried in parallel, the first one returning a hit
+    under its distance threshold answers, and the other lookups are cancelled.
+
+    Every database has its own threads, so a slow or hung database only delays its own lookups.
+    Once `max_pending` of its lookups are in flight, it's skipped until some of them finish.
+
+    Example:
+        from cachelm.databases.federated import FederatedDatabase
+
+        database = FederatedDatabase(
+            [regional_database, service_database],
+            timeouts=[0.05, 0.02],
+            write_to=[1],  # Only populate the per-service cache
+        )
+    """
+
+    def __init__(
+        self,
+        databases: list[Database],
+        timeouts: float | list[float | None] | None = None,
+        write_to: list[int] | None = None,
+        max_workers: int = 4,
+        unique_id: str = "cachelm",
+        max_size: int = 0,
+        max_pending: int | None = None,
+    ):
+        """
+        Initialize the federated database.
+        Args:
+            databases (list[Database]): The databases to query. They must share the same window size.
+            timeouts (float | list[float | None] | None): Lookup timeout in seconds, either for all
+                databases or one per database. Results arriving later are ignored (default: None, no timeout).
+            write_to (list[int] | None): Indexes of the databases new entries are written to (default: all).
+            max_workers (int): Number of threads used to query each database (default: 4).
+            unique_id (str): Unique identifier for the database instance.
+            max_size (int): Maximum number of rows across the written databases (default: 0, no limit).
+            max_pending (int | None): Lookups in flight on a database beyond which it's skipped
+                (default: twice max_workers).
+        """
+        if not databases:
+            raise ValueError("FederatedDatabase needs at least one database")
+        window_sizes = {database.vectorizer.window_size for database in databases}
+        if len(window_sizes) > 1:
+            raise ValueError("All databases must use the same vectorizer window size")
+        if timeouts is None or isinstance(timeouts, (int, float)):
+            timeouts = [timeouts] * len(databases)
+        if len(timeouts) != len(databases):
+            raise ValueError("timeouts must have one entry per database")
+        write_to = list(range(len(databases))) if write_to is None else list(write_to)
+        if any(i < 0 or i >= len(databases) for i in write_to):
+            raise ValueError("write_to contains an invalid database index")
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        max_pending = 2 * max_workers if max_pending is None else max_pending
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        super().__init__(
+            databases[0].vectorizer,
+            unique_id,
+            databases[0].distance_threshold,
+            max_size,
+        )
+        self.databases = list(databases)
+        self.timeouts = list(timeouts)
+        self.write_to = write_to
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executors: list[ThreadPoolExecutor] | None = None
+        self.pending = [0] * len(databases)
+        self.skipped = [0] * len(databases)
+        self._lock = Lock()
+
+    def connect(self) -> bool:
+        self.executors = [
+            ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=f"cachelm-federated-{i}",
+            )
+            for i in range(len(self.databases))
+        ]
+        return all([database.connect() for database in self.databases])
+
+    def disconnect(self):
+        for database in self.databases:
+            database.disconnect()
+        if self.executors is not None:
+            for executor in self.executors:
+                executor.shutdown(wait=False, cancel_futures=True)
+            self.executors = None
+
+    def reset(self):
+        """
+        Reset the databases new entries are written to.
+        """
+        for i in self.write_to:
+            self.databases[i].reset()
+
+    def size(self) -> int:
+        return sum(self.databases[i].size() for i in self.write_to)
+
+    def set_raise_errors(self, raise_errors: bool = True):
+        """
+        Forwarded to the databases. A lookup raises only when every database failed.
+        """
+        super().set_raise_errors(raise_errors)
+        for database in self.databases:
+            database.set_raise_errors(raise_errors)
+
+    def write(
+        self, history: list[Message], response: Message, namespace: str | None = None
+    ):
+        """
+        Write the entry to every database in `write_to`, in parallel.
+        """
+        kwargs = {"namespace": namespace} if namespace is not None else {}
+        if self.executors is None or len(self.write_to) == 1:
+            for i in self.write_to:
+                self.databases[i].write(history, response, **kwargs)
+            return
+        futures = [
+            self.executors[i].submit(
+                self.databases[i].write, history, response, **kwargs
+            )
+            for i in self.write_to
+        ]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error writing to federated database: {e}")
+
+    def find(
+        self, history: list[Message], namespace: str | None = None
+    ) -> Message | None:
+        found = self.find_with_distance(history, namespace)
+        return found[0] if found is not None else None
+
+    def find_with_distance(
+        self, history: list[Message], namespace: str | None = None
+    ) -> tuple[Message, float] | None:
+        """
+        Query every database concurrently and return the first hit.
+        Lookups still pending once a hit is found, or past their timeout, are cancelled and their
+        results ignored. Lookups already running in a driver call can't be interrupted and finish
+        in the background. Databases with `max_pending` lookups in flight are skipped.
+        """
+        if self.executors is None:
+            raise Exception("FederatedDatabase is not connected")
+        start = time.monotonic()
+        deadlines = {}
+        for i, (database, timeout) in enumerate(zip(self.databases, self.timeouts)):
+            with self._lock:
+                if self.pending[i] >= self.max_pending:
+                    self.skipped[i] += 1
+                    continue
+                self.pending[i] += 1
+            future = self.executors[i].submit(
+                database.find_with_distance, history, namespace
+            )
+            future.add_done_callback(lambda _, i=i: self._lookup_done(i))
+            deadlines[future] = start + timeout if timeout is not None else None
+
+        pending = set(deadlines)
+        errors = []
+        try:
+            while pending:
+                now = time.monotonic()
+                expired = {
+                    f
+                    for f in pending
+                    if deadlines[f] is not None and deadlines[f] <= now
+                }
+                for future in expired:
+                    future.cancel()
+                pending -= expired
+                if not pending:
+                    break
+                next_deadlines = [
+                    deadlines[f] for f in pending if deadlines[f] is not None
+                ]
+                wait_timeout = min(next_deadlines) - now if next_deadlines else None
+                done, pending = wait(
+                    pending, timeout=wait_timeout, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    try:
+                        found = future.result()
+                    except Exception as e:
+                        logger.error(f"Error finding from federated database: {e}")
+                        errors.append(e)
+                        continue
+                    if found is not None:
+                        return found
+            if self.raise_errors and errors and len(errors) == len(deadlines):
+                raise errors[0]
+            return None
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _lookup_done(self, index: int):
+        with self._lock:
+            self.pending[index] -= 1
@@ -0,0 +1,118 @@
+from cachelm.databases.database import Database
+from cachelm.utils.chat_history import Message, MessageSerializer
+from cachelm.utils.metrics import Metrics
+
+
+class _InstrumentedSerializer(MessageSerializer):
+    """
+    Serializer timing the serialization and deserialization of the wrapped one.
+    """
+
+    def __init__(self, serializer: MessageSerializer, metrics: Metrics):
+        self.serializer = serializer
+        self.metrics = metrics
+
+    def dumps(self, message: Message) -> bytes:
+        with self.metrics.timer("cachelm_serializer", method="dumps"):
+            return self.serializer.dumps(message)
+
+    def dumps_text(self, message: Message) -> str:
+        with self.metrics.timer("cachelm_serializer", method="dumps"):
+            return self.serializer.dumps_text(message)
+
+    def loads(self, data: bytes | str) -> Message:
+        with self.metrics.timer("cachelm_serializer", method="loads"):
+            return self.serializer.loads(data)
+
+
+class InstrumentedDatabase(Database):
+    """
+    Database timing every method of the wrapped database into a `Metrics` registry.
+
+    Records:
+        - cachelm_database_seconds{method}: duration of connect, write, find, size, etc.
+        - cachelm_serializer_seconds{method}: time spent serializing and deserializing the cached
+          responses, part of the write and find durations. The serializer of the wrapped database is
+          replaced by an instrumented one for that.
+        - cachelm_similarity: similarity (1 - cosine distance) of the best match of every hit, for
+          databases reporting distances with `find_with_distance`.
+        - cachelm_database_misses_total: lookups finding nothing under the distance threshold.
+
+    Example:
+        from cachelm.databases.instrumented import InstrumentedDatabase
+
+        database = InstrumentedDatabase(QdrantDatabase(vectorizer), metrics)
+    """
+
+    def __init__(self, database: Database, metrics: Metrics):
+        """
+        Initialize the instrumented database.
+        Args:
+            database (Database): The database to instrument.
+            metrics (Metrics): The registry the timings are recorded in.
+        """
+        database.serializer = _InstrumentedSerializer(database.serializer, metrics)
+        super().__init__(
+            database.vectorizer,
+            database.unique_id,
+            database.distance_threshold,
+            database.max_size,
+            database.serializer,
+        )
+        self.database = database
+        self.metrics = metrics
+        self._reports_distances = (
+            type(database).find_with_distance is not Database.find_with_distance
+        )
+
+    def set_raise_errors(self, raise_errors: bool = True):
+        super().set_raise_errors(raise_errors)
+        self.database.set_raise_errors(raise_errors)
+
+    def connect(self) -> bool:
+        with self.metrics.timer("cachelm_database", method="connect"):
+            return self.database.connect()
+
+    def disconnect(self):
+        with self.metrics.timer("cachelm_database", method="disconnect"):
+            self.database.disconnect()
+
+    def reset(self):
+        with self.metrics.timer("cachelm_database", method="reset"):
+            self.database.reset()
+
+    def write(
+        self, history: list[Message], response: Message, namespace: str | None = None
+    ):
+        kwargs = {"namespace": namespace} if namespace is not None else {}
+        with self.metrics.timer("cachelm_database", method="write"):
+            self.database.write(history, response, **kwargs)
+
+    def find(
+        self, history: list[Message], namespace: str | None = None
+    ) -> Message | None:
+        if self._reports_distances:
+            found = self.find_with_distance(history, namespace)
+            return found[0] if found is not None else None
+        kwargs = {"namespace": namespace} if namespace is not None else {}
+        with self.metrics.timer("cachelm_database", method="find"):
+            message = self.database.find(history, **kwargs)
+        if message is None:
+            self.metrics.increment("cachelm_database_misses_total")
+        return message
+
+    def find_with_distance(
+        self, history: list[Message], namespace: str | None = None
+    ) -> tuple[Message, float] | None:
+        kwargs = {"namespace": namespace} if namespace is not None else {}
+        with self.metrics.timer("cachelm_database", method="find"):
+            found = self.database.find_with_distance(history, **kwargs)
+        if found is None:
+            self.metrics.increment("cachelm_database_misses_total")
+        elif self._reports_distances:
+            self.metrics.observe("cachelm_similarity", 1.0 - found[1])
+        return found
+
+    def size(self) -> int:
+        with self.metrics.timer("cachelm_database", method="size"):
+            return self.database.size()
@@ -0,0 +1,140 @@
+from threading import Lock
+
+import numpy as np
+from loguru import logger
+
+from cachelm.databases.database import Database
+from cachelm.utils.chat_history import Message, MessageSerializer
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+
+class _Partition:
+    """
+    Normalized embeddings of a namespace in a growing float32 matrix, and their responses.
+    """
+
+    def __init__(self):
+        self.matrix: np.ndarray | None = None
+        self.count = 0
+        self.responses: list[str] = []
+
+    def add(self, embedding: np.ndarray, response: str):
+        if self.matrix is None:
+            self.matrix = np.empty((16, embedding.shape[0]), dtype=np.float32)
+        elif self.count == self.matrix.shape[0]:
+            grown = np.empty(
+                (2 * self.matrix.shape[0], self.matrix.shape[1]), dtype=np.float32
+            )
+            grown[: self.count] = self.matrix
+            self.matrix = grown
+        self.matrix[self.count] = embedding
+        self.responses.append(response)
+        self.count += 1
+
+
+class MemoryDatabase(Database):
+    """
+    In-process database keeping the cache in memory, searched by brute force cosine distance.
+
+    Nothing is persisted and nothing needs to be installed. Meant for tests, benchmarks, and single
+    process deployments with small caches: a lookup is one matrix-vector product over its namespace.
+
+    Example:
+        from cachelm.databases.memory import MemoryDatabase
+
+        database = MemoryDatabase(vectorizer, distance_threshold=0.1)
+    """
+
+    def __init__(
+        self,
+        vectorizer: Vectorizer,
+        unique_id: str = "cachelm",
+        distance_threshold: float = 0.1,
+        max_size: int = 0,
+        serializer: MessageSerializer | None = None,
+    ):
+        """
+        Initialize the memory database.
+        Args:
+            vectorizer (Vectorizer): The vectorizer to use for embedding messages.
+            unique_id (str): Unique identifier for the database instance.
+            distance_threshold (float): Maximum cosine distance of a hit.
+            max_size (int): Maximum number of rows in the database (default: 0, no limit).
+            serializer (MessageSerializer | None): Serializer of the cached responses.
+        """
+        super().__init__(
+            vectorizer, unique_id, distance_threshold, max_size, serializer
+        )
+        self.partitions: dict[str | None, _Partition] = {}
+        self._lock = Lock()
+
+    def connect(self) -> bool:
+        return True
+
+    def disconnect(self):
+        pass
+
+    def reset(self):
+        with self._lock:
+            self.partitions = {}
+
+    def _embed(self, history: list[Message]) -> np.ndarray | None:
+        document = "\n".join(msg.to_formatted_str() for msg in history)
+        embedding = np.asarray(
+            self.vectorizer.embed_weighted_average(document), dtype=np.float32
+        )
+        norm = np.linalg.norm(embedding)
+        if not norm:
+            return None
+        return embedding / norm
+
+    def write(
+        self, history: list[Message], response: Message, namespace: str | None = None
+    ):
+        try:
+            embedding = self._embed(history)
+            if embedding is None:
+                logger.warning("Skipping write of a zero embedding")
+                return
+            serialized = self.serializer.dumps_text(response)
+            with self._lock:
+                partition = self.partitions.get(namespace)
+                if partition is None:
+                    partition = self.partitions[namespace] = _Partition()
+                partition.add(embedding, serialized)
+        except Exception as e:
+            logger.error(f"Error writing to memory database: {e}")
+
+    def find(
+        self, history: list[Message], namespace: str | None = None
+    ) -> Message | None:
+        found = self.find_with_distance(history, namespace)
+        return found[0] if found is not None else None
+
+    def find_with_distance(
+        self, history: list[Message], namespace: str | None = None
+    ) -> tuple[Message, float] | None:
+        try:
+            embedding = self._embed(history)
+            if embedding is None:
+                return None
+            with self._lock:
+                partition = self.partitions.get(namespace)
+                if partition is None or not partition.count:
+                    return None
+                similarities = partition.matrix[: partition.count] @ embedding
+                best = int(np.argmax(similarities))
+                distance = 1.0 - float(similarities[best])
+                response = partition.responses[best]
+            if distance > self.distance_threshold:
+                return None
+            return self.serializer.loads(response), distance
+        except Exception as e:
+            logger.error(f"Error finding from memory database: {e}")
+            if self.raise_errors:
+                raise
+            return None
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(partition.count for partition in self.partitions.values())
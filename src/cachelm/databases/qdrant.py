@@ -1,13 +1,24 @@
 from typing import Literal
 from uuid import uuid4
-from cachelm.utils.chat_history import Message
+from cachelm.utils.chat_history import Message, MessageSerializer
 from cachelm.databases.database import Database
 from cachelm.vectorizers.vectorizer import Vectorizer
 from loguru import logger
+from cachelm.utils.log import log_hot
 
 try:
     from qdrant_client import QdrantClient
-    from qdrant_client.http.models import Distance, VectorParams, PointStruct
+    from qdrant_client.http.models import (
+        Distance,
+        FieldCondition,
+        Filter,
+        IsEmptyCondition,
+        MatchValue,
+        PayloadField,
+        PayloadSchemaType,
+        PointStruct,
+        VectorParams,
+    )
 except ImportError:
     raise ImportError(
         "Qdrant library is not installed. Run `pip install qdrant-client` to install it."
@@ -44,6 +55,7 @@ class QdrantDatabase(Database):
         local_inference_batch_size: int = None,
         distance_threshold: float = 0.1,
         max_size: int = 100,
+        serializer: MessageSerializer | None = None,
     ):
         """
         Initialize the Qdrant database.
@@ -69,8 +81,11 @@ class QdrantDatabase(Database):
             local_inference_batch_size (int): Batch size for local inference.
             distance_threshold (float): Similarity threshold for cache retrieval.
             max_size (int): Maximum number of rows in the database.
+            serializer (MessageSerializer | None): Serializer of the cached responses.
         """
-        super().__init__(vectorizer, unique_id, distance_threshold, max_size)
+        super().__init__(
+            vectorizer, unique_id, distance_threshold, max_size, serializer
+        )
         self.client = None
         self.collection_name = collection_name or unique_id
         self.distance = distance
@@ -124,11 +139,38 @@ class QdrantDatabase(Database):
                     vectors_config=VectorParams(size=dim, distance=self.distance),
                 )
                 logger.info("Qdrant collection created.")
+            self._create_namespace_index()
             return True
         except Exception as e:
             logger.error(f"Error connecting to Qdrant: {e}")
             return False
 
+    def _create_namespace_index(self):
+        """
+        Index the namespace payload field, so filtered searches only visit points of one namespace.
+        """
+        try:
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="namespace",
+                field_schema=PayloadSchemaType.KEYWORD,
+            )
+        except Exception as e:
+            logger.warning(f"Could not create Qdrant namespace index: {e}")
+
+    def _namespace_filter(self, namespace: str | None) -> Filter:
+        """
+        Build the payload filter selecting a namespace.
+        Points of the default partition (None) are written without a namespace field.
+        """
+        if namespace is None:
+            return Filter(
+                must=[IsEmptyCondition(is_empty=PayloadField(key="namespace"))]
+            )
+        return Filter(
+            must=[FieldCondition(key="namespace", match=MatchValue(value=namespace))]
+        )
+
     def disconnect(self):
         pass
 
@@ -144,33 +186,47 @@ class QdrantDatabase(Database):
                     collection_name=self.collection_name,
                     vectors_config=VectorParams(size=dim, distance=self.distance),
                 )
+                self._create_namespace_index()
                 logger.info("Qdrant database reset and reconnected.")
         except Exception as e:
             logger.error(f"Error resetting Qdrant: {e}")
 
-    def write(self, history: list[Message], response: Message):
-        logger.info(f"Writing to Qdrant: {history} -> {response}")
+    def write(
+        self, history: list[Message], response: Message, namespace: str | None = None
+    ):
+        log_hot("INFO", "Writing to Qdrant: {} -> {}", history, response)
         try:
             history_strs = [msg.to_formatted_str() for msg in history]
             document = "\n".join(history_strs)
             embedding = self.vectorizer.embed_weighted_average(document)
+            payload = {
+                "document": document,
+                "response": self.serializer.dumps_text(response),
+            }
+            if namespace is not None:
+                payload["namespace"] = namespace
             self.client.upsert(
                 collection_name=self.collection_name,
                 points=[
                     PointStruct(
                         id=str(uuid4()),
                         vector=embedding,
-                        payload={
-                            "document": document,
-                            "response": response.to_json_str(),
-                        },
+                        payload=payload,
                     )
                 ],
             )
         except Exception as e:
             logger.error(f"Error writing to Qdrant: {e}")
 
-    def find(self, history: list[Message]) -> Message | None:
+    def find(
+        self, history: list[Message], namespace: str | None = None
+    ) -> Message | None:
+        found = self.find_with_distance(history, namespace)
+        return found[0] if found is not None else None
+
+    def find_with_distance(
+        self, history: list[Message], namespace: str | None = None
+    ) -> tuple[Message, float] | None:
         try:
             history_strs = [msg.to_formatted_str() for msg in history]
             document = "\n".join(history_strs)
@@ -178,6 +234,7 @@ class QdrantDatabase(Database):
             search_result = self.client.search(
                 collection_name=self.collection_name,
                 query_vector=embedding,
+                query_filter=self._namespace_filter(namespace),
                 limit=1,
                 with_payload=True,
                 score_threshold=(
@@ -189,30 +246,40 @@ class QdrantDatabase(Database):
             if search_result:
                 point = search_result[0]
                 score = point.score
-                logger.info(f"Qdrant search score: {score}")
+                log_hot("INFO", "Qdrant search score: {}", score)
+                distance = score
                 if self.distance == Distance.COSINE:
+                    distance = 1 - score
                     # Qdrant returns similarity, not distance, for cosine
                     if score < 1 - self.distance_threshold:
-                        logger.info(
-                            f"Score too low: {score} < {1 - self.distance_threshold}"
+                        log_hot(
+                            "INFO",
+                            "Score too low: {} < {}",
+                            score,
+                            1 - self.distance_threshold,
                         )
                         return
                 else:
                     if score > self.distance_threshold:
-                        logger.info(
-                            f"Distance too high: {score} > {self.distance_threshold}"
+                        log_hot(
+                            "INFO",
+                            "Distance too high: {} > {}",
+                            score,
+                            self.distance_threshold,
                         )
                         return
                 response_str = point.payload.get("response")
                 if response_str is None:
-                    logger.info("No response found")
+                    log_hot("INFO", "No response found")
                     return
-                logger.info(f"Found in Qdrant: {response_str[:100]}...")
-                return Message.from_json_str(response_str)
-            logger.info("No match found in Qdrant.")
+                log_hot("INFO", "Found in Qdrant: {}", response_str)
+                return self.serializer.loads(response_str), distance
+            log_hot("INFO", "No match found in Qdrant.")
             return
         except Exception as e:
             logger.error(f"Error finding from Qdrant: {e}")
+            if self.raise_errors:
+                raise
             return
 
     def size(self) -> int:
@@ -224,4 +291,6 @@ class QdrantDatabase(Database):
             return info.points_count
         except Exception as e:
             logger.error(f"Error getting size of Qdrant: {e}")
+            if self.raise_errors:
+                raise
             return 0
@@ -1,6 +1,8 @@
 from loguru import logger
+from cachelm.utils.log import log_hot
+from cachelm.utils.namespace import NAMESPACE_SEPARATOR, namespace_name
 
-from cachelm.utils.chat_history import Message  # Updated import
+from cachelm.utils.chat_history import Message, MessageSerializer  # Updated import
 from cachelm.databases.database import Database
 from cachelm.vectorizers.vectorizer import Vectorizer
 
@@ -26,28 +28,64 @@ class RedisVLDatabase(Database):
         unique_id: str = "cachelm",
         distance_threshold: float = 0.1,
         max_size: int = 100,
+        serializer: MessageSerializer | None = None,
     ):
-        super().__init__(vectorizer, unique_id, distance_threshold, max_size)
+        super().__init__(
+            vectorizer, unique_id, distance_threshold, max_size, serializer
+        )
         self.host = host
         self.port = port
         self.cache = None
+        self.namespace_caches = {}
+
+    def _create_cache(self, name: str) -> SemanticCache:
+        return SemanticCache(
+            redis_url=f"redis://{self.host}:{self.port}",
+            vectorizer=CustomTextVectorizer(
+                embed=self.vectorizer.embed_weighted_average,
+                embed_many=self.vectorizer.embed_weighted_average_many,
+            ),
+            name=name,
+        )
+
+    def _get_cache(self, namespace: str | None = None) -> SemanticCache:
+        """
+        Get the semantic cache backing a namespace.
+        Every namespace gets its own search index, so queries only scan the entries of that namespace.
+        """
+        if namespace is None:
+            return self.cache
+        name = namespace_name(self.unique_id, namespace)
+        cache = self.namespace_caches.get(name)
+        if cache is None:
+            cache = self._create_cache(name)
+            self.namespace_caches[name] = cache
+        return cache
+
+    def _discover_namespace_caches(self):
+        """
+        Open the namespace indexes created before a restart, so `size` counts their entries.
+        """
+        prefix = f"{self.unique_id}{NAMESPACE_SEPARATOR}"
+        for name in self.cache.index.listall():
+            if isinstance(name, bytes):
+                name = name.decode()
+            if name.startswith(prefix):
+                self.namespace_caches[name] = self._create_cache(name)
 
     def connect(self) -> bool:
         try:
-            self.cache = SemanticCache(
-                redis_url=f"redis://{self.host}:{self.port}",
-                vectorizer=CustomTextVectorizer(
-                    embed=self.vectorizer.embed_weighted_average,
-                    embed_many=self.vectorizer.embed_weighted_average_many,
-                ),
-                name=self.unique_id,
-            )
+            self.cache = self._create_cache(self.unique_id)
+            self.namespace_caches = {}
+            self._discover_namespace_caches()
             return True
         except Exception as e:
             logger.error(f"Error connecting to Redis: {e}")
             return False
 
     def disconnect(self):
+        for cache in self.namespace_caches.values():
+            cache.disconnect()
         if self.cache:
             self.cache.disconnect()
 
@@ -57,42 +95,57 @@ class RedisVLDatabase(Database):
         """
         try:
             self.cache.clear()
+            for cache in self.namespace_caches.values():
+                cache.clear()
             logger.info("Redis database reset.")
         except Exception as e:
             logger.error(f"Error resetting Redis: {e}")
 
-    def write(self, history: list[Message], response: Message):
+    def write(
+        self, history: list[Message], response: Message, namespace: str | None = None
+    ):
         """
         Write data to the Redis database.
         """
         try:
             prompt = "\n".join([msg.to_formatted_str() for msg in history])
-            response_str = response.to_json_str()
-            logger.info(f"Writing to Redis: {prompt} -> {response_str}")
-            self.cache.store(
+            response_str = self.serializer.dumps_text(response)
+            log_hot("INFO", "Writing to Redis: {} -> {}", prompt, response_str)
+            self._get_cache(namespace).store(
                 prompt=prompt,
                 response=response_str,
             )
         except Exception as e:
             logger.error(f"Error writing to Redis: {e}")
 
-    def find(self, history: list[Message]) -> Message | None:
+    def find(
+        self, history: list[Message], namespace: str | None = None
+    ) -> Message | None:
+        found = self.find_with_distance(history, namespace)
+        return found[0] if found is not None else None
+
+    def find_with_distance(
+        self, history: list[Message], namespace: str | None = None
+    ) -> tuple[Message, float] | None:
         """
         Find data in the database.
         """
         try:
             prompt = "\n".join([msg.to_formatted_str() for msg in history])
-            res = self.cache.check(
+            res = self._get_cache(namespace).check(
                 prompt=prompt,
                 distance_threshold=self.distance_threshold,
             )
             if res is not None and len(res) > 0:
                 response_str = res[0].get("response", "")
-                logger.info(f"Found in Redis: {response_str[0:50]}...")
-                return Message.from_json_str(response_str)
+                log_hot("INFO", "Found in Redis: {}", response_str)
+                distance = float(res[0].get("vector_distance", 0.0))
+                return self.serializer.loads(response_str), distance
             return None
         except Exception as e:
             logger.error(f"Error finding from redis: {e}")
+            if self.raise_errors:
+                raise
             return None
 
     def size(self) -> int:
@@ -100,8 +153,12 @@ class RedisVLDatabase(Database):
         Get the size of the database.
         """
         try:
-            info = self.cache.index.info()
-            return info.get("num_docs", 0)
+            return sum(
+                cache.index.info().get("num_docs", 0)
+                for cache in [self.cache, *self.namespace_caches.values()]
+            )
         except Exception as e:
             logger.error(f"Error getting size from Redis: {e}")
+            if self.raise_errors:
+                raise
             return 0
@@ -0,0 +1,439 @@
+import hashlib
+import json
+import math
+import operator
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Literal
+
+from loguru import logger
+
+from cachelm.databases.database import Database
+from cachelm.utils.chat_history import Message
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+
+class ShardedDatabase(Database):
+    """
+    Database spreading the cache over several underlying databases (shards).
+
+    Two routing strategies are available:
+        - "namespace": every namespace (see `partition_by` on the adaptor) lives on a single shard,
+          chosen by rendezvous hashing. Lookups only hit that shard.
+        - "centroid": IVF-style routing. Each shard owns a coarse centroid, learned online from the
+          written embeddings. Writes go to the nearest shard and lookups probe the `n_probe` nearest ones.
+          Lookups search every shard while no centroid is known, and when the nearest unprobed
+          centroid is within `routing_margin` of the probed ones, so entries written under drifted
+          centroids are still found.
+
+    Centroids only live in memory unless they are given (`centroids`, e.g. computed offline from a
+    sample of the traffic) or persisted (`centroids_path`). Several processes sharing the shards should
+    share precomputed centroids with `learn_centroids=False`, so they route the same way.
+
+    Lookups touching several shards run in parallel and the closest hit wins.
+
+    Example:
+        from cachelm.databases.sharded import ShardedDatabase
+
+        database = ShardedDatabase(
+            [QdrantDatabase(vectorizer, host="qdrant-1"), QdrantDatabase(vectorizer, host="qdrant-2")],
+            routing="centroid",
+            n_probe=2,
+        )
+    """
+
+    def __init__(
+        self,
+        shards: list[Database],
+        routing: Literal["namespace", "centroid"] = "namespace",
+        n_probe: int = 1,
+        routing_vectorizer: Vectorizer | None = None,
+        max_workers: int | None = None,
+        unique_id: str = "cachelm",
+        centroids: list[list[float]] | None = None,
+        learn_centroids: bool = True,
+        centroids_path: str | None = None,
+        routing_margin: float = 0.02,
+    ):
+        """
+        Initialize the sharded database.
+        Args:
+            shards (list[Database]): The underlying databases. They must share the same window size.
+            routing (str): "namespace" to route by namespace hash, "centroid" to route by nearest centroid.
+            n_probe (int): Number of shards queried per lookup (default: 1). Use len(shards) to query all shards.
+            routing_vectorizer (Vectorizer | None): Vectorizer used to compute routing embeddings in
+                centroid mode. A cheap vectorizer keeps routing overhead low (default: the first shard's vectorizer).
+            max_workers (int | None): Number of threads used to query shards in parallel.
+            unique_id (str): Unique identifier for the database instance.
+            centroids (list[list[float]] | None): Precomputed centroid of each shard, in centroid mode.
+            learn_centroids (bool): Whether writes move the centroids (default: True). Turning it off
+                requires a centroid for every shard.
+            centroids_path (str | None): JSON file the centroids are loaded from on connect and saved
+                to on disconnect and by `save_centroids` (default: None, not persisted).
+            routing_margin (float): Lookups search every shard when the nearest unprobed centroid is within
+                this cosine similarity of the farthest probed one (default: 0.02, 0 to always trust the routing).
+        """
+        if not shards:
+            raise ValueError("ShardedDatabase needs at least one shard")
+        if routing not in ("namespace", "centroid"):
+            raise ValueError(f"Invalid routing: {routing}")
+        if n_probe < 1:
+            raise ValueError("n_probe must be at least 1")
+        if centroids is not None and len(centroids) != len(shards):
+            raise ValueError("centroids must have one entry per shard")
+        if not learn_centroids and centroids is None and centroids_path is None:
+            raise ValueError(
+                "learn_centroids=False needs centroids or a centroids_path"
+            )
+        if routing_margin < 0:
+            raise ValueError("routing_margin must be non-negative")
+        window_sizes = {shard.vectorizer.window_size for shard in shards}
+        if len(window_sizes) > 1:
+            raise ValueError("All shards must use the same vectorizer window size")
+        max_size = (
+            sum(shard.max_size for shard in shards)
+            if all(shard.max_size > 0 for shard in shards)
+            else 0
+        )
+        super().__init__(
+            shards[0].vectorizer,
+            unique_id,
+            shards[0].distance_threshold,
+            max_size,
+        )
+        self.shards = list(shards)
+        self.routing = routing
+        self.n_probe = n_probe
+        self.routing_vectorizer = routing_vectorizer or shards[0].vectorizer
+        self.max_workers = max_workers or max(4, 2 * len(shards))
+        self.executor: ThreadPoolExecutor | None = None
+        self.centroids: list[list[float] | None] = (
+            [list(c) for c in centroids]
+            if centroids is not None
+            else [None] * len(shards)
+        )
+        self.centroid_counts: list[int] = [int(c is not None) for c in self.centroids]
+        self.learn_centroids = learn_centroids
+        self.centroids_path = centroids_path
+        self.routing_margin = routing_margin
+        # Shard counts of the layouts used before shards were added, newest first
+        self.previous_layouts: list[int] = []
+        self._lock = Lock()
+        self._warned_missing_namespace = False
+
+    def connect(self) -> bool:
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="cachelm-shard"
+        )
+        if self.centroids_path is not None:
+            self.load_centroids()
+        return all([shard.connect() for shard in self.shards])
+
+    def disconnect(self):
+        if self.centroids_path is not None:
+            self.save_centroids()
+        for shard in self.shards:
+            shard.disconnect()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def reset(self):
+        """
+        Reset every shard and forget the learned centroids.
+        """
+        for shard in self.shards:
+            shard.reset()
+        with self._lock:
+            self.centroids = [None] * len(self.shards)
+            self.centroid_counts = [0] * len(self.shards)
+            self.previous_layouts = []
+
+    def size(self) -> int:
+        return sum(shard.size() for shard in self.shards)
+
+    def set_raise_errors(self, raise_errors: bool = True):
+        """
+        Forwarded to the shards. A lookup raises only when every shard it queried failed.
+        """
+        super().set_raise_errors(raise_errors)
+        for shard in self.shards:
+            shard.set_raise_errors(raise_errors)
+
+    def add_shard(self, shard: Database, centroid: list[float] | None = None) -> int:
+        """
+        Add a shard to the database.
+
+        In namespace mode, rendezvous hashing only moves the namespaces that now belong to the new
+        shard. Until `finish_rebalancing` is called, lookups missing on the new owner fall back to the
+        previous owner, and hits found there are copied to the new owner in the background.
+        In centroid mode, the new shard is seeded by the next writes, unless its centroid is given.
+        Args:
+            shard (Database): The database to add. It's connected if the sharded database is.
+            centroid (list[float] | None): The centroid of the new shard, required when centroids
+                are not learned.
+        Returns:
+            int: The index of the new shard.
+        """
+        if shard.vectorizer.window_size != self.vectorizer.window_size:
+            raise ValueError("All shards must use the same vectorizer window size")
+        if self.routing == "centroid" and not self.learn_centroids and centroid is None:
+            raise ValueError(
+                "learn_centroids=False needs the centroid of the new shard"
+            )
+        if self.executor is not None and not shard.connect():
+            raise Exception("Failed to connect to the new shard")
+        shard.set_raise_errors(self.raise_errors)
+        with self._lock:
+            self.previous_layouts.insert(0, len(self.shards))
+            self.shards.append(shard)
+            self.centroids.append(list(centroid) if centroid is not None else None)
+            self.centroid_counts.append(int(centroid is not None))
+            self.max_size = (
+                sum(s.max_size for s in self.shards)
+                if all(s.max_size > 0 for s in self.shards)
+                else 0
+            )
+        logger.info(f"Added shard {len(self.shards) - 1} to {self.unique_id}")
+        return len(self.shards) - 1
+
+    def load_centroids(self, path: str | None = None) -> bool:
+        """
+        Load the centroids saved by `save_centroids`.
+        Args:
+            path (str | None): The JSON file (default: `centroids_path`).
+        Returns:
+            bool: True if centroids were loaded, False if the file is missing or doesn't match the shards.
+        """
+        path = path or self.centroids_path
+        if not os.path.exists(path):
+            if not self.learn_centroids and None in self.centroids:
+                raise ValueError(f"learn_centroids=False but {path} doesn't exist")
+            return False
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            centroids, counts = state["centroids"], state["counts"]
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Error loading centroids from {path}: {e}")
+            return False
+        if len(centroids) != len(self.shards):
+            logger.warning(
+                f"{path} has {len(centroids)} centroids for {len(self.shards)} shards, ignoring it"
+            )
+            return False
+        with self._lock:
+            self.centroids = centroids
+            self.centroid_counts = counts
+        return True
+
+    def save_centroids(self, path: str | None = None):
+        """
+        Save the centroids, so a restarted process routes like this one.
+        Args:
+            path (str | None): The JSON file, replaced atomically (default: `centroids_path`).
+        """
+        path = path or self.centroids_path
+        with self._lock:
+            state = {"centroids": self.centroids, "counts": self.centroid_counts}
+        try:
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.error(f"Error saving centroids to {path}: {e}")
+
+    def finish_rebalancing(self):
+        """
+        Stop falling back to the shards owning namespaces before the last `add_shard` calls.
+        """
+        with self._lock:
+            self.previous_layouts = []
+
+    def _namespace_owner(self, namespace: str | None, shard_count: int) -> int:
+        """
+        Rendezvous hashing: the shard with the highest hash for the namespace owns it.
+        """
+        if namespace is None and not self._warned_missing_namespace:
+            self._warned_missing_namespace = True
+            logger.warning(
+                "ShardedDatabase uses namespace routing without namespaces, "
+                "every entry goes to the same shard. Set partition_by on the adaptor "
+                "or use centroid routing."
+            )
+        key = namespace or ""
+        return max(
+            range(shard_count),
+            key=lambda i: hashlib.blake2b(
+                f"{key}:{i}".encode(), digest_size=8
+            ).digest(),
+        )
+
+    def _routing_embedding(self, history: list[Message]) -> list[float]:
+        document = "\n".join([msg.to_formatted_str() for msg in history])
+        return self.routing_vectorizer.embed_weighted_average(document)
+
+    @staticmethod
+    def _cosine(a: list[float], b: list[float]) -> float:
+        dot = sum(map(operator.mul, a, b))
+        norm = math.sqrt(sum(map(operator.mul, a, a))) * math.sqrt(
+            sum(map(operator.mul, b, b))
+        )
+        return dot / norm if norm else 0.0
+
+    def _rank_shards(self, embedding: list[float]) -> list[tuple[float, int]]:
+        """
+        Get the (similarity, index) of the shards with a centroid, the closest first.
+        """
+        centroids = self.centroids
+        return sorted(
+            (
+                (self._cosine(embedding, centroid), i)
+                for i, centroid in enumerate(centroids)
+                if centroid is not None
+            ),
+            reverse=True,
+        )
+
+    def _nearest_shards(self, embedding: list[float], count: int) -> list[int]:
+        """
+        Get the shards whose centroids are the closest to the embedding.
+        """
+        return [i for _, i in self._rank_shards(embedding)[:count]]
+
+    def _probed_shards(self, embedding: list[float]) -> list[int]:
+        """
+        Get the shards a lookup probes: the `n_probe` nearest ones, or every shard when no centroid is
+        known or the routing is ambiguous.
+        """
+        ranked = self._rank_shards(embedding)
+        if not ranked:
+            # Nothing learned yet, e.g. after a restart without persisted centroids
+            return list(range(len(self.shards)))
+        if (
+            len(ranked) > self.n_probe
+            and ranked[self.n_probe - 1][0] - ranked[self.n_probe][0]
+            < self.routing_margin
+        ):
+            return list(range(len(self.shards)))
+        return [i for _, i in ranked[: self.n_probe]]
+
+    def _assign_centroid(self, embedding: list[float]) -> int:
+        """
+        Pick the shard for a new entry and move its centroid towards the entry (online k-means).
+        Shards without a centroid yet are seeded first.
+        """
+        with self._lock:
+            unseeded = [i for i, c in enumerate(self.centroids) if c is None]
+            if unseeded:
+                index = unseeded[0]
+                self.centroids[index] = list(embedding)
+                self.centroid_counts[index] = 1
+                return index
+            index = self._nearest_shards(embedding, 1)[0]
+            if not self.learn_centroids:
+                return index
+            self.centroid_counts[index] += 1
+            rate = 1.0 / self.centroid_counts[index]
+            self.centroids[index] = [
+                c + (x - c) * rate for c, x in zip(self.centroids[index], embedding)
+            ]
+            return index
+
+    def write(
+        self, history: list[Message], response: Message, namespace: str | None = None
+    ):
+        if self.routing == "namespace":
+            index = self._namespace_owner(namespace, len(self.shards))
+        else:
+            index = self._assign_centroid(self._routing_embedding(history))
+        kwargs = {"namespace": namespace} if namespace is not None else {}
+        self.shards[index].write(history, response, **kwargs)
+
+    def find(
+        self, history: list[Message], namespace: str | None = None
+    ) -> Message | None:
+        found = self.find_with_distance(history, namespace)
+        return found[0] if found is not None else None
+
+    def _query_shards(
+        self, indexes: list[int], history: list[Message], namespace: str | None
+    ) -> tuple[Message, float] | None:
+        """
+        Query the given shards in parallel and return the closest hit.
+        """
+        results = []
+        errors = []
+        if len(indexes) == 1 or self.executor is None:
+            for i in indexes:
+                try:
+                    results.append(
+                        self.shards[i].find_with_distance(history, namespace)
+                    )
+                except Exception as e:
+                    errors.append(e)
+        else:
+            futures = [
+                self.executor.submit(
+                    self.shards[i].find_with_distance, history, namespace
+                )
+                for i in indexes
+            ]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    errors.append(e)
+        for error in errors:
+            logger.error(f"Error finding from shard: {error}")
+        if errors and not results and self.raise_errors:
+            raise errors[0]
+        hits = [result for result in results if result is not None]
+        if not hits:
+            return None
+        return min(hits, key=lambda hit: hit[1])
+
+    def find_with_distance(
+        self, history: list[Message], namespace: str | None = None
+    ) -> tuple[Message, float] | None:
+        if self.routing == "centroid":
+            indexes = self._probed_shards(self._routing_embedding(history))
+            return self._query_shards(indexes, history, namespace)
+
+        owner = self._namespace_owner(namespace, len(self.shards))
+        indexes = [owner]
+        if self.n_probe > 1:
+            indexes += [i for i in range(len(self.shards)) if i != owner][
+                : self.n_probe - 1
+            ]
+        found = self._query_shards(indexes, history, namespace)
+        if found is not None:
+            return found
+        for shard_count in list(self.previous_layouts):
+            previous_owner = self._namespace_owner(namespace, shard_count)
+            if previous_owner in indexes:
+                continue
+            found = self.shards[previous_owner].find_with_distance(history, namespace)
+            if found is not None:
+                self._migrate(owner, history, found[0], namespace)
+                return found
+        return None
+
+    def _migrate(
+        self,
+        owner: int,
+        history: list[Message],
+        response: Message,
+        namespace: str | None,
+    ):
+        """
+        Copy an entry found on a previous owner to its new owner, off the lookup path.
+        """
+        kwargs = {"namespace": namespace} if namespace is not None else {}
+        if self.executor is None:
+            self.shards[owner].write(history, response, **kwargs)
+            return
+        self.executor.submit(
+            self.shards[owner].write, list(history), response, **kwargs
+        )
@@ -1,5 +1,6 @@
 from loguru import logger
 from cachelm.middlewares.middleware import Middleware
+from cachelm.utils.chat_history import ChatHistory
 
 
 class Deduper(Middleware):
@@ -7,11 +8,15 @@ class Deduper(Middleware):
     Middleware that returns None if the reply is already present in history.
     """
 
+    history_independent = True
+
     def pre_cache_save(self, message, history):
         return message
 
     def post_cache_retrieval(self, message, history):
         # Check if message content is already in any previous message in history
+        if isinstance(history, ChatHistory):
+            return None if history.has_content(message.content) else message
         for past_message in history:
             if getattr(past_message, "content", None) == message.content:
                 return None
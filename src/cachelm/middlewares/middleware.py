@@ -5,6 +5,10 @@ from cachelm.utils.chat_history import ChatHistory, Message
 class Middleware(ABC):
     """Abstract base class for a middleware."""
 
+    # True when pre_cache_save only depends on the message, not on the history.
+    # The adaptor then memoizes its output per message instead of re-running it on every request.
+    history_independent: bool = False
+
     @abstractmethod
     def pre_cache_save(self, message: Message, history: ChatHistory) -> Message | None:
         """Pre-cache hook. Modify the history before caching.
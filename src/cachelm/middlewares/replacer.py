@@ -1,3 +1,4 @@
+import re
 from typing import Literal
 from cachelm.middlewares.middleware import Middleware
 
@@ -19,6 +20,40 @@ class Replacement:
         self.value = value
 
 
+def _trie_pattern(strings: list[str]) -> str:
+    """
+    Build a regex matching any of the strings, from a trie of the strings.
+    Alternatives sharing a prefix share its branch, so the regex engine tests each character of
+    the text against a few branches at most, however many strings there are. Matches are the longest
+    string starting at the leftmost position.
+    """
+    trie: dict = {}
+    for string in strings:
+        node = trie
+        for char in string:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def pattern(node: dict) -> str:
+        is_end = "" in node
+        branches = [
+            re.escape(char) + pattern(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        if len(branches) == 1:
+            body = branches[0]
+            if is_end:
+                return f"(?:{body})?" if len(body) > 1 else f"{body}?"
+            return body
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if is_end else body
+
+    return pattern(trie)
+
+
 class Replacer(Middleware):
     """
     Middleware for replacing specific strings in messages before saving to cache
@@ -26,18 +61,55 @@ class Replacer(Middleware):
     This is useful for handling special tokens or placeholders in the message content and improving cache efficiency.
 
     It replaces the `key` with `value` before saving to cache and vice versa after retrieval.
+
+    With `compiled=True`, all the replacements of a direction are compiled into a single regex and
+    applied in one pass over the content, instead of one `str.replace` scan per replacement. Use it
+    for large replacement lists. Matches are then non-overlapping and the longest match wins at a
+    given position, whereas sequential replacements can also rewrite the output of the previous ones.
     """
 
-    def __init__(self, replacements: list[Replacement]):
+    history_independent = True
+
+    def __init__(self, replacements: list[Replacement], compiled: bool = False):
         """
         Initialize the Replacer middleware.
 
         Args:
             replacements: list[Replacement]: A list of Replacement objects.
+            compiled: bool: If True, apply all the replacements in a single pass (default: False).
         """
         self.replacements = replacements
+        self.compiled = compiled
+        if compiled:
+            self.compile()
+
+    def compile(self):
+        """
+        Compile the replacements. Call it again after modifying the replacements of a compiled Replacer.
+        """
+        # The first replacement of a string wins, like with sequential replacements
+        to_key: dict[str, str] = {}
+        to_value: dict[str, str] = {}
+        for replacement in self.replacements:
+            if replacement.value:
+                to_key.setdefault(replacement.value, replacement.key)
+            if replacement.key:
+                to_value.setdefault(replacement.key, replacement.value)
+        self._to_key = to_key
+        self._to_value = to_value
+        self._value_regex = re.compile(_trie_pattern(list(to_key))) if to_key else None
+        self._key_regex = (
+            re.compile(_trie_pattern(list(to_value))) if to_value else None
+        )
 
     def pre_cache_save(self, message, history):
+        if self.compiled:
+            if self._value_regex is not None:
+                to_key = self._to_key
+                message.content = self._value_regex.sub(
+                    lambda match: to_key[match.group()], message.content
+                )
+            return message
         for replacement in self.replacements:
             message.content = message.content.replace(
                 replacement.value, replacement.key
@@ -45,6 +117,13 @@ class Replacer(Middleware):
         return message
 
     def post_cache_retrieval(self, message, history):
+        if self.compiled:
+            if self._key_regex is not None:
+                to_value = self._to_value
+                message.content = self._key_regex.sub(
+                    lambda match: to_value[match.group()], message.content
+                )
+            return message
         for replacement in self.replacements:
             message.content = message.content.replace(
                 replacement.key, replacement.value
@@ -1,5 +1,6 @@
 from cachelm.middlewares.middleware import Middleware
 import re
+import warnings
 
 from cachelm.utils.chat_history import Message
 
@@ -10,6 +11,10 @@ class Skipper(Middleware):
 
     This is useful for filtering out messages that should not be cached based on regular expressions.
 
+    The patterns are compiled once into a single alternation, so a message is scanned once however
+    many of them there are. Patterns that depend on their group numbers or names, or set inline
+    flags (backreferences, named groups, conditionals, "(?i)"...), are precompiled and searched one by one.
+
     Example:
         from cachelm.middlewares.skipper import Skipper
 
@@ -17,6 +22,8 @@ class Skipper(Middleware):
         skipper = Skipper(patterns=[r"skip_this.*", r"ignore_\d+"])
     """
 
+    history_independent = True
+
     def __init__(self, patterns: list[str], function_calls: list[str] = []):
         """
         Initialize the Skipper middleware.
@@ -27,6 +34,39 @@ class Skipper(Middleware):
         """
         self.patterns = patterns
         self.function_calls = function_calls
+        self.compile()
+
+    # Combining renumbers the groups and applies inline flags to every pattern. Erring on the
+    # side of caution is fine (e.g. an escaped backslash followed by a digit): the pattern is
+    # just searched on its own.
+    _NOT_COMBINABLE = re.compile(
+        r"\\[1-9]|\\g<|\(\?P?<(?![=!])|\(\?P=|\(\?\(|\(\?[aiLmsux-]"
+    )
+
+    def compile(self):
+        """
+        Compile the patterns and tool names. Call it again after modifying them.
+        """
+        self._tool_names = frozenset(self.function_calls)
+        compiled = [re.compile(pattern) for pattern in self.patterns]
+        combinable = []
+        self._separate = []
+        for pattern, regex in zip(self.patterns, compiled):
+            if self._NOT_COMBINABLE.search(pattern):
+                self._separate.append(regex)
+            else:
+                combinable.append(pattern)
+        self._combined = None
+        if not combinable:
+            return
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("error", DeprecationWarning)
+                self._combined = re.compile(
+                    "|".join(f"(?:{pattern})" for pattern in combinable)
+                )
+        except (re.error, DeprecationWarning, RecursionError, OverflowError):
+            self._separate = compiled
 
     def pre_cache_save(self, message, history):
         """
@@ -40,30 +80,27 @@ class Skipper(Middleware):
         if self._should_skip_function_call(message):
             # If the message is a function call that should be skipped, return None
             return None
-        for pattern in self.patterns:
-            if re.search(pattern, message.content):
-                # If the pattern is found in the message content, skip saving it to cache
+        content = message.content
+        if self._combined is not None and self._combined.search(content):
+            # If a pattern is found in the message content, skip saving it to cache
+            return None
+        for regex in self._separate:
+            if regex.search(content):
                 return None
         return message
 
     def _should_skip_function_call(self, message: Message):
         """
-        Check if the message is a function call that should be skipped.
+        Check if the message calls a function that should be skipped.
         Args:
             message: The message to be checked.
         Returns:
-            True if the message is a function call that should be skipped, otherwise False.
+            True if any of the tool calls of the message should be skipped, otherwise False.
         """
-        if (
-            hasattr(message, "tool_calls")
-            and message.tool_calls
-            and isinstance(message.tool_calls, list)
-        ):
-            function_call = message.tool_calls[0]
-            if function_call.tool in self.function_calls:
-                # If the function call matches any of the patterns, skip saving it to cache
-                return True
-        return False
+        tool_calls = getattr(message, "tool_calls", None)
+        if not tool_calls or not self._tool_names:
+            return False
+        return any(tool_call.tool in self._tool_names for tool_call in tool_calls)
 
     def post_cache_retrieval(self, message, history):
         return message
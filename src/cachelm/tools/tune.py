@@ -0,0 +1,440 @@
+import argparse
+import json
+import math
+
+import numpy as np
+from loguru import logger
+
+from cachelm.utils.aggregator import AggregateMethod
+from cachelm.utils.chat_history import ChatHistory, Message
+from cachelm.utils.namespace import PartitionBy, namespace_from_kwargs
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+# Upper bounds of the buckets of the nearest-neighbour distance histograms
+DISTANCE_BINS = (0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.3, 0.5, 1.0, 2.0)
+# Characters per token, to estimate the tokens of records without usage
+CHARS_PER_TOKEN = 4
+
+
+def _response_text(response) -> str:
+    if response is None:
+        return ""
+    if isinstance(response, str):
+        return response
+    if "choices" in response:
+        response = response["choices"][0]["message"]
+    return Message.from_openai(response).content
+
+
+class ReplayTuner:
+    """
+    Offline evaluation of cache settings against a log of past requests and their responses.
+
+    The log is replayed in order through a simulated cache, for every combination of window size,
+    aggregation method, decay and distance threshold: like the adaptor, a request hitting the cache
+    is served the response of its nearest cached request, and a miss goes upstream and writes its
+    response to the cache. Each distinct message is embedded once, in batches, and the cache keys
+    of every setting are aggregated from those embeddings with NumPy, so a sweep costs one pass of
+    the model over the log.
+
+    Hits serving a response that disagrees with the logged response of the request (cosine
+    similarity of the two responses below `answer_similarity`, with the same vectorizer) are counted
+    as wrong answers, to trade the hit rate against correctness.
+
+    Distances are cosine distances, as used by the memory, Qdrant (default) and ClickHouse databases.
+    Middlewares are not applied: keys are built from the raw messages.
+
+    Log format, one JSON object per line:
+        {"messages": [{"role": "user", "content": "..."}], "response": "...",
+         "model": "gpt-4o", "usage": {"total_tokens": 321}}
+    The response is a string, a message or a chat completion. Request arguments (model, temperature...)
+    are used by `partition_by`. Without usage, tokens are estimated from the characters.
+
+    Example:
+        from cachelm.tools.tune import ReplayTuner
+
+        tuner = ReplayTuner.from_jsonl("requests.jsonl", FastEmbedVectorizer())
+        results = tuner.sweep(thresholds=[0.05, 0.1, 0.2], window_sizes=[1, 2, 4])
+        print(ReplayTuner.best(results, max_wrong_hit_rate=0.01))
+    """
+
+    def __init__(
+        self,
+        records: list[dict],
+        vectorizer: Vectorizer,
+        partition_by: PartitionBy | None = None,
+        ignore_system_messages: bool = True,
+        answer_similarity: float = 0.9,
+        near_miss_margin: float = 0.05,
+        batch_size: int = 256,
+    ):
+        """
+        Initialize the tuner.
+        Args:
+            records (list[dict]): The logged requests, in the order they were served.
+            vectorizer (Vectorizer): The vectorizer the cache would use. Its aggregation settings are
+                ignored, they're the ones being swept.
+            partition_by (PartitionBy | None): Partitioning of the cache, as on the adaptor (default: None).
+            ignore_system_messages (bool): Whether system messages are left out of the keys, as on the
+                adaptor (default: True).
+            answer_similarity (float): Minimum cosine similarity between the served and logged
+                responses of a correct hit (default: 0.9).
+            near_miss_margin (float): Misses whose nearest cached entry is within this distance of the
+                threshold are counted as near misses (default: 0.05).
+            batch_size (int): Number of texts embedded at once (default: 256).
+        """
+        if not records:
+            raise ValueError("The log has no records")
+        self.vectorizer = vectorizer
+        self.answer_similarity = answer_similarity
+        self.near_miss_margin = near_miss_margin
+        self.batch_size = batch_size
+        self.histories = []
+        for record in records:
+            messages = [Message.from_openai(msg) for msg in record["messages"]]
+            if ignore_system_messages:
+                messages = [msg for msg in messages if msg.role != "system"]
+            history = ChatHistory()
+            history.set_messages(messages)
+            self.histories.append(history)
+        self.responses = [_response_text(record.get("response")) for record in records]
+        self.tokens = np.array(
+            [
+                self._tokens(record, response)
+                for record, response in zip(records, self.responses)
+            ],
+            dtype=np.int64,
+        )
+        namespaces = [namespace_from_kwargs(record, partition_by) for record in records]
+        ids = {namespace: i for i, namespace in enumerate(dict.fromkeys(namespaces))}
+        self.namespaces = (
+            np.array([ids[namespace] for namespace in namespaces])
+            if len(ids) > 1
+            else None
+        )
+        self._text_ids: dict[str, int] = {}
+        self._embeddings = np.empty((0, 0), dtype=np.float32)
+        self._response_embeddings: np.ndarray | None = None
+
+    @classmethod
+    def from_jsonl(cls, path: str, vectorizer: Vectorizer, **kwargs) -> "ReplayTuner":
+        """
+        Create a tuner from a JSONL log file, see the class docstring for the format.
+        """
+        with open(path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return cls(records, vectorizer, **kwargs)
+
+    @staticmethod
+    def _tokens(record: dict, response: str) -> int:
+        usage = record.get("usage") or {}
+        if usage.get("total_tokens") is not None:
+            return int(usage["total_tokens"])
+        prompt = sum(
+            len(Message.from_openai(msg).content) for msg in record["messages"]
+        )
+        return math.ceil((prompt + len(response)) / CHARS_PER_TOKEN)
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Get the embeddings of texts, embedding the ones never seen before.
+        """
+        missing = [text for text in dict.fromkeys(texts) if text not in self._text_ids]
+        computed = [] if not self._embeddings.size else [self._embeddings]
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start : start + self.batch_size]
+            computed.append(
+                np.asarray(self.vectorizer.embed_many(batch), dtype=np.float32)
+            )
+            for text in batch:
+                self._text_ids[text] = len(self._text_ids)
+        if missing:
+            self._embeddings = np.concatenate(computed)
+        return self._embeddings[[self._text_ids[text] for text in texts]]
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def keys(
+        self, window_size: int, aggregate_method: str, decay: float = 0.4
+    ) -> np.ndarray:
+        """
+        Get the normalized cache keys of the requests, as the vectorizer would compute them.
+        Returns:
+            np.ndarray: One float32 row per request.
+        """
+        segments = []
+        for history in self.histories:
+            # Same splitting as Vectorizer.embed_weighted_average, most recent message first
+            document = "\n".join(
+                msg.to_formatted_str() for msg in history.window(window_size)
+            )
+            segments.extend(document.split("msg:")[::-1][:window_size])
+        vectors = self._embed(segments).reshape(len(self.histories), window_size, -1)
+        if aggregate_method == AggregateMethod.CONCATENATE:
+            keys = vectors.reshape(len(self.histories), -1)
+        else:
+            if aggregate_method == AggregateMethod.EXPONENTIAL_DECAY:
+                weights = decay ** np.arange(window_size, dtype=np.float32)
+            elif aggregate_method == AggregateMethod.LINEAR_DECAY:
+                weights = window_size - np.arange(window_size, dtype=np.float32)
+            else:
+                raise ValueError(f"Invalid aggregation method: {aggregate_method}")
+            keys = np.einsum("w,nwd->nd", weights / weights.sum(), vectors)
+        return self._normalize(keys).astype(np.float32)
+
+    def _replay(
+        self, keys: np.ndarray, thresholds: np.ndarray, block: int = 512
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Replay the log through one simulated cache per threshold.
+        Returns:
+            tuple: The similarity and index of the nearest cached entry of every lookup, one row per
+                threshold (-inf and -1 when the cache was empty), and the similarity of the nearest
+                previous request, cached or not.
+        """
+        n = len(keys)
+        cached = np.zeros((len(thresholds), n), dtype=bool)
+        similarities = np.full((len(thresholds), n), -np.inf, dtype=np.float32)
+        matches = np.full((len(thresholds), n), -1, dtype=np.int64)
+        nearest = np.full(n, -np.inf, dtype=np.float32)
+        rows = np.arange(len(thresholds))
+        for start in range(0, n, block):
+            stop = min(n, start + block)
+            block_similarities = keys[start:stop] @ keys[:stop].T
+            for i in range(start, stop):
+                row = block_similarities[i - start, :i]
+                if self.namespaces is not None:
+                    row = np.where(
+                        self.namespaces[:i] == self.namespaces[i], row, -np.inf
+                    )
+                if i:
+                    nearest[i] = row.max()
+                    candidates = np.where(cached[:, :i], row, -np.inf)
+                    best = candidates.argmax(axis=1)
+                    similarities[:, i] = candidates[rows, best]
+                    matches[:, i] = np.where(np.isfinite(similarities[:, i]), best, -1)
+                hit = 1.0 - similarities[:, i] <= thresholds
+                # Misses go upstream and their response is written to the cache
+                cached[~hit, i] = True
+        return similarities, matches, nearest
+
+    def _answers_agree(self, matches: np.ndarray) -> np.ndarray | None:
+        """
+        Whether the response served by each match agrees with the logged response.
+        """
+        if not any(self.responses):
+            return None
+        if self._response_embeddings is None:
+            self._response_embeddings = self._normalize(self._embed(self.responses))
+        served = self._response_embeddings[np.maximum(matches, 0)]
+        agreement = np.einsum("tnd,nd->tn", served, self._response_embeddings)
+        same = np.array(self.responses, dtype=object)[
+            np.maximum(matches, 0)
+        ] == np.array(self.responses, dtype=object)
+        return same | (agreement >= self.answer_similarity)
+
+    def evaluate(
+        self,
+        thresholds: list[float],
+        window_size: int = 4,
+        aggregate_method: str = AggregateMethod.CONCATENATE,
+        decay: float = 0.4,
+    ) -> list[dict]:
+        """
+        Evaluate one aggregation setting at several distance thresholds.
+        Returns:
+            list[dict]: One result per threshold: hits, hit rate, upstream calls, tokens saved,
+                wrong hits and their rate (None without logged responses), near misses, and the
+                histogram of the distances to the nearest previous request.
+        """
+        thresholds = np.asarray(sorted(thresholds), dtype=np.float32)
+        keys = self.keys(window_size, aggregate_method, decay)
+        similarities, matches, nearest = self._replay(keys, thresholds)
+        distances = 1.0 - similarities
+        hits = distances <= thresholds[:, None]
+        agree = self._answers_agree(matches)
+        near_misses = ~hits & (distances <= thresholds[:, None] + self.near_miss_margin)
+        nearest_distances = 1.0 - nearest[np.isfinite(nearest)]
+        histogram = np.histogram(nearest_distances, bins=(0.0, *DISTANCE_BINS))[0]
+        n = len(keys)
+        results = []
+        for t, threshold in enumerate(thresholds):
+            hit_count = int(hits[t].sum())
+            wrong = None if agree is None else int((hits[t] & ~agree[t]).sum())
+            results.append(
+                {
+                    "window_size": window_size,
+                    "aggregate_method": aggregate_method,
+                    "decay": (
+                        decay
+                        if aggregate_method == AggregateMethod.EXPONENTIAL_DECAY
+                        else None
+                    ),
+                    "threshold": round(float(threshold), 6),
+                    "requests": n,
+                    "hits": hit_count,
+                    "hit_rate": hit_count / n,
+                    "upstream_calls": n - hit_count,
+                    "tokens_saved": int(self.tokens[hits[t]].sum()),
+                    "wrong_hits": wrong,
+                    "wrong_hit_rate": (
+                        None
+                        if wrong is None
+                        else (wrong / hit_count if hit_count else 0.0)
+                    ),
+                    "near_misses": int(near_misses[t].sum()),
+                    "nearest_distance_histogram": dict(
+                        zip(DISTANCE_BINS, histogram.tolist())
+                    ),
+                }
+            )
+        return results
+
+    def sweep(
+        self,
+        thresholds: list[float],
+        window_sizes: list[int] = (1, 2, 4),
+        aggregate_methods: list[str] = (
+            AggregateMethod.CONCATENATE,
+            AggregateMethod.EXPONENTIAL_DECAY,
+            AggregateMethod.LINEAR_DECAY,
+        ),
+        decays: list[float] = (0.2, 0.4, 0.6),
+    ) -> list[dict]:
+        """
+        Evaluate every combination of the settings. Decays are only swept for the exponential decay.
+        Returns:
+            list[dict]: The results of `evaluate`, for every setting and threshold.
+        """
+        results = []
+        for window_size in window_sizes:
+            for aggregate_method in aggregate_methods:
+                for decay in (
+                    decays
+                    if aggregate_method == AggregateMethod.EXPONENTIAL_DECAY
+                    else (None,)
+                ):
+                    logger.info(
+                        f"Evaluating window_size={window_size} {aggregate_method} decay={decay}"
+                    )
+                    results.extend(
+                        self.evaluate(
+                            thresholds, window_size, aggregate_method, decay or 0.0
+                        )
+                    )
+        return results
+
+    @staticmethod
+    def best(results: list[dict], max_wrong_hit_rate: float = 0.01) -> dict | None:
+        """
+        Get the result with the highest hit rate among those serving few enough wrong answers.
+        Results without wrong answer estimates are all eligible.
+        """
+        eligible = [
+            result
+            for result in results
+            if result["wrong_hit_rate"] is None
+            or result["wrong_hit_rate"] <= max_wrong_hit_rate
+        ]
+        if not eligible:
+            return None
+        return max(
+            eligible, key=lambda result: (result["hit_rate"], -result["threshold"])
+        )
+
+
+def format_results(results: list[dict]) -> str:
+    """
+    Format results as an aligned table.
+    """
+    lines = [
+        f"{'window':>6} {'aggregation':<18} {'decay':>5} {'threshold':>9} {'hit rate':>8} "
+        f"{'upstream':>8} {'tokens saved':>12} {'wrong':>6} {'near miss':>9}"
+    ]
+    for r in results:
+        decay = "" if r["decay"] is None else f"{r['decay']:.2f}"
+        wrong = "" if r["wrong_hit_rate"] is None else f"{r['wrong_hit_rate']:.1%}"
+        lines.append(
+            f"{r['window_size']:>6} {r['aggregate_method']:<18} {decay:>5} {r['threshold']:>9.3f} "
+            f"{r['hit_rate']:>8.1%} {r['upstream_calls']:>8} {r['tokens_saved']:>12} "
+            f"{wrong:>6} {r['near_misses']:>9}"
+        )
+    return "\n".join(lines)
+
+
+def _floats(value: str) -> list[float]:
+    return [float(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep the cache settings over a JSONL log of requests and responses."
+    )
+    parser.add_argument("log", help="JSONL log, one request per line")
+    parser.add_argument(
+        "--vectorizer", choices=["hashing", "fastembed"], default="fastembed"
+    )
+    parser.add_argument("--model", default=None, help="FastEmbed model name")
+    parser.add_argument(
+        "--thresholds", type=_floats, default="0.02,0.05,0.1,0.15,0.2,0.3"
+    )
+    parser.add_argument(
+        "--window-sizes", type=lambda v: [int(x) for x in v.split(",")], default="1,2,4"
+    )
+    parser.add_argument(
+        "--aggregations",
+        type=lambda v: v.split(","),
+        default="concatenate,exponential_decay,linear_decay",
+    )
+    parser.add_argument("--decays", type=_floats, default="0.2,0.4,0.6")
+    parser.add_argument("--partition-by", type=lambda v: v.split(","), default=None)
+    parser.add_argument("--answer-similarity", type=float, default=0.9)
+    parser.add_argument("--max-wrong-hit-rate", type=float, default=0.01)
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    if args.vectorizer == "hashing":
+        from cachelm.vectorizers.hashing import HashingVectorizer
+
+        vectorizer = HashingVectorizer()
+    else:
+        from cachelm.vectorizers.fastembed import FastEmbedVectorizer
+
+        vectorizer = (
+            FastEmbedVectorizer(model_name=args.model)
+            if args.model
+            else FastEmbedVectorizer()
+        )
+    tuner = ReplayTuner.from_jsonl(
+        args.log,
+        vectorizer,
+        partition_by=args.partition_by,
+        answer_similarity=args.answer_similarity,
+    )
+    results = tuner.sweep(
+        args.thresholds, args.window_sizes, args.aggregations, args.decays
+    )
+    print(format_results(results))
+    best = ReplayTuner.best(results, args.max_wrong_hit_rate)
+    if best is None:
+        print(
+            f"\nNo setting serves less than {args.max_wrong_hit_rate:.1%} wrong answers"
+        )
+    else:
+        decay = "" if best["decay"] is None else f", decay={best['decay']}"
+        print(
+            f"\nBest: window_size={best['window_size']}, aggregate_method={best['aggregate_method']}"
+            f"{decay}, distance_threshold={best['threshold']} "
+            f"({best['hit_rate']:.1%} hits, {best['tokens_saved']} tokens saved)"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,20 @@
+import base64
 import json
+import threading
+from typing import Literal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 class ToolCall:
@@ -6,6 +22,8 @@ class ToolCall:
     Class to represent a tool call in the chat history.
     """
 
+    __slots__ = ("tool", "args")
+
     def __init__(self, tool: str, args: list):
         self.tool = tool
         self.args = args
@@ -44,31 +62,132 @@ class ToolCall:
 class Message:
     """
     Class to represent a message in the chat history.
+    The formatted string, key and hash of the message are computed once and cached until the
+    role, content or tool calls are reassigned. Tool calls should be replaced, not mutated in place.
     """
 
+    __slots__ = (
+        "_role",
+        "_content",
+        "_tool_calls",
+        "chunk_lengths",
+        "_formatted",
+        "_key",
+        "_hash",
+    )
+
     def __init__(
-        self, role: str, content: str, tool_calls: list[ToolCall] | None = None
+        self,
+        role: str,
+        content: str,
+        tool_calls: list[ToolCall] | None = None,
+        chunk_lengths: list[int] | None = None,
     ):
-        self.role = role
-        self.content = content
-        self.tool_calls = tool_calls
+        self._role = role
+        self._content = content
+        self._tool_calls = tool_calls
+        # Lengths of the content chunks of the stream the message was received from, if recorded
+        self.chunk_lengths = chunk_lengths
+        self._formatted = None
+        self._key = None
+        self._hash = None
+
+    @property
+    def role(self) -> str:
+        return self._role
+
+    @role.setter
+    def role(self, role: str):
+        self._role = role
+        self._formatted = self._key = self._hash = None
+
+    @property
+    def content(self) -> str:
+        return self._content
+
+    @content.setter
+    def content(self, content: str):
+        self._content = content
+        self._formatted = self._key = self._hash = None
+
+    @property
+    def tool_calls(self) -> list[ToolCall] | None:
+        return self._tool_calls
+
+    @tool_calls.setter
+    def tool_calls(self, tool_calls: list[ToolCall] | None):
+        self._tool_calls = tool_calls
+        self._formatted = self._key = self._hash = None
+
+    @property
+    def content_key(self) -> tuple:
+        """
+        The role, content and tool calls of the message as a hashable tuple, cached until they change.
+        Equal keys mean the messages are the same to the cache, whatever their chunk lengths.
+        """
+        if self._key is None:
+            tool_calls = (
+                tuple(
+                    (
+                        tool_call.tool,
+                        (
+                            tool_call.args
+                            if isinstance(tool_call.args, str)
+                            else json.dumps(tool_call.args, sort_keys=True, default=str)
+                        ),
+                    )
+                    for tool_call in self._tool_calls
+                )
+                if self._tool_calls
+                else None
+            )
+            self._key = (self._role, self._content, tool_calls)
+        return self._key
+
+    @property
+    def content_hash(self) -> int:
+        """
+        Hash of the role, content and tool calls of the message, cached until they change.
+        """
+        if self._hash is None:
+            self._hash = hash(self.content_key)
+        return self._hash
 
     def __repr__(self):
         return f"Message(role={self.role}, content={self.content})"
 
+    def copy(self) -> "Message":
+        """
+        Copy the message. Tool calls are shared, they're replaced rather than mutated.
+        """
+        message = Message(
+            self._role, self._content, self._tool_calls, self.chunk_lengths
+        )
+        message._formatted = self._formatted
+        message._key = self._key
+        message._hash = self._hash
+        return message
+
+    def to_json(self):
+        """
+        Convert the message to a JSON object.
+        """
+        data = {
+            "role": self.role,
+            "content": self.content,
+            "tool_calls": [
+                tool_call.to_json() for tool_call in (self.tool_calls or [])
+            ],
+        }
+        if self.chunk_lengths:
+            data["chunk_lengths"] = self.chunk_lengths
+        return data
+
     def to_json_str(self):
         """
         Convert the message to a JSON string.
         """
-        return json.dumps(
-            {
-                "role": self.role,
-                "content": self.content,
-                "tool_calls": [
-                    tool_call.to_json() for tool_call in (self.tool_calls or [])
-                ],
-            },
-        )
+        return json.dumps(self.to_json())
 
     def to_formatted_str(self):
         """
@@ -83,10 +202,16 @@ class Message:
         >>> message.to_formatted_str()
         'assistant: Hi there! (Tool calls: [{"tool": "calculator", "args": [1, 2]}])'
         """
+        if self._formatted is None:
+            self._formatted = self._format()
+        return self._formatted
+
+    def _format(self) -> str:
         if self.content != "" and self.tool_calls is None:
             return f"msg: {self.role}: {self.content}"
-        elif self.content == "":
-            return f"msg:"
+        elif not self.tool_calls:
+            # Only the padding message has neither a role nor a content
+            return f"msg: {self.role}: {self.content}" if self.role else "msg:"
 
         return f"msg: {self.role}: {self.content} (Tool calls: {json.dumps([tool_call.to_json() for tool_call in (self.tool_calls or [])])})"
 
@@ -95,7 +220,60 @@ class Message:
         """
         Create a Message object from a JSON string.
         """
-        data = json.loads(json_str)
+        return Message.from_json(json.loads(json_str))
+
+    @staticmethod
+    def from_openai(message) -> "Message":
+        """
+        Create a Message object from a message of an OpenAI request.
+        Messages that already are Message objects are returned as is.
+        Args:
+            message: The message, as a dict (or any object with `model_dump`).
+        Returns:
+            Message: The converted message. Text parts of multi-part contents are concatenated.
+        """
+        if type(message) is dict:
+            content = message.get("content")
+            tool_calls = message.get("tool_calls")
+            if type(content) is str and not tool_calls:
+                # Fast path of plain text messages
+                return Message(message.get("role", ""), content)
+        elif isinstance(message, Message):
+            return message
+        else:
+            if not isinstance(message, dict):
+                message = message.model_dump()
+            content = message.get("content")
+            tool_calls = message.get("tool_calls")
+        if content is None:
+            content = ""
+        elif not isinstance(content, str):
+            content = "".join(
+                part.get("text", "")
+                for part in content
+                if isinstance(part, dict) and part.get("type") == "text"
+            )
+        return Message(
+            role=message.get("role", ""),
+            content=content,
+            tool_calls=(
+                [
+                    ToolCall(
+                        tool_call.get("function", {}).get("name", ""),
+                        tool_call.get("function", {}).get("arguments", ""),
+                    )
+                    for tool_call in tool_calls
+                ]
+                if tool_calls
+                else None
+            ),
+        )
+
+    @staticmethod
+    def from_json(data: dict):
+        """
+        Create a Message object from a JSON object.
+        """
         return Message(
             role=data.get("role", ""),
             content=data.get("content", ""),
@@ -103,28 +281,219 @@ class Message:
                 ToolCall.from_json(tool_call)
                 for tool_call in data.get("tool_calls", [])
             ],
+            chunk_lengths=data.get("chunk_lengths"),
         )
 
 
+class MessageSerializer:
+    """
+    Serializes the cached messages stored by the databases.
+
+    Codecs:
+        - "json": stdlib json.
+        - "orjson": the same JSON, encoded and decoded by orjson.
+        - "msgpack": compact binary encoding.
+        - "auto": orjson when it's installed, json otherwise.
+    Payloads of at least `compress_min_size` bytes are wrapped in a zstd frame.
+
+    Binary payloads start with a format version byte followed by a codec/flags byte, so every
+    payload can be decoded whatever the serializer that wrote it. Payloads starting with "{" are
+    plain JSON, as written by previous versions, and stay readable.
+
+    Databases storing strings use `dumps_text`: JSON payloads are stored as plain JSON text, binary
+    ones as base64 text prefixed with `TEXT_PREFIX`.
+
+    Example:
+        from cachelm.utils.chat_history import MessageSerializer
+
+        database = ChromaDatabase(
+            vectorizer,
+            serializer=MessageSerializer(codec="msgpack", compress_min_size=2048),
+        )
+    """
+
+    FORMAT_VERSION = 1
+    TEXT_PREFIX = "b64:"
+    JSON = 0
+    MSGPACK = 1
+    ZSTD = 0x80
+
+    def __init__(
+        self,
+        codec: Literal["auto", "json", "orjson", "msgpack"] = "auto",
+        compress_min_size: int | None = None,
+        compression_level: int = 3,
+    ):
+        """
+        Initialize the serializer.
+        Args:
+            codec (str): The codec used to encode messages (default: "auto").
+            compress_min_size (int | None): Payloads of at least this many bytes are compressed with
+                zstd (default: None, no compression).
+            compression_level (int): The zstd compression level (default: 3).
+        """
+        if codec == "auto":
+            codec = "orjson" if orjson is not None else "json"
+        if codec not in ("json", "orjson", "msgpack"):
+            raise ValueError(f"Invalid codec: {codec}")
+        if codec == "orjson" and orjson is None:
+            raise ImportError(
+                "orjson library is not installed. Run `pip install orjson` to install it."
+            )
+        if codec == "msgpack" and msgpack is None:
+            raise ImportError(
+                "msgpack library is not installed. Run `pip install msgpack` to install it."
+            )
+        if compress_min_size is not None and zstandard is None:
+            raise ImportError(
+                "zstandard library is not installed. Run `pip install zstandard` to install it."
+            )
+        self.codec = codec
+        self.compress_min_size = compress_min_size
+        self.compression_level = compression_level
+        self._local = threading.local()
+
+    def _encode(self, message: Message) -> tuple[int, bytes]:
+        data = message.to_json()
+        if self.codec == "msgpack":
+            return self.MSGPACK, msgpack.packb(data)
+        if self.codec == "orjson":
+            return self.JSON, orjson.dumps(data)
+        return self.JSON, json.dumps(data).encode()
+
+    def _compressor(self):
+        # zstd contexts can't be shared between threads
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = zstandard.ZstdCompressor(
+                level=self.compression_level
+            )
+        return compressor
+
+    def dumps(self, message: Message) -> bytes:
+        """
+        Serialize a message to a versioned binary payload.
+        """
+        codec, payload = self._encode(message)
+        if (
+            self.compress_min_size is not None
+            and len(payload) >= self.compress_min_size
+        ):
+            codec |= self.ZSTD
+            payload = self._compressor().compress(payload)
+        return bytes((self.FORMAT_VERSION, codec)) + payload
+
+    def dumps_text(self, message: Message) -> str:
+        """
+        Serialize a message for databases storing strings.
+        """
+        codec, payload = self._encode(message)
+        if codec == self.JSON and (
+            self.compress_min_size is None or len(payload) < self.compress_min_size
+        ):
+            return payload.decode()
+        return self.TEXT_PREFIX + base64.b64encode(self.dumps(message)).decode()
+
+    @classmethod
+    def loads(cls, data: bytes | str) -> Message:
+        """
+        Deserialize a message written by any serializer, or by `Message.to_json_str`.
+        """
+        if isinstance(data, str):
+            if not data.startswith(cls.TEXT_PREFIX):
+                return Message.from_json(cls._loads_json(data))
+            data = base64.b64decode(data[len(cls.TEXT_PREFIX) :])
+        if data[:1] == b"{":
+            return Message.from_json(cls._loads_json(data))
+        if len(data) < 2 or data[0] != cls.FORMAT_VERSION:
+            raise ValueError("Unknown message serialization format")
+        codec, payload = data[1], data[2:]
+        if codec & cls.ZSTD:
+            if zstandard is None:
+                raise ImportError(
+                    "zstandard library is not installed. Run `pip install zstandard` to install it."
+                )
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+            codec &= ~cls.ZSTD
+        if codec == cls.MSGPACK:
+            if msgpack is None:
+                raise ImportError(
+                    "msgpack library is not installed. Run `pip install msgpack` to install it."
+                )
+            return Message.from_json(msgpack.unpackb(payload))
+        if codec == cls.JSON:
+            return Message.from_json(cls._loads_json(payload))
+        raise ValueError(f"Unknown message codec: {codec}")
+
+    @staticmethod
+    def _loads_json(data: bytes | str) -> dict:
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
 class ChatHistory:
     """
     Class to represent the chat history.
+    Windows returned by `window` are cached until the history changes, so the lookup and write
+    paths of a request share the same window. Replace the messages through `set_messages` or the
+    `messages` attribute rather than mutating the list in place.
     """
 
+    # Shared padding message of windows longer than the history
+    PAD = Message("", "")
+
     def __init__(self):
-        self.messages: list[Message] = []
+        self._messages: list[Message] = []
+        self._windows: dict[int, tuple[Message, ...]] = {}
+        # Contents of the messages, built on the first lookup and kept up to date by appends
+        self._contents: set | None = None
+
+    @property
+    def messages(self) -> list[Message]:
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages: list[Message]):
+        self._messages = messages
+        self._windows.clear()
+        self._contents = None
+
+    def _append(self, message: Message):
+        self._messages.append(message)
+        self._windows.clear()
+        if self._contents is not None:
+            self._contents.add(message.content)
 
-    def add_user_message(self, message: str):
+    def add_user_message(self, message: str | Message):
         """
         Add a user message to the chat history.
         """
-        self.messages.append(Message(role="user", content=message))
+        if not isinstance(message, Message):
+            message = Message(role="user", content=message)
+        self._append(message)
 
-    def add_assistant_message(self, message: str):
+    def add_assistant_message(self, message: str | Message):
         """
         Add an assistant message to the chat history.
         """
-        self.messages.append(Message(role="assistant", content=message))
+        if not isinstance(message, Message):
+            message = Message(role="assistant", content=message)
+        self._append(message)
+
+    def has_content(self, content: str) -> bool:
+        """
+        Check whether a message of the history has this exact content, with a single hash lookup.
+        The index is built once per `set_messages` and kept up to date by `add_*_message`.
+        """
+        try:
+            if self._contents is None:
+                self._contents = {message.content for message in self._messages}
+            return content in self._contents
+        except TypeError:
+            # Unhashable contents, e.g. multi-part contents set by hand
+            self._contents = None
+            return any(message.content == content for message in self._messages)
 
     def set_messages(self, messages: list[Message]):
         """
@@ -132,6 +501,16 @@ class ChatHistory:
         """
         self.messages = messages
 
+    def window(self, length: int) -> tuple[Message, ...]:
+        """
+        Get the last `length` messages, padded at the beginning with empty messages if necessary.
+        Same messages as `get_messages(length)`, as a read-only tuple computed once per history change.
+        """
+        window = self._windows.get(length)
+        if window is None:
+            window = self._windows[length] = tuple(self.get_messages(length))
+        return window
+
     def get_messages(self, length: int = 0) -> list[Message]:
         """
         Get the messages from the chat history.
@@ -155,17 +534,19 @@ class ChatHistory:
             length = len(self.messages)
         if length > len(self.messages):
             # Pad with empty strings at the beginning
-            pad = [Message("", "")] * (length - len(self.messages))
-            return pad + self.messages
+            pad = [self.PAD] * (length - len(self._messages))
+            return pad + self._messages
         else:
-            return self.messages[-length:]
+            return self._messages[-length:]
 
     def remove_message(self, index: int):
         """
         Remove a message from the chat history.
         """
-        if 0 <= index < len(self.messages):
-            del self.messages[index]
+        if 0 <= index < len(self._messages):
+            del self._messages[index]
+            self._windows.clear()
+            self._contents = None
         else:
             raise IndexError("Index out of range")
 
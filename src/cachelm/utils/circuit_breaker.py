@@ -0,0 +1,169 @@
+import time
+from threading import Lock, Thread
+from typing import Callable
+
+from loguru import logger
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker bypassing a failing or slow cache backend.
+
+    The breaker starts closed and lets every lookup through. After `failure_threshold` consecutive
+    failures (errors, timeouts or calls slower than `slow_call_duration`) it opens: lookups are
+    bypassed and requests go straight upstream. After `cooldown` seconds:
+        - if a `probe` is set, it's run in the background until it succeeds, then the breaker closes.
+        - otherwise the breaker is half-open: the next lookup is let through as a trial, and closes
+          the breaker on success or opens it again on failure.
+
+    Example:
+        from cachelm.utils.circuit_breaker import CircuitBreaker
+
+        adaptor = OpenAIAdaptor(
+            ...,
+            lookup_timeout=0.05,
+            circuit_breaker=CircuitBreaker(failure_threshold=3, cooldown=30),
+        )
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        slow_call_duration: float | None = None,
+        probe: Callable[[], bool] | None = None,
+    ):
+        """
+        Initialize the circuit breaker.
+        Args:
+            failure_threshold (int): Consecutive failures opening the breaker (default: 3).
+            cooldown (float): Seconds the backend is bypassed before being probed again (default: 30).
+            slow_call_duration (float | None): Calls slower than this many seconds count as failures (default: None).
+            probe (Callable[[], bool] | None): Health check returning True when the backend is healthy again.
+        """
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_call_duration = slow_call_duration
+        self.probe = probe
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.bypassed = 0
+        self.failures = 0
+        self.trips = 0
+        self.probes = 0
+        self._probe_thread: Thread | None = None
+        self._lock = Lock()
+
+    def allow(self) -> bool:
+        """
+        Check whether a call may go to the backend.
+        Counts the call as bypassed if it may not.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if (
+                self.state == self.OPEN
+                and self.probe is None
+                and time.monotonic() - self.opened_at >= self.cooldown
+            ):
+                # Let a single trial call through
+                self.state = self.HALF_OPEN
+                return True
+            self.bypassed += 1
+            return False
+
+    def is_open(self) -> bool:
+        """
+        Check whether the backend is currently bypassed.
+        """
+        return self.state != self.CLOSED
+
+    def record_success(self, duration: float = 0.0):
+        """
+        Record a successful call, slower calls than `slow_call_duration` count as failures.
+        """
+        if self.slow_call_duration is not None and duration > self.slow_call_duration:
+            self.record_failure()
+            return
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                logger.info("Circuit breaker closed, backend restored")
+
+    def record_failure(self):
+        """
+        Record a failed call, opening the breaker after `failure_threshold` consecutive failures.
+        """
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED
+                and self.consecutive_failures >= self.failure_threshold
+            ):
+                self._open()
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        logger.warning(
+            f"Circuit breaker opened, bypassing the cache for {self.cooldown}s"
+        )
+        if self.probe is not None and (
+            self._probe_thread is None or not self._probe_thread.is_alive()
+        ):
+            self._probe_thread = Thread(target=self._run_probe, daemon=True)
+            self._probe_thread.start()
+
+    def _run_probe(self):
+        """
+        Probe the backend every `cooldown` seconds until it's healthy again.
+        """
+        while True:
+            time.sleep(self.cooldown)
+            self.probes += 1
+            try:
+                healthy = self.probe()
+            except Exception as e:
+                logger.warning(f"Circuit breaker probe failed: {e}")
+                healthy = False
+            if healthy:
+                with self._lock:
+                    self.state = self.CLOSED
+                    self.consecutive_failures = 0
+                logger.info("Circuit breaker closed, backend restored")
+                return
+
+    def reset(self):
+        """
+        Close the breaker and clear the counters.
+        """
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self.bypassed = 0
+            self.failures = 0
+            self.trips = 0
+            self.probes = 0
+
+    def stats(self) -> dict:
+        """
+        Get the breaker state and counters.
+        """
+        return {
+            "state": self.state,
+            "bypassed": self.bypassed,
+            "failures": self.failures,
+            "trips": self.trips,
+            "probes": self.probes,
+        }
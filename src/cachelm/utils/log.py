@@ -0,0 +1,61 @@
+import random
+from functools import partial
+
+from loguru import logger
+
+HOT_PATH_MAX_CHARS = 200
+
+_sample_rate = 1.0
+_max_chars = HOT_PATH_MAX_CHARS
+# Built once, `opt` costs more than a filtered record. Sinks live in the core shared by every logger.
+_lazy_logger = logger.opt(lazy=True, depth=1)
+
+
+def configure_hot_path_logging(
+    sample_rate: float = 1.0, max_chars: int = HOT_PATH_MAX_CHARS
+):
+    """
+    Configure the records logged on every lookup and write.
+    Args:
+        sample_rate (float): Share of the hot-path records that are logged (default: 1.0, all of them).
+        max_chars (int): Histories and responses are truncated to this many characters (default: 200).
+    """
+    global _sample_rate, _max_chars
+    if not isinstance(sample_rate, (int, float)):
+        raise TypeError("sample_rate must be a number")
+    if not 0 <= sample_rate <= 1:
+        raise ValueError("sample_rate must be in [0, 1]")
+    if not isinstance(max_chars, int):
+        raise TypeError("max_chars must be an integer")
+    if max_chars <= 0:
+        raise ValueError("max_chars must be positive")
+    _sample_rate = sample_rate
+    _max_chars = max_chars
+
+
+def truncate(value, max_chars: int | None = None) -> str:
+    """
+    Format a value for a log record, truncated to `max_chars` characters.
+    """
+    text = str(value)
+    limit = _max_chars if max_chars is None else max_chars
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text) - limit} more chars)"
+
+
+def log_hot(level: str, message: str, *payloads):
+    """
+    Log a record from a hot path, like a lookup or a write.
+    The payloads are formatted and truncated only if a sink accepts the record, so a filtered record
+    costs a level check instead of formatting the whole history.
+    Args:
+        level (str): The level of the record, e.g. "INFO".
+        message (str): The message, with a "{}" placeholder per payload.
+        *payloads: The values formatted into the message.
+    """
+    if _sample_rate < 1 and random.random() >= _sample_rate:
+        return
+    _lazy_logger.log(
+        level, message, *[partial(truncate, payload) for payload in payloads]
+    )
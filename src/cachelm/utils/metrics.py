@@ -0,0 +1,429 @@
+import bisect
+import math
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Callable, ContextManager
+
+from loguru import logger
+
+# Upper bounds of the latency histograms, in seconds
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+# Upper bounds of the similarity histograms, 1 - cosine distance of the best match
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict) -> Labels:
+    if not labels:
+        return ()
+    if len(labels) == 1:
+        ((key, value),) = labels.items()
+        return ((key, str(value)),)
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram: the count of values in each bucket (not cumulative), and their sum.
+    """
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = tuple(buckets)
+        # One more bucket for the values above the largest bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile by linear interpolation within its bucket.
+        """
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                low = self.buckets[i - 1] if i else 0.0
+                return low + (self.buckets[i] - low) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict(zip((*self.buckets, math.inf), self.counts)),
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class SpanHook:
+    """
+    Base class of the tracing hooks, opening a span around every timed operation.
+    """
+
+    def span(self, name: str, attributes: dict[str, str]) -> ContextManager:
+        """
+        Open a span.
+        Args:
+            name (str): Name of the timed operation and its label values, e.g. "cachelm_database.find".
+            attributes (dict[str, str]): The labels of the operation.
+        Returns:
+            ContextManager: The span, entered for the duration of the operation.
+        """
+        raise NotImplementedError("span method not implemented")
+
+
+class OpenTelemetryHook(SpanHook):
+    """
+    Span hook reporting the timed operations of cachelm as OpenTelemetry spans, so a slow request can
+    be broken down in the tracing backend. Spans are children of the span current in the calling thread.
+
+    Example:
+        from cachelm.utils.metrics import Metrics, OpenTelemetryHook
+
+        metrics = Metrics(span_hooks=[OpenTelemetryHook()])
+    """
+
+    def __init__(self, tracer=None):
+        """
+        Initialize the hook.
+        Args:
+            tracer: The OpenTelemetry tracer to create the spans with (default: the "cachelm" tracer
+                of the global tracer provider).
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            raise ImportError(
+                "OpenTelemetry library is not installed. Run `pip install opentelemetry-api` to install it."
+            )
+        self.tracer = tracer or trace.get_tracer("cachelm")
+
+    def span(self, name: str, attributes: dict[str, str]) -> ContextManager:
+        return self.tracer.start_as_current_span(name, attributes=attributes)
+
+
+class _Timer:
+    """
+    Context manager observing its duration in a latency histogram, within the spans of the hooks.
+    """
+
+    __slots__ = ("metrics", "name", "labels", "spans", "start")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: dict):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.spans = None
+
+    def __enter__(self):
+        if self.metrics.span_hooks:
+            span_name = ".".join((self.name, *map(str, self.labels.values())))
+            attributes = {key: str(value) for key, value in self.labels.items()}
+            self.spans = []
+            for hook in self.metrics.span_hooks:
+                span = hook.span(span_name, attributes)
+                span.__enter__()
+                self.spans.append(span)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics._observe(
+            self.name + "_seconds",
+            _labels(self.labels),
+            time.perf_counter() - self.start,
+        )
+        if self.spans:
+            for span in reversed(self.spans):
+                span.__exit__(exc_type, exc, traceback)
+        return False
+
+
+class Metrics:
+    """
+    In-memory registry of the counters, gauges and histograms of cachelm.
+
+    Pass the same instance to the adaptor and to the instrumented vectorizer and database to get the
+    time spent in each stage of a lookup: middlewares, embedding, vector search, deserialization and
+    response construction. Read it with `snapshot()`, scrape it with a `PrometheusExporter`, and
+    trace it with span hooks such as `OpenTelemetryHook`.
+
+    Example:
+        from cachelm.utils.metrics import Metrics, PrometheusExporter
+
+        metrics = Metrics()
+        database = InstrumentedDatabase(QdrantDatabase(InstrumentedVectorizer(vectorizer, metrics)), metrics)
+        adaptor = OpenAIAdaptor(..., database=database, metrics=metrics)
+        PrometheusExporter(metrics).serve(port=9464)
+    """
+
+    def __init__(
+        self,
+        span_hooks: list[SpanHook] | None = None,
+        buckets: dict[str, tuple[float, ...]] | None = None,
+    ):
+        """
+        Initialize the registry.
+        Args:
+            span_hooks (list[SpanHook] | None): Hooks opening a span around every timed operation.
+            buckets (dict[str, tuple[float, ...]] | None): Histogram bounds by metric name
+                (default: LATENCY_BUCKETS for "*_seconds" metrics, SIMILARITY_BUCKETS for "*_similarity").
+        """
+        self.span_hooks = list(span_hooks or [])
+        self.buckets = {
+            "cachelm_similarity": SIMILARITY_BUCKETS,
+            "cachelm_shadow_answer_similarity": SIMILARITY_BUCKETS,
+            **(buckets or {}),
+        }
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self.gauges: dict[str, dict[Labels, float]] = {}
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+        self._gauge_callbacks: dict[str, dict[Labels, Callable[[], float]]] = {}
+        self._lock = Lock()
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """
+        Add to a counter.
+        """
+        key = _labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """
+        Set a gauge to a value.
+        """
+        with self._lock:
+            self.gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def register_gauge(self, name: str, callback: Callable[[], float], **labels):
+        """
+        Register a gauge read when the metrics are collected, e.g. the depth of a queue.
+        """
+        with self._lock:
+            self._gauge_callbacks.setdefault(name, {})[_labels(labels)] = callback
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Add a value to a histogram.
+        """
+        self._observe(name, _labels(labels), value)
+
+    def _observe(self, name: str, key: Labels, value: float):
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(
+                    self.buckets.get(name, LATENCY_BUCKETS)
+                )
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels) -> ContextManager:
+        """
+        Time a block into the "<name>_seconds" histogram, within a span of every hook.
+        Example:
+            with metrics.timer("cachelm_database", method="find"):
+                ...
+        """
+        return _Timer(self, name, labels)
+
+    def collect_gauges(self) -> dict[str, dict[Labels, float]]:
+        """
+        Get the gauges, reading the registered callbacks.
+        """
+        with self._lock:
+            gauges = {name: dict(series) for name, series in self.gauges.items()}
+            callbacks = [
+                (name, key, callback)
+                for name, series in self._gauge_callbacks.items()
+                for key, callback in series.items()
+            ]
+        for name, key, callback in callbacks:
+            try:
+                gauges.setdefault(name, {})[key] = float(callback())
+            except Exception as e:
+                logger.error(f"Error reading gauge {name}: {e}")
+        return gauges
+
+    def snapshot(self) -> dict:
+        """
+        Get the current value of every metric, series keyed by their labels as "key=value,..." strings.
+        Returns:
+            dict: {"counters": ..., "gauges": ..., "histograms": ...}, histograms as dicts with their
+                count, sum, bucket counts and estimated p50/p99.
+        """
+
+        def series_key(key: Labels) -> str:
+            return ",".join(f"{k}={v}" for k, v in key)
+
+        gauges = self.collect_gauges()
+        with self._lock:
+            return {
+                "counters": {
+                    name: {series_key(k): v for k, v in series.items()}
+                    for name, series in self.counters.items()
+                },
+                "gauges": {
+                    name: {series_key(k): v for k, v in series.items()}
+                    for name, series in gauges.items()
+                },
+                "histograms": {
+                    name: {series_key(k): h.to_dict() for k, h in series.items()}
+                    for name, series in self.histograms.items()
+                },
+            }
+
+    def reset(self):
+        """
+        Forget the recorded values. Registered gauges are kept.
+        """
+        with self._lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+
+
+def timer(metrics: Metrics | None, name: str, **labels) -> ContextManager:
+    """
+    Time a block with `metrics.timer`, or do nothing when metrics are disabled.
+    """
+    if metrics is None:
+        return nullcontext()
+    return metrics.timer(name, **labels)
+
+
+def _format_labels(key: Labels, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = (*key, *extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class PrometheusExporter:
+    """
+    Exporter of a `Metrics` registry in the Prometheus text exposition format.
+
+    Example:
+        from cachelm.utils.metrics import PrometheusExporter
+
+        exporter = PrometheusExporter(metrics)
+        exporter.serve(port=9464)  # Scrape http://host:9464/metrics
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, metrics: Metrics):
+        """
+        Initialize the exporter.
+        Args:
+            metrics (Metrics): The registry to export.
+        """
+        self.metrics = metrics
+        self._server: ThreadingHTTPServer | None = None
+
+    def render(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+        """
+        gauges = self.metrics.collect_gauges()
+        lines = []
+        with self.metrics._lock:
+            for name, series in sorted(self.metrics.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+            for name, series in sorted(self.metrics.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(
+                        (*histogram.buckets, math.inf), histogram.counts
+                    ):
+                        cumulative += count
+                        labels = _format_labels(key, (("le", _format_value(bound)),))
+                        lines.append(f"{name}_bucket{labels} {cumulative}")
+                    labels = _format_labels(key)
+                    lines.append(f"{name}_sum{labels} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{labels} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "0.0.0.0"):
+        """
+        Serve the metrics over HTTP from a background thread, on any path.
+        """
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", exporter.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        Thread(
+            target=self._server.serve_forever, name="cachelm-metrics", daemon=True
+        ).start()
+        logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    def stop(self):
+        """
+        Stop serving the metrics.
+        """
+        server, self._server = self._server, None
+        if server is not None:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import re
+from typing import Any, Callable, Iterable
+
+# Request arguments changing the answer of a chat completion, e.g. `partition_by=DEFAULT_PARTITION_KEYS`
+DEFAULT_PARTITION_KEYS = (
+    "model",
+    "temperature",
+    "top_p",
+    "tools",
+    "tool_choice",
+    "response_format",
+)
+
+PartitionBy = Iterable[str] | Callable[[dict], str | None]
+
+# Valid in the collection and index names of every backend (Chroma requires alphanumeric ends)
+_SAFE_NAMESPACE = re.compile(r"[A-Za-z0-9](?:[A-Za-z0-9_-]{0,38}[A-Za-z0-9])?")
+
+# Separates the database id from the namespace in collection and index names
+NAMESPACE_SEPARATOR = "__"
+
+
+def _is_unset(value: Any) -> bool:
+    """
+    Check whether a request value was left unset (None, openai.NOT_GIVEN or openai.omit).
+    """
+    return value is None or type(value).__name__ in ("NotGiven", "Omit")
+
+
+def _json_default(value: Any):
+    """
+    Fallback for values json can't serialize (pydantic models/classes, enums...).
+    """
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    return repr(value)
+
+
+def namespace_from_kwargs(kwargs: dict, partition_by: PartitionBy | None) -> str | None:
+    """
+    Derive a cache namespace from the request keyword arguments.
+    Args:
+        kwargs (dict): The keyword arguments of the request (model, temperature, tools...).
+        partition_by: Either a list of keyword argument names whose values define the partition,
+            or a callable receiving the kwargs and returning the namespace
+            (a short identifier made of letters, digits, '_' or '-').
+            If None, no partitioning is applied.
+    Returns:
+        str | None: A short, backend-safe identifier of the partition, or None if partitioning is disabled.
+    Example:
+        >>> namespace_from_kwargs({"model": "gpt-4o", "temperature": 0}, ["model"])
+        'ns_...'
+    """
+    if partition_by is None:
+        return None
+    if callable(partition_by):
+        namespace = partition_by(kwargs)
+        if namespace is not None and not isinstance(namespace, str):
+            raise TypeError(
+                f"partition_by must return a str or None, not {type(namespace).__name__}"
+            )
+        return namespace
+    key = {
+        name: kwargs[name]
+        for name in partition_by
+        if name in kwargs and not _is_unset(kwargs[name])
+    }
+    encoded = json.dumps(key, sort_keys=True, default=_json_default)
+    return _hash_namespace(encoded)
+
+
+def _hash_namespace(value: str) -> str:
+    return "ns_" + hashlib.blake2b(value.encode(), digest_size=8).hexdigest()
+
+
+def namespace_name(unique_id: str, namespace: str) -> str:
+    """
+    Name the collection or index of a namespace.
+    Namespaces made of up to 40 letters, digits, '_' or '-' are used as is, others (e.g. returned by
+    a `partition_by` callable) are replaced by their hash, so any value gives a valid name.
+    Args:
+        unique_id (str): The unique id of the database.
+        namespace (str): The namespace.
+    Returns:
+        str: "<unique_id>__<namespace>", see `NAMESPACE_SEPARATOR`.
+    Example:
+        >>> namespace_name("cachelm", "gpt-4o")
+        'cachelm__gpt-4o'
+    """
+    if not _SAFE_NAMESPACE.fullmatch(namespace):
+        namespace = _hash_namespace(namespace)
+    return f"{unique_id}{NAMESPACE_SEPARATOR}{namespace}"
@@ -0,0 +1,195 @@
+import time
+from concurrent.futures import Future
+from queue import Empty, SimpleQueue
+from threading import Lock, Thread
+
+from loguru import logger
+
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+_STOP = object()
+
+
+class BatchingVectorizer(Vectorizer):
+    """
+    Vectorizer merging the embed calls of concurrent requests into batches.
+
+    Under concurrency every request embeds its own few messages, so the model runs batches of 1 to 4
+    texts while it's far more efficient on larger ones. This wrapper queues the texts of every caller,
+    and a worker thread collects them for up to `max_wait_ms` milliseconds or `max_batch` texts, runs a
+    single `embed_many` on the wrapped vectorizer and hands each caller its own vectors.
+
+    The window size, decay and aggregation of the wrapped vectorizer are used as is.
+
+    Example:
+        from cachelm.vectorizers.batching import BatchingVectorizer
+
+        vectorizer = BatchingVectorizer(FastEmbedVectorizer(), max_batch=64, max_wait_ms=2)
+
+        # From asyncio code, without blocking the event loop:
+        vectors = await asyncio.wrap_future(vectorizer.submit(["Hello", "world"]))
+    """
+
+    def __init__(
+        self,
+        vectorizer: Vectorizer,
+        max_batch: int = 64,
+        max_wait_ms: float = 2.0,
+    ):
+        """
+        Initialize the batching vectorizer.
+        Args:
+            vectorizer (Vectorizer): The vectorizer running the batches.
+            max_batch (int): Maximum number of texts of a batch (default: 64). A call that would
+                overflow it opens the next batch, a single call with more texts is still embedded in one batch.
+            max_wait_ms (float): Milliseconds the first call of a batch waits for others to join it
+                (default: 2). 0 only batches the calls already queued.
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        if max_wait_ms < 0:
+            raise ValueError(
+                "max_wait_ms must be a non-negative number of milliseconds"
+            )
+        super().__init__(
+            decay=vectorizer.decay,
+            aggregate_method=vectorizer.aggregate_method,
+            window_size=vectorizer.window_size,
+        )
+        self.aggregator = vectorizer.aggregator
+        self.vectorizer = vectorizer
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: SimpleQueue = SimpleQueue()
+        self._worker: Thread | None = None
+        # Call held back from a full batch to open the next one, only touched by the worker
+        self._held = None
+        self._lock = Lock()
+        self._closed = False
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.max_queue_depth = 0
+        self.batch_sizes: dict[int, int] = {}
+
+    def embedding_dimension(self, effective=True) -> int:
+        return self.vectorizer.embedding_dimension(effective)
+
+    def submit(self, texts: list[str]) -> Future:
+        """
+        Queue texts to embed in the next batch.
+        Args:
+            texts (list[str]): The texts to embed.
+        Returns:
+            Future: Resolves to the list of embedded vectors, in the order of the texts.
+        """
+        future = Future()
+        if not texts:
+            future.set_result([])
+            return future
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BatchingVectorizer is closed")
+            if self._worker is None:
+                self._worker = Thread(
+                    target=self._run, name="cachelm-batching", daemon=True
+                )
+                self._worker.start()
+            self.requests += 1
+            self._queue.put((list(texts), future))
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return future
+
+    def embed(self, text: str) -> list[float]:
+        return self.submit([text]).result()[0]
+
+    def embed_many(self, text: list[str]) -> list[list[float]]:
+        return self.submit(text).result()
+
+    def _collect(self, first) -> tuple[list, bool]:
+        """
+        Collect the calls joining the batch opened by `first`.
+        Returns the calls of the batch and whether the worker was asked to stop.
+        """
+        batch = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            if size + len(item[0]) > self.max_batch:
+                self._held = item
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch, False
+
+    def _run(self):
+        while True:
+            if self._held is not None:
+                item, self._held = self._held, None
+            else:
+                item = self._queue.get()
+            if item is _STOP:
+                return
+            batch, stop = self._collect(item)
+            self._embed_batch(batch)
+            if stop:
+                return
+
+    def _embed_batch(self, batch: list):
+        texts = [text for call_texts, _ in batch for text in call_texts]
+        self.batches += 1
+        self.texts += len(texts)
+        bucket = 1
+        while bucket < len(texts):
+            bucket *= 2
+        self.batch_sizes[bucket] = self.batch_sizes.get(bucket, 0) + 1
+        try:
+            vectors = self.vectorizer.embed_many(texts)
+        except Exception as e:
+            logger.error(f"Error embedding batch of {len(texts)} texts: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        start = 0
+        for call_texts, future in batch:
+            future.set_result(vectors[start : start + len(call_texts)])
+            start += len(call_texts)
+
+    def close(self):
+        """
+        Embed the calls already queued and stop the worker thread.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+            if worker is not None:
+                self._queue.put(_STOP)
+        if worker is not None:
+            worker.join()
+
+    def stats(self) -> dict:
+        """
+        Get the queue depth and the batch size histogram.
+        Batch sizes are counted in texts, bucketed by the next power of two.
+        """
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+        }
@@ -0,0 +1,299 @@
+import hashlib
+import sqlite3
+import time
+from threading import Lock
+from typing import Iterable
+
+import numpy as np
+from loguru import logger
+
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+
+class SQLiteEmbeddingStore:
+    """
+    Disk-backed store of float32 embeddings, keyed by model name and text hash.
+
+    Entries are evicted least recently used first once the store holds more than `max_entries`.
+    Reads only record their access time in memory, it's written with the next batch of entries, on
+    `flush`, or once `max_touched` entries or `flush_interval` seconds of access times are pending,
+    so most lookups don't write to disk. The database runs in WAL mode, the worker processes of a
+    host can share the same file.
+    """
+
+    # SQLite limits the number of variables of a statement
+    QUERY_CHUNK = 500
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int | None = 1_000_000,
+        max_touched: int = 10_000,
+        flush_interval: float = 60.0,
+    ):
+        """
+        Initialize the store.
+        Args:
+            path (str): Path of the SQLite database file, created if needed.
+            max_entries (int | None): Maximum number of embeddings kept (default: 1,000,000, None for no limit).
+            max_touched (int): Pending access times written by the read reaching it (default: 10,000).
+            flush_interval (float): Seconds after which pending access times are written by the next read
+                (default: 60).
+        """
+        if max_entries is not None and max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        if max_touched < 1:
+            raise ValueError("max_touched must be at least 1")
+        self.path = path
+        self.max_entries = max_entries
+        self.max_touched = max_touched
+        self.flush_interval = flush_interval
+        self._lock = Lock()
+        self._touched: dict[tuple[str, bytes], float] = {}
+        self._flushed_at = time.monotonic()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                hash BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            ) WITHOUT ROWID
+            """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._connection.commit()
+        self.evictions = 0
+
+    @staticmethod
+    def text_hash(text: str) -> bytes:
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def get_many(self, model: str, hashes: list[bytes]) -> dict[bytes, np.ndarray]:
+        """
+        Get the stored embeddings of the given text hashes.
+        Returns:
+            dict[bytes, np.ndarray]: The float32 embeddings found, by text hash.
+        """
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(hashes), self.QUERY_CHUNK):
+                chunk = hashes[i : i + self.QUERY_CHUNK]
+                rows = self._connection.execute(
+                    "SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN "
+                    f"({', '.join('?' * len(chunk))})",
+                    (model, *chunk),
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype="<f4")
+                    self._touched[(model, text_hash)] = now
+            if self._touched and (
+                len(self._touched) >= self.max_touched
+                or time.monotonic() - self._flushed_at >= self.flush_interval
+            ):
+                try:
+                    self._write([])
+                except sqlite3.Error as e:
+                    # Access times only drive evictions, losing them is harmless
+                    logger.warning(f"Error writing access times to {self.path}: {e}")
+        return found
+
+    def put_many(self, model: str, entries: Iterable[tuple[bytes, np.ndarray]]):
+        """
+        Store embeddings, evicting the least recently used ones past `max_entries`.
+        """
+        now = time.time()
+        rows = [
+            (model, text_hash, np.asarray(vector, dtype="<f4").tobytes(), now)
+            for text_hash, vector in entries
+        ]
+        with self._lock:
+            self._write(rows)
+
+    def flush(self):
+        """
+        Write the access times of the entries read since the last write.
+        """
+        with self._lock:
+            self._write([])
+
+    def _write(self, rows: list[tuple]):
+        touched = [
+            (last_used, model, text_hash)
+            for (model, text_hash), last_used in self._touched.items()
+        ]
+        self._touched = {}
+        self._flushed_at = time.monotonic()
+        with self._connection:
+            if touched:
+                self._connection.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    touched,
+                )
+            if rows:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, hash, vector, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                self._evict()
+
+    def _evict(self):
+        if self.max_entries is None:
+            return
+        (count,) = self._connection.execute(
+            "SELECT COUNT(*) FROM embeddings"
+        ).fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        # Evict a little more than needed, so that every write past the limit doesn't evict
+        excess += self.max_entries // 20
+        deleted = self._connection.execute(
+            "DELETE FROM embeddings WHERE (model, hash) IN "
+            "(SELECT model, hash FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        ).rowcount
+        self.evictions += deleted
+        logger.debug(f"Evicted {deleted} embeddings from {self.path}")
+
+    def size(self) -> int:
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()
+        return count
+
+    def close(self):
+        with self._lock:
+            self._write([])
+            self._connection.close()
+
+
+class CachedVectorizer(Vectorizer):
+    """
+    Vectorizer reading embeddings through a persistent on-disk store.
+
+    Texts already embedded by the same model, in this process or a previous one, are read from the
+    store instead of being embedded again, so restarts and reindexing jobs skip the model for the
+    texts seen before. Embeddings are stored as float32, and returned as float32 on both hits and
+    misses, so the same text always gets the same vector.
+
+    The window size, decay and aggregation of the wrapped vectorizer are used as is.
+
+    Example:
+        from cachelm.vectorizers.cached import CachedVectorizer
+
+        vectorizer = CachedVectorizer(FastEmbedVectorizer(), "/var/cache/cachelm/embeddings.db")
+        vectorizer.prefetch(texts)  # Embed a corpus ahead of time, in batches
+    """
+
+    def __init__(
+        self,
+        vectorizer: Vectorizer,
+        path: str,
+        model_name: str | None = None,
+        max_entries: int | None = 1_000_000,
+    ):
+        """
+        Initialize the cached vectorizer.
+        Args:
+            vectorizer (Vectorizer): The vectorizer embedding the texts missing from the store.
+            path (str): Path of the SQLite database file, created if needed.
+            model_name (str | None): Name of the model, part of the key of the stored embeddings
+                (default: the `model_name` of the vectorizer).
+            max_entries (int | None): Maximum number of embeddings kept (default: 1,000,000, None for no limit).
+        """
+        model_name = model_name or getattr(vectorizer, "model_name", None)
+        if not model_name:
+            raise ValueError(
+                "model_name is required for vectorizers without a model_name attribute"
+            )
+        super().__init__(
+            decay=vectorizer.decay,
+            aggregate_method=vectorizer.aggregate_method,
+            window_size=vectorizer.window_size,
+        )
+        self.aggregator = vectorizer.aggregator
+        self.vectorizer = vectorizer
+        self.model_name = model_name
+        self.store = SQLiteEmbeddingStore(path, max_entries=max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def _embed_array(self, texts: list[str]) -> list[np.ndarray]:
+        hashes = [SQLiteEmbeddingStore.text_hash(text) for text in texts]
+        unique = list(dict.fromkeys(hashes))
+        try:
+            found = self.store.get_many(self.model_name, unique)
+        except sqlite3.Error as e:
+            # e.g. "database is locked" when processes share the file, embed everything instead
+            logger.error(f"Error reading embeddings from {self.store.path}: {e}")
+            found = {}
+        self.hits += len(found)
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in found and text_hash not in missing:
+                missing[text_hash] = text
+        if missing:
+            self.misses += len(missing)
+            vectors = np.asarray(
+                self.vectorizer.embed_many(list(missing.values())), dtype="<f4"
+            )
+            computed = dict(zip(missing, vectors))
+            try:
+                self.store.put_many(self.model_name, computed.items())
+            except sqlite3.Error as e:
+                logger.error(f"Error writing embeddings to {self.store.path}: {e}")
+            found.update(computed)
+        return [found[text_hash] for text_hash in hashes]
+
+    def embed(self, text: str) -> list[float]:
+        return self._embed_array([text])[0].tolist()
+
+    def embed_many(self, text: list[str]) -> list[list[float]]:
+        if not text:
+            return []
+        return np.stack(self._embed_array(text)).tolist()
+
+    def prefetch(self, texts: Iterable[str], batch_size: int = 256) -> int:
+        """
+        Embed and store the texts missing from the store, in batches.
+        Args:
+            texts (Iterable[str]): The texts to prefetch, e.g. the messages of a corpus to reindex.
+            batch_size (int): Number of texts looked up and embedded at once (default: 256).
+        Returns:
+            int: Number of texts that had to be embedded.
+        """
+        misses = self.misses
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= batch_size:
+                self._embed_array(batch)
+                batch = []
+        if batch:
+            self._embed_array(batch)
+        return self.misses - misses
+
+    def stats(self) -> dict:
+        """
+        Get the hit and miss counters of the store.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.store.evictions,
+            "size": self.store.size(),
+        }
+
+    def close(self):
+        """
+        Write the pending access times and close the store.
+        """
+        self.store.close()
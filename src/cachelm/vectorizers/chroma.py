@@ -15,11 +15,13 @@ class ChromaVectorizer(Vectorizer):
     ChromaDB embedding function.
     """
 
+    DEFAULT_MODEL = "shibing624/text2vec-base-chinese"
+
     def __init__(
         self,
-        vectorizer: embedding_functions.EmbeddingFunction[
-            embedding_functions.Documents
-        ] = embedding_functions.Text2VecEmbeddingFunction(),
+        vectorizer: (
+            embedding_functions.EmbeddingFunction[embedding_functions.Documents] | None
+        ) = None,
         decay: float = 0.4,
         aggregate_method: AggregateMethod = AggregateMethod.CONCATENATE,
         window_size: int = 4,
@@ -27,7 +29,8 @@ class ChromaVectorizer(Vectorizer):
         """
         Initialize the ChromaDB embedding function
         Args:
-            vectorizer (embedding_functions.EmbeddingFunction[Documents]): The ChromaDB vectorizer to use.
+            vectorizer (embedding_functions.EmbeddingFunction[Documents] | None): The ChromaDB vectorizer to use
+                (default: a Text2VecEmbeddingFunction running DEFAULT_MODEL, loaded on first use).
             decay (float): The decay factor for embedding weights.
             aggregate_method (AggregateMethod): The method to use for aggregating embeddings.
             window_size (int): The size of the window for aggregation.
@@ -35,14 +38,27 @@ class ChromaVectorizer(Vectorizer):
         super().__init__(
             decay=decay, aggregate_method=aggregate_method, window_size=window_size
         )
-        if not isinstance(
+        if vectorizer is not None and not isinstance(
             vectorizer,
             embedding_functions.EmbeddingFunction,
         ):
             raise TypeError(
                 "vectorizer must be an instance of chromadb.EmbeddingFunction[Documents] "
             )
-        self.vectorizer = vectorizer
+        self._vectorizer = vectorizer
+        if vectorizer is None:
+            self.model_name = self.DEFAULT_MODEL
+
+    @property
+    def vectorizer(self) -> embedding_functions.EmbeddingFunction:
+        """
+        The ChromaDB embedding function, the default model is loaded on first access.
+        """
+        if self._vectorizer is None:
+            self._vectorizer = embedding_functions.Text2VecEmbeddingFunction(
+                model_name=self.DEFAULT_MODEL
+            )
+        return self._vectorizer
 
     def embed(self, text):
         """
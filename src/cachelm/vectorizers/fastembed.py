@@ -45,6 +45,7 @@ class FastEmbedVectorizer(Vectorizer):
         super().__init__(
             decay=decay, aggregate_method=aggregate_method, window_size=window_size
         )
+        self.model_name = model_name
         self.embedding_model = TextEmbedding(
             model_name=model_name,
             cache_dir=cache_dir,
@@ -0,0 +1,233 @@
+import numpy as np
+
+from cachelm.utils.aggregator import AggregateMethod
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+_MIX_1 = np.uint64(0xFF51AFD7ED558CCD)
+_MIX_2 = np.uint64(0xC4CEB9FE1A85EC53)
+_SHIFT = np.uint64(33)
+
+
+def _mix(hashes: np.ndarray) -> np.ndarray:
+    """
+    Finalizer of MurmurHash3, spreading the entropy of 64-bit hashes over all their bits.
+    """
+    hashes = hashes ^ (hashes >> _SHIFT)
+    hashes = hashes * _MIX_1
+    hashes = hashes ^ (hashes >> _SHIFT)
+    hashes = hashes * _MIX_2
+    return hashes ^ (hashes >> _SHIFT)
+
+
+def ngram_hashes(
+    texts: list[str], ngram_range: tuple[int, int], lowercase: bool = True
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Hash the character n-grams of texts, on their UTF-8 bytes.
+    Args:
+        texts (list[str]): The texts to hash.
+        ngram_range (tuple[int, int]): Smallest and largest n-gram length, in bytes.
+        lowercase (bool): Whether the texts are lowercased first.
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The uint64 hash of every n-gram, and the index of its text.
+            N-grams are ordered by text.
+    """
+    encoded = [(text.lower() if lowercase else text).encode() for text in texts]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    low, high = ngram_range
+    hashes = []
+    rows = []
+    with np.errstate(over="ignore"):
+        for n in range(low, high + 1):
+            if len(data) < n:
+                continue
+            windows = np.lib.stride_tricks.sliding_window_view(data, n)
+            powers = np.uint64(0x100000001B3) ** np.arange(n, dtype=np.uint64)
+            n_hashes = _mix((windows * powers).sum(axis=1) + np.uint64(n))
+            # Keep the windows lying within a single text
+            counts = np.maximum(lengths - n + 1, 0)
+            row = np.repeat(np.arange(len(texts)), counts)
+            offset = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            hashes.append(n_hashes[np.repeat(starts, counts) + offset])
+            rows.append(row)
+    if not hashes:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    hashes = np.concatenate(hashes)
+    rows = np.concatenate(rows)
+    order = np.argsort(rows, kind="stable")
+    return hashes[order], rows[order]
+
+
+class HashingVectorizer(Vectorizer):
+    """
+    Feature hashing vectorizer over character n-grams, without any model.
+
+    Every n-gram of the UTF-8 bytes of a text is hashed to one of `dimension` buckets, with a sign
+    from another bit of its hash so collisions cancel out on average, and the vector is L2 normalized.
+    Texts sharing most of their n-grams get close vectors: it catches near-duplicate requests (typos,
+    punctuation, casing) but not paraphrases. Deterministic across processes and machines, which makes
+    it a good fixture for tests and benchmarks, and a very cheap first tier in front of a real model.
+
+    Example:
+        from cachelm.vectorizers.hashing import HashingVectorizer
+
+        vectorizer = HashingVectorizer(dimension=1024, ngram_range=(3, 5))
+    """
+
+    def __init__(
+        self,
+        dimension: int = 1024,
+        ngram_range: tuple[int, int] = (3, 5),
+        lowercase: bool = True,
+        decay: float = 0.4,
+        aggregate_method: AggregateMethod = AggregateMethod.CONCATENATE,
+        window_size: int = 4,
+    ):
+        """
+        Initialize the hashing vectorizer.
+        Args:
+            dimension (int): Number of hash buckets, the dimension of the vectors (default: 1024).
+            ngram_range (tuple[int, int]): Smallest and largest n-gram length, in bytes (default: (3, 5)).
+            lowercase (bool): Whether texts are lowercased before hashing (default: True).
+            decay (float): The decay factor for embedding weights.
+            aggregate_method (AggregateMethod): The method to use for aggregating embeddings.
+            window_size (int): The size of the window for aggregation.
+        """
+        super().__init__(
+            decay=decay, aggregate_method=aggregate_method, window_size=window_size
+        )
+        if dimension < 1:
+            raise ValueError("dimension must be at least 1")
+        if not 1 <= ngram_range[0] <= ngram_range[1]:
+            raise ValueError(
+                "ngram_range must be a (min, max) pair with 1 <= min <= max"
+            )
+        self.dimension = dimension
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.model_name = (
+            f"hashing-{dimension}-{ngram_range[0]}-{ngram_range[1]}"
+            f"{'' if lowercase else '-cased'}"
+        )
+
+    def embed_array(self, texts: list[str]) -> np.ndarray:
+        """
+        Embed texts into a float32 matrix, one L2 normalized row per text.
+        """
+        hashes, rows = ngram_hashes(texts, self.ngram_range, self.lowercase)
+        buckets = (hashes % np.uint64(self.dimension)).astype(np.int64)
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        vectors = np.bincount(
+            rows * self.dimension + buckets,
+            weights=signs,
+            minlength=len(texts) * self.dimension,
+        ).reshape(len(texts), self.dimension)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def embed(self, text: str) -> list[float]:
+        return self.embed_array([text])[0].tolist()
+
+    def embed_many(self, text: list[str]) -> list[list[float]]:
+        if not text:
+            return []
+        return self.embed_array(text).tolist()
+
+
+class SimHashVectorizer(Vectorizer):
+    """
+    SimHash vectorizer over character n-grams, without any model.
+
+    Each of the `bits` dimensions is the sign of the sum of one pseudo-random ±1 projection of every
+    n-gram, scaled so vectors have a unit norm. N-grams are first counted in `buckets` hash buckets,
+    so the sums are a single matrix product of the counts. The cosine similarity of two vectors is
+    1 - 2 * hamming_distance / bits: texts sharing most of their n-grams differ in few bits.
+    Vectors are binary, so they compress well and are cheap to compare for near-duplicate detection.
+
+    Example:
+        from cachelm.vectorizers.hashing import SimHashVectorizer
+
+        vectorizer = SimHashVectorizer(bits=256)
+    """
+
+    def __init__(
+        self,
+        bits: int = 256,
+        buckets: int = 4096,
+        ngram_range: tuple[int, int] = (3, 5),
+        lowercase: bool = True,
+        decay: float = 0.4,
+        aggregate_method: AggregateMethod = AggregateMethod.CONCATENATE,
+        window_size: int = 4,
+    ):
+        """
+        Initialize the SimHash vectorizer.
+        Args:
+            bits (int): Number of bits of the signatures, a multiple of 64 (default: 256).
+            buckets (int): Number of buckets n-grams are hashed to before the projection (default: 4096).
+            ngram_range (tuple[int, int]): Smallest and largest n-gram length, in bytes (default: (3, 5)).
+            lowercase (bool): Whether texts are lowercased before hashing (default: True).
+            decay (float): The decay factor for embedding weights.
+            aggregate_method (AggregateMethod): The method to use for aggregating embeddings.
+            window_size (int): The size of the window for aggregation.
+        """
+        super().__init__(
+            decay=decay, aggregate_method=aggregate_method, window_size=window_size
+        )
+        if bits < 64 or bits % 64:
+            raise ValueError("bits must be a positive multiple of 64")
+        if buckets < 1:
+            raise ValueError("buckets must be at least 1")
+        if not 1 <= ngram_range[0] <= ngram_range[1]:
+            raise ValueError(
+                "ngram_range must be a (min, max) pair with 1 <= min <= max"
+            )
+        self.bits = bits
+        self.buckets = buckets
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.model_name = (
+            f"simhash-{bits}-{buckets}-{ngram_range[0]}-{ngram_range[1]}"
+            f"{'' if lowercase else '-cased'}"
+        )
+        self._projection: np.ndarray | None = None
+
+    def _projections(self) -> np.ndarray:
+        if self._projection is None:
+            # One pseudo-random ±1 projection per bucket and bit, from 64 bits per hash
+            with np.errstate(over="ignore"):
+                seeds = np.arange(self.buckets * (self.bits // 64), dtype=np.uint64)
+                hashes = _mix(seeds + _MIX_2).reshape(self.buckets, self.bits // 64)
+            bits = np.unpackbits(np.ascontiguousarray(hashes).view(np.uint8), axis=1)
+            self._projection = 2 * bits.astype(np.float32) - 1
+        return self._projection
+
+    def embed_array(self, texts: list[str]) -> np.ndarray:
+        """
+        Embed texts into a float32 matrix of ±1/sqrt(bits) values, one row per text.
+        """
+        hashes, rows = ngram_hashes(texts, self.ngram_range, self.lowercase)
+        buckets = (hashes % np.uint64(self.buckets)).astype(np.int64)
+        # Only the buckets some n-gram fell in take part in the projection
+        used, columns = np.unique(buckets, return_inverse=True)
+        counts = np.bincount(
+            rows * len(used) + columns, minlength=len(texts) * len(used)
+        ).reshape(len(texts), len(used))
+        # Summing the projections of every n-gram is projecting their counts
+        sums = counts.astype(np.float32) @ self._projections()[used]
+        # Ties, e.g. of empty texts, count as positive
+        scale = 1 / np.sqrt(self.bits)
+        return np.where(sums >= 0, scale, -scale).astype(np.float32)
+
+    def embed(self, text: str) -> list[float]:
+        return self.embed_array([text])[0].tolist()
+
+    def embed_many(self, text: list[str]) -> list[list[float]]:
+        if not text:
+            return []
+        return self.embed_array(text).tolist()
@@ -0,0 +1,61 @@
+from cachelm.utils.metrics import Metrics
+from cachelm.vectorizers.batching import BatchingVectorizer
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+
+class InstrumentedVectorizer(Vectorizer):
+    """
+    Vectorizer timing the embeddings of the wrapped vectorizer into a `Metrics` registry.
+
+    Records:
+        - cachelm_vectorizer_seconds{method}: duration of the embed and embed_many calls.
+        - cachelm_vectorizer_texts_total: number of texts embedded.
+        - cachelm_vectorizer_queue_depth: requests waiting for a batch, when the wrapped vectorizer
+          is a `BatchingVectorizer`.
+
+    The window size, decay and aggregation of the wrapped vectorizer are used as is.
+
+    Example:
+        from cachelm.vectorizers.instrumented import InstrumentedVectorizer
+
+        vectorizer = InstrumentedVectorizer(FastEmbedVectorizer(), metrics)
+    """
+
+    def __init__(self, vectorizer: Vectorizer, metrics: Metrics):
+        """
+        Initialize the instrumented vectorizer.
+        Args:
+            vectorizer (Vectorizer): The vectorizer to instrument.
+            metrics (Metrics): The registry the timings are recorded in.
+        """
+        super().__init__(
+            decay=vectorizer.decay,
+            aggregate_method=vectorizer.aggregate_method,
+            window_size=vectorizer.window_size,
+        )
+        self.aggregator = vectorizer.aggregator
+        self.vectorizer = vectorizer
+        self.metrics = metrics
+        model_name = getattr(vectorizer, "model_name", None)
+        if model_name is not None:
+            self.model_name = model_name
+        if isinstance(vectorizer, BatchingVectorizer):
+            metrics.register_gauge(
+                "cachelm_vectorizer_queue_depth",
+                lambda: vectorizer.stats()["queue_depth"],
+            )
+
+    def embedding_dimension(self, effective=True) -> int:
+        return self.vectorizer.embedding_dimension(effective)
+
+    def embed(self, text: str) -> list[float]:
+        with self.metrics.timer("cachelm_vectorizer", method="embed"):
+            embedding = self.vectorizer.embed(text)
+        self.metrics.increment("cachelm_vectorizer_texts_total")
+        return embedding
+
+    def embed_many(self, text: list[str]) -> list[list[float]]:
+        with self.metrics.timer("cachelm_vectorizer", method="embed_many"):
+            embeddings = self.vectorizer.embed_many(text)
+        self.metrics.increment("cachelm_vectorizer_texts_total", len(text))
+        return embeddings
@@ -0,0 +1,399 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty, SimpleQueue
+from threading import Lock
+from typing import Callable
+
+import numpy as np
+from loguru import logger
+
+from cachelm.utils.aggregator import AggregateMethod
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+# Environment variables bounding the intra-op threads of the usual inference runtimes
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+_spawn_lock = Lock()
+
+
+class _WorkerDied(RuntimeError):
+    """
+    The worker process exited in the middle of a call.
+    """
+
+
+def _attach(shm: SharedMemory | None, name: str) -> SharedMemory:
+    if shm is not None and shm.name == name:
+        return shm
+    if shm is not None:
+        shm.close()
+    return SharedMemory(name=name)
+
+
+def _worker_main(factory: Callable[[], Vectorizer], conn):
+    """
+    Entry point of a worker process: embeds the texts found in the input buffer into the output buffer.
+
+    Messages from the parent are `(input_name, output_name, count, size)` tuples, `None` stops the worker.
+    The input buffer holds `count` uint32 lengths followed by the UTF-8 texts. The worker answers
+    `("ok", dimension)` once the float32 vectors are in the output buffer, `("resize", dimension)` if the
+    output buffer is too small for them, or `("error", message)`.
+    """
+    vectorizer = factory()
+    input_shm = output_shm = None
+    pending = None
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                return
+            input_name, output_name, count, size = message
+            try:
+                if pending is None or pending[0] != (input_name, count, size):
+                    input_shm = _attach(input_shm, input_name)
+                    buffer = input_shm.buf
+                    lengths = np.frombuffer(buffer, dtype=np.uint32, count=count)
+                    data = bytes(buffer[4 * count : 4 * count + size])
+                    texts = []
+                    start = 0
+                    for length in lengths.tolist():
+                        texts.append(data[start : start + length].decode())
+                        start += length
+                    del lengths
+                    vectors = np.asarray(vectorizer.embed_many(texts), dtype=np.float32)
+                    pending = ((input_name, count, size), vectors)
+                vectors = pending[1]
+                dimension = vectors.shape[1] if vectors.ndim == 2 else 0
+                output_shm = _attach(output_shm, output_name)
+                if vectors.nbytes > output_shm.size:
+                    # Keep the vectors until the parent provides a larger buffer
+                    conn.send(("resize", dimension))
+                    continue
+                out = np.ndarray(vectors.shape, dtype=np.float32, buffer=output_shm.buf)
+                out[:] = vectors
+                del out
+                pending = None
+                conn.send(("ok", dimension))
+            except Exception as e:
+                pending = None
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+    except (EOFError, KeyboardInterrupt):
+        return
+    finally:
+        for shm in (input_shm, output_shm):
+            if shm is not None:
+                shm.close()
+
+
+class _Worker:
+    """
+    A worker process and the shared memory buffers it reads texts from and writes vectors to.
+    Only used by one caller at a time.
+    """
+
+    def __init__(self, context, factory, buffer_size: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(factory, child_conn),
+            name="cachelm-vectorizer",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.input = SharedMemory(create=True, size=buffer_size)
+        self.output = SharedMemory(create=True, size=buffer_size)
+
+    @staticmethod
+    def _grow(shm: SharedMemory, size: int) -> SharedMemory:
+        if size <= shm.size:
+            return shm
+        shm.close()
+        shm.unlink()
+        return SharedMemory(create=True, size=max(size, 2 * shm.size))
+
+    def _call(self, message: tuple, timeout: float | None) -> tuple:
+        """
+        Send a request to the worker and wait for its answer, watching that the process is alive.
+        """
+        try:
+            self.conn.send(message)
+        except (BrokenPipeError, OSError) as e:
+            raise _WorkerDied(f"Vectorizer worker {self.process.pid} is gone: {e}")
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while not self.conn.poll(0.05):
+            if not self.process.is_alive():
+                raise _WorkerDied(
+                    f"Vectorizer worker {self.process.pid} exited with code {self.process.exitcode}"
+                )
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Vectorizer worker {self.process.pid} didn't answer within {timeout}s"
+                )
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise _WorkerDied(f"Vectorizer worker {self.process.pid} is gone: {e}")
+
+    def embed_many(
+        self, texts: list[str], dimension: int | None, timeout: float | None = None
+    ) -> np.ndarray:
+        encoded = [text.encode() for text in texts]
+        count = len(encoded)
+        data = b"".join(encoded)
+        self.input = self._grow(self.input, 4 * count + len(data))
+        buffer = self.input.buf
+        buffer[: 4 * count] = np.fromiter(
+            map(len, encoded), dtype=np.uint32, count=count
+        ).tobytes()
+        buffer[4 * count : 4 * count + len(data)] = data
+        if dimension:
+            self.output = self._grow(self.output, 4 * count * dimension)
+        while True:
+            status, value = self._call(
+                (self.input.name, self.output.name, count, len(data)), timeout
+            )
+            if status == "error":
+                raise RuntimeError(f"Vectorizer worker failed: {value}")
+            if status == "resize":
+                self.output = self._grow(self.output, 4 * count * value)
+                continue
+            out = np.ndarray((count, value), dtype=np.float32, buffer=self.output.buf)
+            vectors = out.copy()
+            del out
+            return vectors
+
+    def close(self, terminate: bool = False):
+        """
+        Stop the worker process and release its shared memory buffers.
+        Args:
+            terminate (bool): Kill the process instead of asking it to stop, e.g. when it's hung.
+        """
+        if not terminate:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=5)
+        self.conn.close()
+        for shm in (self.input, self.output):
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class ProcessPoolVectorizer(Vectorizer):
+    """
+    Vectorizer running replicas of a model in worker processes.
+
+    Tokenization and the pre/post-processing of embedding models hold the GIL, so a single process can't
+    keep many cores busy. This vectorizer hosts one replica per worker process, each limited to
+    `threads_per_worker` intra-op threads. Texts and float32 vectors go through shared memory buffers,
+    only a few integers are pickled per call. Calls from concurrent threads run on different workers,
+    and large `embed_many` calls are split across them.
+
+    Workers are started with the "spawn" method on first use, the factory must be picklable
+    (a module-level function or class, or a `functools.partial` of one). A worker that dies is
+    replaced and its call retried once on the replacement. A worker exceeding `call_timeout` is
+    killed and replaced, and its call fails with a TimeoutError. A worker that can't be replaced is
+    dropped from the pool, which is started again once every worker is gone.
+
+    Example:
+        from functools import partial
+        from cachelm.vectorizers.fastembed import FastEmbedVectorizer
+        from cachelm.vectorizers.process_pool import ProcessPoolVectorizer
+
+        vectorizer = ProcessPoolVectorizer(
+            partial(FastEmbedVectorizer, threads=1), workers=8, threads_per_worker=1
+        )
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Vectorizer],
+        workers: int | None = None,
+        threads_per_worker: int | None = 1,
+        min_split_size: int = 32,
+        buffer_size: int = 1 << 20,
+        decay: float = 0.4,
+        aggregate_method: AggregateMethod = AggregateMethod.CONCATENATE,
+        window_size: int = 4,
+        call_timeout: float | None = None,
+    ):
+        """
+        Initialize the process pool vectorizer.
+        Args:
+            factory (Callable[[], Vectorizer]): Picklable callable building the vectorizer of a worker.
+            workers (int | None): Number of worker processes (default: one per CPU).
+            threads_per_worker (int | None): Intra-op threads of each worker, exported through the usual
+                thread count environment variables (default: 1). None leaves them unset.
+            min_split_size (int): Smallest number of texts sent to a worker when splitting an `embed_many`
+                call across workers (default: 32).
+            buffer_size (int): Initial size in bytes of the shared memory buffers, they grow as needed.
+            decay (float): The decay factor for embedding weights.
+            aggregate_method (AggregateMethod): The method to use for aggregating embeddings.
+            window_size (int): The size of the window for aggregation.
+            call_timeout (float | None): Seconds a worker may spend on a call before it's considered hung
+                (default: None, no limit).
+        """
+        super().__init__(
+            decay=decay, aggregate_method=aggregate_method, window_size=window_size
+        )
+        if call_timeout is not None and call_timeout <= 0:
+            raise ValueError("call_timeout must be positive")
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be at least 1")
+        if min_split_size < 1:
+            raise ValueError("min_split_size must be at least 1")
+        self.factory = factory
+        self.workers = workers or os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker
+        self.min_split_size = min_split_size
+        self.buffer_size = buffer_size
+        self.call_timeout = call_timeout
+        self.restarts = 0
+        self._dimension: int | None = None
+        self._pool: list[_Worker] = []
+        self._idle: SimpleQueue = SimpleQueue()
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = Lock()
+
+    def start(self):
+        """
+        Start the worker processes. Called on first use if needed.
+        """
+        with self._lock:
+            if self._pool:
+                return
+            self._pool = self._spawn(self.workers)
+            for worker in self._pool:
+                self._idle.put(worker)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="cachelm-process-pool"
+                )
+            logger.info(f"Started {self.workers} vectorizer worker processes")
+
+    def _spawn(self, count: int) -> list[_Worker]:
+        """
+        Start worker processes with the intra-op thread limits in their environment.
+        """
+        context = multiprocessing.get_context("spawn")
+        with _spawn_lock:
+            # Spawned processes inherit the environment at start time
+            saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+            try:
+                if self.threads_per_worker is not None:
+                    for name in THREAD_ENV_VARS:
+                        os.environ[name] = str(self.threads_per_worker)
+                return [
+                    _Worker(context, self.factory, self.buffer_size)
+                    for _ in range(count)
+                ]
+            finally:
+                for name, value in saved.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        """
+        Kill a dead or hung worker, release its buffers and start a replacement.
+        """
+        worker.close(terminate=True)
+        replacement = self._spawn(1)[0]
+        with self._lock:
+            self._pool = [replacement if w is worker else w for w in self._pool]
+        self.restarts += 1
+        logger.warning(
+            f"Replaced vectorizer worker {worker.process.pid} by {replacement.process.pid}"
+        )
+        return replacement
+
+    # Seconds between checks that the pool still has workers while waiting for an idle one
+    _IDLE_POLL = 1.0
+
+    def _acquire(self) -> _Worker:
+        """
+        Wait for an idle worker.
+        """
+        while True:
+            try:
+                return self._idle.get(timeout=self._IDLE_POLL)
+            except Empty:
+                if not self._pool:
+                    raise RuntimeError("No vectorizer worker left in the pool")
+
+    def _release(self, worker: _Worker):
+        """
+        Make a worker idle again, or drop it from the pool if it's dead (e.g. its replacement failed).
+        """
+        if worker.process.is_alive():
+            self._idle.put(worker)
+            return
+        with self._lock:
+            self._pool = [w for w in self._pool if w is not worker]
+            left = len(self._pool)
+        logger.error(
+            f"Dropped dead vectorizer worker {worker.process.pid}, {left} left in the pool"
+        )
+
+    def _run(self, texts: list[str]) -> np.ndarray:
+        worker = self._acquire()
+        try:
+            try:
+                vectors = worker.embed_many(texts, self._dimension, self.call_timeout)
+            except _WorkerDied as e:
+                logger.error(f"{e}, retrying on a new worker")
+                worker = self._replace(worker)
+                vectors = worker.embed_many(texts, self._dimension, self.call_timeout)
+            except TimeoutError:
+                worker = self._replace(worker)
+                raise
+        finally:
+            self._release(worker)
+        self._dimension = vectors.shape[1]
+        return vectors
+
+    def embed(self, text: str) -> list[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, text: list[str]) -> list[list[float]]:
+        if not text:
+            return []
+        if not self._pool:
+            self.start()
+        parts = min(self.workers, len(text) // self.min_split_size)
+        if parts <= 1:
+            return self._run(text).tolist()
+        size = -(-len(text) // parts)
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+        results = self._executor.map(self._run, chunks)
+        return np.concatenate(list(results)).tolist()
+
+    def close(self):
+        """
+        Stop the worker processes and release the shared memory buffers.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, []
+            self._idle = SimpleQueue()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        for worker in pool:
+            worker.close()
@@ -14,11 +14,11 @@ class RedisvlVectorizer(Vectorizer):
     RedisVL embedding model.
     """
 
+    DEFAULT_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
     def __init__(
         self,
-        vectorizer: BaseVectorizer = HFTextVectorizer(
-            model="sentence-transformers/all-mpnet-base-v2",
-        ),
+        vectorizer: BaseVectorizer | None = None,
         decay: float = 0.4,
         aggregate_method: AggregateMethod = AggregateMethod.CONCATENATE,
         window_size: int = 4,
@@ -26,7 +26,8 @@ class RedisvlVectorizer(Vectorizer):
         """
         Initialize the RedisVL embedding model.
         Args:
-            vectorizer (BaseVectorizer): The RedisVL vectorizer to use.
+            vectorizer (BaseVectorizer | None): The RedisVL vectorizer to use (default: a HFTextVectorizer
+                running DEFAULT_MODEL, loaded on first use).
             decay (float): The decay factor for embedding weights.
             aggregate_method (AggregateMethod): The method to use for aggregating embeddings.
             window_size (int): The size of the window for aggregation.
@@ -34,7 +35,19 @@ class RedisvlVectorizer(Vectorizer):
         super().__init__(
             decay=decay, aggregate_method=aggregate_method, window_size=window_size
         )
-        self.vectorizer = vectorizer
+        self._vectorizer = vectorizer
+        self.model_name = (
+            vectorizer.model if vectorizer is not None else self.DEFAULT_MODEL
+        )
+
+    @property
+    def vectorizer(self) -> BaseVectorizer:
+        """
+        The RedisVL vectorizer, the default model is loaded on first access.
+        """
+        if self._vectorizer is None:
+            self._vectorizer = HFTextVectorizer(model=self.DEFAULT_MODEL)
+        return self._vectorizer
 
     def embed(self, text):
         """
@@ -0,0 +1,335 @@
+import argparse
+import os
+import socket
+import socketserver
+import struct
+from queue import Empty, SimpleQueue
+from threading import Lock, Thread
+
+import numpy as np
+from loguru import logger
+
+from cachelm.utils.aggregator import AggregateMethod
+from cachelm.vectorizers.batching import BatchingVectorizer
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+# Request: count and payload size, then `count` uint32 lengths followed by the UTF-8 texts.
+_REQUEST = struct.Struct("<II")
+# Response: status, count and dimension, then the float32 vectors (status OK),
+# or the UTF-8 error message, its length in place of the count (status ERROR).
+_RESPONSE = struct.Struct("<BII")
+_OK = 0
+_ERROR = 1
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray | None:
+    """
+    Read exactly `size` bytes, None if the connection is closed before the first byte.
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            if received == 0:
+                return None
+            raise ConnectionError("Connection closed in the middle of a frame")
+        received += n
+    return buffer
+
+
+def _encode_texts(texts: list[str]) -> bytes:
+    encoded = [text.encode() for text in texts]
+    data = b"".join(encoded)
+    lengths = np.fromiter(map(len, encoded), dtype="<u4", count=len(encoded))
+    return _REQUEST.pack(len(encoded), len(data)) + lengths.tobytes() + data
+
+
+class _EmbeddingHandler(socketserver.BaseRequestHandler):
+    """
+    Serves the requests of a client connection until it's closed.
+    """
+
+    def setup(self):
+        with self.server.connections_lock:
+            self.server.connections.add(self.request)
+
+    def finish(self):
+        with self.server.connections_lock:
+            self.server.connections.discard(self.request)
+
+    def handle(self):
+        sock: socket.socket = self.request
+        while True:
+            header = _recv_exact(sock, _REQUEST.size)
+            if header is None:
+                return
+            count, size = _REQUEST.unpack(header)
+            payload = _recv_exact(sock, 4 * count + size) or b""
+            lengths = np.frombuffer(payload, dtype="<u4", count=count).tolist()
+            texts = []
+            start = 4 * count
+            for length in lengths:
+                texts.append(payload[start : start + length].decode())
+                start += length
+            try:
+                vectors = np.asarray(
+                    self.server.vectorizer.embed_many(texts), dtype="<f4"
+                )
+            except Exception as e:
+                logger.error(f"Error embedding texts for a remote client: {e}")
+                message = f"{type(e).__name__}: {e}".encode()
+                sock.sendall(_RESPONSE.pack(_ERROR, len(message), 0) + message)
+                continue
+            dimension = vectors.shape[1] if vectors.ndim == 2 else 0
+            sock.sendall(_RESPONSE.pack(_OK, count, dimension) + vectors.tobytes())
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, vectorizer: Vectorizer):
+        super().__init__(socket_path, _EmbeddingHandler)
+        self.vectorizer = vectorizer
+        self.connections: set[socket.socket] = set()
+        self.connections_lock = Lock()
+
+    def close_connections(self):
+        with self.connections_lock:
+            connections = list(self.connections)
+        for sock in connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class EmbeddingServer:
+    """
+    Embedding sidecar serving a single model instance to every worker process of a host.
+
+    Every gunicorn/uvicorn worker loading its own embedding model costs hundreds of MB and a slow boot
+    per worker. The server loads the model once and answers the `RemoteVectorizer` of each worker over
+    a Unix domain socket, with length-prefixed frames of UTF-8 texts and float32 vectors. The requests
+    of concurrent clients are merged into batches by a `BatchingVectorizer`.
+
+    Example:
+        python -m cachelm.vectorizers.remote --socket /tmp/cachelm.sock --model BAAI/bge-base-en
+
+        # Or from Python:
+        server = EmbeddingServer(FastEmbedVectorizer(), "/tmp/cachelm.sock")
+        server.start()
+    """
+
+    def __init__(
+        self,
+        vectorizer: Vectorizer,
+        socket_path: str,
+        max_batch: int = 64,
+        max_wait_ms: float = 2.0,
+    ):
+        """
+        Initialize the embedding server.
+        Args:
+            vectorizer (Vectorizer): The vectorizer serving the requests.
+            socket_path (str): Path of the Unix domain socket to listen on.
+            max_batch (int): Number of texts closing a batch (default: 64).
+            max_wait_ms (float): Milliseconds a request waits for others to join its batch (default: 2).
+                With `max_batch=1` and `max_wait_ms=0`, requests are embedded as they come.
+        """
+        self.vectorizer = (
+            BatchingVectorizer(vectorizer, max_batch=max_batch, max_wait_ms=max_wait_ms)
+            if max_wait_ms > 0 or max_batch > 1
+            else vectorizer
+        )
+        self.socket_path = socket_path
+        self._server: _UnixServer | None = None
+        self._thread: Thread | None = None
+
+    def _bind(self) -> _UnixServer:
+        if os.path.exists(self.socket_path):
+            # Stale socket of a previous run
+            os.unlink(self.socket_path)
+        server = _UnixServer(self.socket_path, self.vectorizer)
+        self._server = server
+        logger.info(f"Embedding server listening on {self.socket_path}")
+        return server
+
+    def start(self):
+        """
+        Serve in a background thread.
+        """
+        server = self._bind()
+        self._thread = Thread(
+            target=server.serve_forever, name="cachelm-embedding-server", daemon=True
+        )
+        self._thread.start()
+
+    def serve_forever(self):
+        """
+        Serve in the calling thread until interrupted.
+        """
+        server = self._bind()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Stop serving, close the client connections and remove the socket.
+        """
+        server, self._server = self._server, None
+        if server is None:
+            return
+        if self._thread is not None:
+            server.shutdown()
+            self._thread.join()
+            self._thread = None
+        server.close_connections()
+        server.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        if isinstance(self.vectorizer, BatchingVectorizer):
+            self.vectorizer.close()
+
+
+class RemoteVectorizer(Vectorizer):
+    """
+    Vectorizer delegating the embeddings to an `EmbeddingServer` of the same host.
+
+    Connections are pooled and reused across calls, and `embed_many` sends all its texts in one frame.
+    The server must run the model the cache was built with.
+
+    Example:
+        from cachelm.vectorizers.remote import RemoteVectorizer
+
+        vectorizer = RemoteVectorizer("/tmp/cachelm.sock")
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        pool_size: int = 8,
+        timeout: float | None = 10.0,
+        decay: float = 0.4,
+        aggregate_method: AggregateMethod = AggregateMethod.CONCATENATE,
+        window_size: int = 4,
+    ):
+        """
+        Initialize the remote vectorizer.
+        Args:
+            socket_path (str): Path of the Unix domain socket of the server.
+            pool_size (int): Maximum number of idle connections kept open (default: 8).
+            timeout (float | None): Socket timeout in seconds (default: 10).
+            decay (float): The decay factor for embedding weights.
+            aggregate_method (AggregateMethod): The method to use for aggregating embeddings.
+            window_size (int): The size of the window for aggregation.
+        """
+        super().__init__(
+            decay=decay, aggregate_method=aggregate_method, window_size=window_size
+        )
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._pool: SimpleQueue = SimpleQueue()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _release(self, sock: socket.socket):
+        if self._pool.qsize() < self.pool_size:
+            self._pool.put(sock)
+        else:
+            sock.close()
+
+    def _request(self, sock: socket.socket, frame: bytes) -> np.ndarray:
+        sock.sendall(frame)
+        header = _recv_exact(sock, _RESPONSE.size)
+        if header is None:
+            raise ConnectionError("Embedding server closed the connection")
+        status, count, dimension = _RESPONSE.unpack(header)
+        if status == _ERROR:
+            message = _recv_exact(sock, count) or b""
+            raise RuntimeError(f"Embedding server failed: {message.decode()}")
+        payload = _recv_exact(sock, 4 * count * dimension) or b""
+        return np.frombuffer(payload, dtype="<f4").reshape(count, dimension)
+
+    def embed(self, text: str) -> list[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, text: list[str]) -> list[list[float]]:
+        if not text:
+            return []
+        frame = _encode_texts(text)
+        try:
+            sock = self._pool.get_nowait()
+            reused = True
+        except Empty:
+            sock = self._connect()
+            reused = False
+        try:
+            vectors = self._request(sock, frame)
+        except (ConnectionError, BrokenPipeError) as e:
+            sock.close()
+            if not reused:
+                raise
+            # The pooled connection went stale (e.g. the server restarted), retry once on a new one
+            logger.debug(f"Reconnecting to the embedding server: {e}")
+            sock = self._connect()
+            try:
+                vectors = self._request(sock, frame)
+            except BaseException:
+                sock.close()
+                raise
+        except RuntimeError:
+            # The server answered with an error, the connection is still usable
+            self._release(sock)
+            raise
+        except BaseException:
+            sock.close()
+            raise
+        self._release(sock)
+        return vectors.tolist()
+
+    def close(self):
+        """
+        Close the pooled connections.
+        """
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except Empty:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a FastEmbed model to the cachelm workers of this host."
+    )
+    parser.add_argument("--socket", default="/tmp/cachelm-embeddings.sock")
+    parser.add_argument("--model", default="BAAI/bge-base-en")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    from cachelm.vectorizers.fastembed import FastEmbedVectorizer
+
+    vectorizer = FastEmbedVectorizer(model_name=args.model, threads=args.threads)
+    EmbeddingServer(
+        vectorizer,
+        args.socket,
+        max_batch=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,24 @@
 from abc import ABC, abstractmethod
-from loguru import logger
+from cachelm.utils.log import log_hot
 from cachelm.utils.aggregator import AggregateMethod, Aggregator
 
+# Output dimension of common embedding models, so it doesn't have to be probed with a real embedding
+KNOWN_EMBEDDING_DIMENSIONS = {
+    "BAAI/bge-base-en": 768,
+    "BAAI/bge-base-en-v1.5": 768,
+    "BAAI/bge-small-en": 384,
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-large-en-v1.5": 1024,
+    "intfloat/multilingual-e5-large": 1024,
+    "mixedbread-ai/mxbai-embed-large-v1": 1024,
+    "nomic-ai/nomic-embed-text-v1.5": 768,
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2": 384,
+    "shibing624/text2vec-base-chinese": 768,
+    "thenlper/gte-large": 1024,
+}
+
 
 class Vectorizer(ABC):
     """
@@ -32,14 +49,20 @@ class Vectorizer(ABC):
         """
         Get the dimension of the embedding vectors.
         This method caches the dimension after the first call to avoid repeated computation.
+        The dimension of the models listed in KNOWN_EMBEDDING_DIMENSIONS, by `model_name`, is known
+        without embedding anything.
         Args:
             effective (bool): If True, returns the effective embedding dimension based on the aggregation method.
         Returns:
             int: The dimension of the embedding vectors.
         """
         if self._embedding_dimension_cached is None:
-            temp_vector = self.embed("test")
-            self._embedding_dimension_cached = len(temp_vector)
+            known = KNOWN_EMBEDDING_DIMENSIONS.get(getattr(self, "model_name", None))
+            if known is not None:
+                self._embedding_dimension_cached = known
+            else:
+                temp_vector = self.embed("test")
+                self._embedding_dimension_cached = len(temp_vector)
 
         if effective:
             return self.aggregator.get_effective_embedding_dimension(
@@ -88,8 +111,10 @@ class Vectorizer(ABC):
         reversed_text = text[::-1][
             : self.window_size
         ]  # Reverse and limit to window size
-        logger.debug(
-            f"Splitting chat history into {len(reversed_text)} messages for embedding."
+        log_hot(
+            "DEBUG",
+            "Splitting chat history into {} messages for embedding.",
+            len(reversed_text),
         )
         embeddings = self.embed_many(reversed_text)
         return self.aggregator.aggregate(embeddings)
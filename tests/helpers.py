@@ -0,0 +1,25 @@
+import math
+import re
+import zlib
+
+from cachelm.vectorizers.vectorizer import Vectorizer
+
+
+class FakeVectorizer(Vectorizer):
+    """
+    Deterministic bag-of-words vectorizer that doesn't need any model download.
+    """
+
+    def __init__(self, dimension: int = 64, **kwargs):
+        super().__init__(**kwargs)
+        self.dimension = dimension
+
+    def embed(self, text):
+        vector = [0.0] * self.dimension
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode()) % self.dimension] += 1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_many(self, text: list[str]) -> list[list[float]]:
+        return [self.embed(t) for t in text]
@@ -0,0 +1,549 @@
+import time
+import unittest
+
+import openai
+from openai.types.chat.chat_completion import ChatCompletion, Choice
+from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+from openai.types.chat.chat_completion_message import ChatCompletionMessage
+
+from cachelm.adaptors.openai.capture import StreamCapture
+from cachelm.adaptors.openai.replay import StreamReplayer
+from cachelm.adaptors.openai.sync_openai import SyncOpenAIAdaptor
+from cachelm.middlewares.replacer import Replacement, Replacer
+from cachelm.utils.chat_history import Message
+from cachelm.utils.circuit_breaker import CircuitBreaker
+from cachelm.databases.memory import MemoryDatabase
+from tests.helpers import FakeVectorizer
+
+
+def make_completion(content: str, model: str = "gpt-4o") -> ChatCompletion:
+    return ChatCompletion(
+        id="test",
+        choices=[
+            Choice(
+                index=0,
+                finish_reason="stop",
+                message=ChatCompletionMessage(role="assistant", content=content),
+            )
+        ],
+        created=0,
+        model=model,
+        object="chat.completion",
+    )
+
+
+def make_chunk(delta: dict, model: str = "gpt-4o") -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "test",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+        }
+    )
+
+
+class TestSyncOpenAIAdaptor(unittest.TestCase):
+    def _make_adaptor(self, database=None, **kwargs) -> SyncOpenAIAdaptor:
+        return SyncOpenAIAdaptor(
+            module=openai.OpenAI(api_key="sk-test"),
+            database=database or MemoryDatabase(FakeVectorizer()),
+            **kwargs,
+        )
+
+    def test_partition_by_model(self):
+        """
+        Responses cached for one model are not served for another one.
+        """
+        adaptor = self._make_adaptor(partition_by=["model", "temperature"])
+        messages = [{"role": "user", "content": "What is the capital of France?"}]
+
+        assert adaptor._preprocess_chat(model="gpt-4o", messages=messages) is None
+        adaptor._postprocess_chat(make_completion("Paris"))
+
+        cached = adaptor._preprocess_chat(model="gpt-4o", messages=messages)
+        assert cached is not None, "Same model should hit the cache"
+        assert cached.choices[0].message.content == "Paris"
+
+        assert (
+            adaptor._preprocess_chat(model="gpt-4o-mini", messages=messages) is None
+        ), "Another model should not see the cached response"
+        assert (
+            adaptor.database.partitions.get(adaptor.namespace) is None
+        ), "Other partitions are not scanned"
+        assert (
+            adaptor._preprocess_chat(model="gpt-4o", temperature=1.2, messages=messages)
+            is None
+        ), "Other generation parameters should not see the cached response"
+
+    def test_middlewares_are_memoized_and_side_effect_free(self):
+        """
+        Middlewares only run on the window, once per message, without touching the caller's messages.
+        """
+
+        class CountingReplacer(Replacer):
+            calls = 0
+
+            def pre_cache_save(self, message, history):
+                CountingReplacer.calls += 1
+                return super().pre_cache_save(message, history)
+
+        adaptor = self._make_adaptor(
+            middlewares=[CountingReplacer([Replacement("{{name}}", "Anmol")])]
+        )
+        messages = [Message("user", f"Message {i} from Anmol") for i in range(20)] + [
+            Message("user", "Hi, I'm Anmol")
+        ]
+
+        adaptor._preprocess_chat(model="gpt-4o", messages=messages)
+        assert (
+            CountingReplacer.calls == adaptor.window_size
+        ), "Only the window is processed"
+        adaptor._preprocess_chat(model="gpt-4o", messages=messages)
+        assert CountingReplacer.calls == adaptor.window_size, "Outputs are memoized"
+        assert messages[-1].content == "Hi, I'm Anmol", "Caller messages are untouched"
+        assert adaptor._pre_cache_window()[-1].content == "Hi, I'm {{name}}"
+
+        adaptor.invalidate_middleware_cache()
+        adaptor._preprocess_chat(model="gpt-4o", messages=messages)
+        assert CountingReplacer.calls == 2 * adaptor.window_size
+
+    def test_memo_checks_tool_calls(self):
+        """
+        A memoized output is only reused for a message with the same tool calls, even on a hash collision.
+        """
+        from cachelm.utils.chat_history import ToolCall
+
+        adaptor = self._make_adaptor(
+            middlewares=[Replacer([Replacement("{{name}}", "Anmol")])]
+        )
+        pipeline = (adaptor._middleware_version, tuple(map(id, adaptor.middlewares)))
+        first = Message("assistant", "Anmol", [ToolCall("search", {"q": "a"})])
+        second = Message("assistant", "Anmol", [ToolCall("search", {"q": "b"})])
+        adaptor._pre_cache_history_message(first, pipeline, True)
+        # Simulate a collision: the second message's hash finds the first one's output
+        adaptor._middleware_memo[(pipeline, second.content_hash)] = (
+            adaptor._middleware_memo[(pipeline, first.content_hash)]
+        )
+        processed = adaptor._pre_cache_history_message(second, pipeline, True)
+        assert processed.tool_calls[0].args == {"q": "b"}, "Tool calls should match"
+        assert processed.content == "{{name}}"
+
+    def test_no_partition_by_default(self):
+        """
+        Without partition_by, every request shares the same partition.
+        """
+        adaptor = self._make_adaptor()
+        messages = [{"role": "user", "content": "What is the capital of France?"}]
+        adaptor._preprocess_chat(model="gpt-4o", messages=messages)
+        adaptor._postprocess_chat(make_completion("Paris"))
+        assert adaptor.namespace is None
+        assert adaptor._preprocess_chat(model="gpt-4o-mini", messages=messages)
+
+    def test_partition_by_callable(self):
+        """
+        A partition_by callable returns the namespace, anything but a str or None is rejected.
+        """
+        adaptor = self._make_adaptor(partition_by=lambda kwargs: kwargs["model"])
+        messages = [{"role": "user", "content": "What is the capital of France?"}]
+        adaptor._preprocess_chat(model="gpt-4o", messages=messages)
+        assert adaptor.namespace == "gpt-4o"
+
+        adaptor = self._make_adaptor(partition_by=lambda kwargs: 42)
+        with self.assertRaises(TypeError):
+            adaptor._preprocess_chat(model="gpt-4o", messages=messages)
+
+    def test_lookup_budget_and_circuit_breaker(self):
+        """
+        Slow lookups are abandoned, then bypassed until the health probe restores the database.
+        """
+
+        class SlowDatabase(MemoryDatabase):
+            slow = True
+
+            def find_with_distance(self, history, namespace=None):
+                if self.slow:
+                    time.sleep(0.3)
+                return super().find_with_distance(history, namespace)
+
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=0.2)
+        adaptor = self._make_adaptor(
+            database=SlowDatabase(FakeVectorizer()),
+            lookup_timeout=0.05,
+            circuit_breaker=breaker,
+        )
+        messages = [{"role": "user", "content": "What is the capital of France?"}]
+        for _ in range(3):
+            start = time.monotonic()
+            assert adaptor._preprocess_chat(model="gpt-4o", messages=messages) is None
+            assert time.monotonic() - start < 0.2, "Lookup should respect its budget"
+        assert adaptor.lookup_stats["timeouts"] == 2
+        assert adaptor.lookup_stats["bypassed"] == 1
+        assert breaker.state == CircuitBreaker.OPEN
+
+        time.sleep(0.4)
+        assert (
+            breaker.state == CircuitBreaker.OPEN
+        ), "Probe should not restore a database that is still slow"
+        adaptor.database.slow = False
+        time.sleep(0.4)
+        assert (
+            breaker.state == CircuitBreaker.CLOSED
+        ), "Probe should restore the database"
+        adaptor.dispose()
+
+    def test_circuit_breaker_sees_swallowed_errors(self):
+        """
+        Backends logging their errors as misses still open the breaker, and the probe keeps it open
+        until lookups succeed again.
+        """
+        from cachelm.databases import memory
+
+        class FlakyVectorizer(FakeVectorizer):
+            broken = True
+
+            def embed_many(self, text):
+                if self.broken:
+                    raise ConnectionError("embedding server is down")
+                return super().embed_many(text)
+
+        vectorizer = FlakyVectorizer()
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=0.1)
+        adaptor = self._make_adaptor(
+            database=memory.MemoryDatabase(vectorizer), circuit_breaker=breaker
+        )
+        messages = [{"role": "user", "content": "What is the capital of France?"}]
+        for _ in range(3):
+            assert adaptor._preprocess_chat(model="gpt-4o", messages=messages) is None
+        assert adaptor.lookup_stats["errors"] == 2
+        assert breaker.state == CircuitBreaker.OPEN
+
+        time.sleep(0.3)
+        assert breaker.state == CircuitBreaker.OPEN, "The backend is still failing"
+        vectorizer.broken = False
+        time.sleep(0.3)
+        assert breaker.state == CircuitBreaker.CLOSED
+        adaptor.dispose()
+
+    def test_background_startup(self):
+        """
+        With a background startup, requests bypass the cache until the database is connected.
+        """
+        from threading import Event
+
+        connected = Event()
+
+        class SlowConnectDatabase(MemoryDatabase):
+            def connect(self):
+                connected.wait(5)
+                return True
+
+        class CountingVectorizer(FakeVectorizer):
+            embedded = 0
+
+            def embed_many(self, text):
+                CountingVectorizer.embedded += len(text)
+                return super().embed_many(text)
+
+        start = time.monotonic()
+        adaptor = self._make_adaptor(
+            database=SlowConnectDatabase(CountingVectorizer()),
+            connect_in_background=True,
+            warm_up=True,
+        )
+        assert time.monotonic() - start < 1, "Startup should not block"
+        messages = [{"role": "user", "content": "What is the capital of France?"}]
+        assert not adaptor.ready
+        assert adaptor._preprocess_chat(model="gpt-4o", messages=messages) is None
+        adaptor._postprocess_chat(make_completion("Paris"))
+        assert adaptor.lookup_stats["not_ready"] == 1
+        assert adaptor.lookup_stats["skipped_writes"] == 1
+        assert CountingVectorizer.embedded == 0, "Nothing is embedded before startup"
+
+        connected.set()
+        assert adaptor.wait_until_ready(5), "Startup should complete"
+        assert CountingVectorizer.embedded == 1, "The vectorizer should be warmed up"
+        assert adaptor._preprocess_chat(model="gpt-4o", messages=messages) is None
+        adaptor._postprocess_chat(make_completion("Paris"))
+        assert adaptor._preprocess_chat(model="gpt-4o", messages=messages)
+        adaptor.dispose()
+
+    def test_streaming_replay(self):
+        """
+        Cached responses are replayed exactly, with the recorded chunk boundaries when configured.
+        """
+        adaptor = self._make_adaptor(stream_replay=StreamReplayer(chunking="recorded"))
+        messages = [{"role": "user", "content": "Write a short poem"}]
+        upstream_pieces = ["Roses  are", " red,\n", "violets", " are blue.\n"]
+        upstream = [make_chunk({"content": piece}) for piece in upstream_pieces]
+
+        assert (
+            adaptor._preprocess_streaming_chat(model="gpt-4o", messages=messages)
+            is None
+        )
+        list(adaptor._postprocess_streaming_chat(iter(upstream)))
+
+        chunks = list(
+            adaptor._preprocess_streaming_chat(model="gpt-4o", messages=messages)
+        )
+        contents = [
+            c.choices[0].delta.content for c in chunks if c.choices[0].delta.content
+        ]
+        assert contents == upstream_pieces, "Recorded boundaries should be replayed"
+        assert len({c.id for c in chunks}) == 1, "Chunks should share one id"
+        assert chunks[0].choices[0].delta.role == "assistant"
+        assert all(c.choices[0].delta.role is None for c in chunks[1:])
+        assert [c.choices[0].finish_reason for c in chunks][-2:] == [None, "stop"]
+
+        text = "".join(upstream_pieces)
+        pieces = StreamReplayer(chunking="words", chunk_size=2).split(
+            Message("assistant", text)
+        )
+        assert "".join(pieces) == text, "Word chunking should keep whitespace"
+        assert pieces[:2] == ["Roses  are", " red,\nviolets"]
+
+    def test_metrics(self):
+        """
+        Every stage of a lookup is timed, and the lookup statistics are exported as counters.
+        """
+        from cachelm.databases import memory
+        from cachelm.databases.instrumented import InstrumentedDatabase
+        from cachelm.utils.metrics import Metrics, PrometheusExporter
+        from cachelm.vectorizers.instrumented import InstrumentedVectorizer
+
+        metrics = Metrics()
+        vectorizer = InstrumentedVectorizer(FakeVectorizer(dimension=4096), metrics)
+        database = InstrumentedDatabase(memory.MemoryDatabase(vectorizer), metrics)
+        adaptor = self._make_adaptor(database=database, metrics=metrics)
+        messages = [{"role": "user", "content": "What is the capital of France?"}]
+
+        assert adaptor._preprocess_chat(model="gpt-4o", messages=messages) is None
+        adaptor._postprocess_chat(make_completion("Paris"))
+        assert adaptor._preprocess_chat(model="gpt-4o", messages=messages)
+
+        snapshot = metrics.snapshot()
+        counters = snapshot["counters"]
+        assert counters["cachelm_lookups_total"][""] == 2
+        assert counters["cachelm_hits_total"][""] == 1
+        assert counters["cachelm_misses_total"][""] == 1
+        assert counters["cachelm_writes_total"][""] == 1
+        assert adaptor.lookup_stats["misses"] == 1
+        stages = snapshot["histograms"]["cachelm_stage_seconds"]
+        for stage in (
+            "get_cache",
+            "pre_cache_middleware",
+            "lookup",
+            "post_cache_middleware",
+            "response",
+            "write",
+        ):
+            assert stages[f"stage={stage}"]["count"] > 0, f"{stage} should be timed"
+        database_calls = snapshot["histograms"]["cachelm_database_seconds"]
+        assert database_calls["method=find"]["count"] == 2
+        assert database_calls["method=write"]["count"] == 1
+        assert (
+            snapshot["histograms"]["cachelm_serializer_seconds"]["method=loads"][
+                "count"
+            ]
+            == 1
+        ), "Deserialization should be timed"
+        assert snapshot["histograms"]["cachelm_similarity"][""]["count"] == 1
+        embed_calls = snapshot["histograms"]["cachelm_vectorizer_seconds"]
+        assert (
+            embed_calls["method=embed_many"]["count"] == 3
+        ), "One call per lookup/write"
+
+        text = PrometheusExporter(metrics).render()
+        assert "# TYPE cachelm_hits_total counter\ncachelm_hits_total 1.0" in text
+        assert 'cachelm_stage_seconds_bucket{stage="lookup",le="+Inf"} 2' in text
+        assert 'cachelm_database_seconds_count{method="write"} 1' in text
+
+    def test_shadow_mode(self):
+        """
+        Shadow mode never serves the cache, but measures the would-be hits and writes the misses.
+        """
+        from cachelm.utils.metrics import Metrics
+
+        metrics = Metrics()
+        adaptor = self._make_adaptor(shadow=True, metrics=metrics)
+        messages = [{"role": "user", "content": "What is the capital of France?"}]
+
+        for answer in ("Paris", "Paris", "It's Paris"):
+            assert (
+                adaptor._preprocess_chat(model="gpt-4o", messages=messages) is None
+            ), "Shadow mode should never serve a cached response"
+            adaptor._postprocess_chat(make_completion(answer))
+        other = [{"role": "user", "content": "How do I sort a list in Python?"}]
+        adaptor._preprocess_chat(model="gpt-4o", messages=other)
+        adaptor._postprocess_chat(make_completion("sorted()"))
+        adaptor._shadow_executor.submit(lambda: None).result()
+
+        report = adaptor.shadow_report()
+        assert report["lookups"] == 4
+        assert report["would_hit"] == 2, "The first request can't hit an empty cache"
+        assert report["would_hit_rate"] == 2 / 4
+        assert report["identical_answers"] == 1
+        assert report["compared"] == 2
+        assert 0 < report["mean_answer_similarity"] < 1
+        assert (
+            adaptor.database.size() == 2
+        ), "Would-be misses populate the cache, would-be hits are not written again"
+        assert adaptor.lookup_stats["hits"] == 0
+        snapshot = metrics.snapshot()
+        assert snapshot["counters"]["cachelm_shadow_would_hit_total"][""] == 2
+        assert (
+            snapshot["histograms"]["cachelm_shadow_answer_similarity"][""]["count"] == 2
+        )
+        adaptor.dispose()
+
+        with self.assertRaises(TypeError):
+            self._make_adaptor(shadow=True, shadow_sample_rate=0)
+
+
+class TestStreamCapture(unittest.TestCase):
+    def test_parallel_tool_calls(self):
+        """
+        Interleaved deltas of parallel tool calls are assembled per index.
+        """
+
+        def tool_delta(index, name=None, arguments=None):
+            function = {"arguments": arguments}
+            if name:
+                function["name"] = name
+            return make_chunk({"tool_calls": [{"index": index, "function": function}]})
+
+        capture = StreamCapture(record_chunks=True)
+        for chunk in [
+            make_chunk({"role": "assistant", "content": ""}),
+            make_chunk({"content": "Checking "}),
+            make_chunk({"content": "both."}),
+            tool_delta(0, "get_weather", '{"city": '),
+            tool_delta(1, "get_time", '{"tz": '),
+            tool_delta(0, arguments='"Paris"}'),
+            tool_delta(1, arguments='"CET"}'),
+        ]:
+            capture.add(chunk)
+        message = capture.to_message()
+        assert message.content == "Checking both."
+        assert message.chunk_lengths == [9, 5]
+        assert [(t.tool, t.args) for t in message.tool_calls] == [
+            ("get_weather", '{"city": "Paris"}'),
+            ("get_time", '{"tz": "CET"}'),
+        ], "Each tool call should keep its own name and arguments"
+
+
+class TestAsyncOpenAIAdaptor(unittest.IsolatedAsyncioTestCase):
+    def _make_client(self, delay: float, status: int = 200) -> openai.AsyncOpenAI:
+        import asyncio
+
+        import httpx
+
+        self.upstream_calls = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.upstream_calls += 1
+            await asyncio.sleep(delay)
+            if status != 200:
+                return httpx.Response(status, json={"error": {"message": "down"}})
+            return httpx.Response(200, json=make_completion("Paris").model_dump())
+
+        return openai.AsyncOpenAI(
+            api_key="sk-test",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+
+    async def test_hedged_request_failing_upstream(self):
+        """
+        A failed upstream call is not counted as a win.
+        """
+        from cachelm.adaptors.openai.async_openai import AsyncOpenAIAdaptor
+
+        adaptor = AsyncOpenAIAdaptor(
+            module=self._make_client(delay=0.0, status=500),
+            database=MemoryDatabase(FakeVectorizer()),
+            hedge=True,
+        )
+        client = adaptor.get_adapted()
+        messages = [{"role": "user", "content": "What is the capital of France?"}]
+        with self.assertRaises(openai.InternalServerError):
+            await client.chat.completions.create(model="gpt-4o", messages=messages)
+        assert adaptor.hedge_stats["upstream_won"] == 0
+        assert adaptor.hedge_stats["upstream_failed"] == 1
+
+    async def test_hedged_request(self):
+        """
+        A hedged request is served by the cache when it answers before upstream.
+        """
+        from cachelm.adaptors.openai.async_openai import AsyncOpenAIAdaptor
+
+        adaptor = AsyncOpenAIAdaptor(
+            module=self._make_client(delay=0.3),
+            database=MemoryDatabase(FakeVectorizer()),
+            hedge=True,
+        )
+        client = adaptor.get_adapted()
+        messages = [{"role": "user", "content": "What is the capital of France?"}]
+
+        res = await client.chat.completions.create(model="gpt-4o", messages=messages)
+        assert res.choices[0].message.content == "Paris"
+        assert adaptor.database.size() == 1, "Upstream answer should be cached"
+
+        start = time.monotonic()
+        res = await client.chat.completions.create(model="gpt-4o", messages=messages)
+        assert res.choices[0].message.content == "Paris"
+        assert time.monotonic() - start < 0.3, "Cache should win the race"
+        assert adaptor.hedge_stats["cache_won"] == 1
+        assert adaptor.hedge_stats["wasted_upstream_calls"] == 1
+        assert adaptor.hedge_stats["upstream_started"] == 2
+
+    async def test_interleaved_hedged_requests(self):
+        """
+        A hedged response is cached under its own request, even after another request replaced
+        the history and namespace of the adaptor.
+        """
+        import asyncio
+        import json
+
+        import httpx
+
+        from cachelm.adaptors.openai.async_openai import AsyncOpenAIAdaptor
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            body = json.loads(request.content)
+            question = body["messages"][-1]["content"]
+            # The first request answers after the second one started
+            await asyncio.sleep(0.2 if question == "First?" else 0.05)
+            return httpx.Response(
+                200, json=make_completion(f"Answer to {question}").model_dump()
+            )
+
+        adaptor = AsyncOpenAIAdaptor(
+            module=openai.AsyncOpenAI(
+                api_key="sk-test",
+                max_retries=0,
+                http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+            ),
+            database=MemoryDatabase(FakeVectorizer()),
+            hedge=True,
+        )
+        client = adaptor.get_adapted()
+
+        async def ask(model, question):
+            res = await client.chat.completions.create(
+                model=model, messages=[{"role": "user", "content": question}]
+            )
+            return res.choices[0].message.content
+
+        first = asyncio.ensure_future(ask("gpt-4o", "First?"))
+        await asyncio.sleep(0.05)
+        second = asyncio.ensure_future(ask("gpt-4o-mini", "Second?"))
+        assert await first == "Answer to First?"
+        assert await second == "Answer to Second?"
+        while adaptor._background_tasks:
+            await asyncio.gather(*adaptor._background_tasks)
+
+        assert await ask("gpt-4o", "First?") == "Answer to First?"
+        assert await ask("gpt-4o-mini", "Second?") == "Answer to Second?"
+        assert adaptor.hedge_stats["cache_won"] == 2, "Each request should be cached"
@@ -0,0 +1,121 @@
+import unittest
+
+from cachelm.utils.chat_history import (
+    ChatHistory,
+    Message,
+    MessageSerializer,
+    ToolCall,
+)
+
+
+class TestMessageSerializer(unittest.TestCase):
+    def setUp(self):
+        self.message = Message(
+            role="assistant",
+            content="Il fait beau à Paris. " * 200,
+            tool_calls=[ToolCall("get_weather", '{"city": "Paris"}')],
+        )
+
+    def _assert_same(self, decoded: Message):
+        assert decoded.role == self.message.role
+        assert decoded.content == self.message.content
+        assert [(t.tool, t.args) for t in decoded.tool_calls] == [
+            ("get_weather", '{"city": "Paris"}')
+        ]
+
+    def test_round_trip(self):
+        """
+        Every codec round-trips, in binary and text form, with and without compression.
+        """
+        for codec in ("json", "orjson", "msgpack"):
+            for compress_min_size in (None, 1024):
+                try:
+                    serializer = MessageSerializer(codec, compress_min_size)
+                except ImportError:
+                    continue
+                self._assert_same(
+                    MessageSerializer.loads(serializer.dumps(self.message))
+                )
+                self._assert_same(
+                    MessageSerializer.loads(serializer.dumps_text(self.message))
+                )
+
+    def test_legacy_json_is_readable(self):
+        """
+        Entries written as plain JSON by previous versions are still decoded.
+        """
+        legacy = self.message.to_json_str()
+        self._assert_same(MessageSerializer.loads(legacy))
+        self._assert_same(MessageSerializer.loads(legacy.encode()))
+        assert (
+            MessageSerializer("json").dumps_text(self.message).startswith("{")
+        ), "Uncompressed JSON should stay plain JSON text"
+
+
+class TestChatHistory(unittest.TestCase):
+    def test_window_is_cached_until_history_changes(self):
+        """
+        The window is computed once per history change and padded with the shared pad message.
+        """
+        history = ChatHistory()
+        history.set_messages([Message("user", "Hello")])
+        window = history.window(3)
+        assert window is history.window(3), "Window should be reused"
+        assert window == (ChatHistory.PAD, ChatHistory.PAD, history[0])
+        history.add_assistant_message("Hi there!")
+        assert history.window(3) is not window, "Window should follow the history"
+        assert [m.content for m in history.window(3)] == ["", "Hello", "Hi there!"]
+
+    def test_formatted_str_follows_content(self):
+        """
+        The cached formatted string and hash are invalidated when the content changes.
+        """
+        message = Message("user", "Hello")
+        formatted, content_hash = message.to_formatted_str(), message.content_hash
+        message.content = "Bonjour"
+        assert message.to_formatted_str() == "msg: user: Bonjour"
+        assert message.to_formatted_str() != formatted
+        assert message.content_hash != content_hash
+        assert message.content_hash == Message("user", "Bonjour").content_hash
+
+    def test_from_openai(self):
+        """
+        OpenAI request messages are converted, tool calls and multi-part contents included.
+        """
+        message = Message.from_openai(
+            {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": "call_1",
+                        "type": "function",
+                        "function": {"name": "get_weather", "arguments": "{}"},
+                    }
+                ],
+            }
+        )
+        assert message.content == ""
+        assert [(t.tool, t.args) for t in message.tool_calls] == [("get_weather", "{}")]
+        other = Message.from_openai(
+            {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": "call_1",
+                        "type": "function",
+                        "function": {"name": "delete_db", "arguments": "{}"},
+                    }
+                ],
+            }
+        )
+        assert (
+            message.to_formatted_str() != other.to_formatted_str()
+        ), "Tool-call-only turns should be keyed by their tool calls"
+        assert "get_weather" in message.to_formatted_str()
+        assert ChatHistory.PAD.to_formatted_str() == "msg:"
+        message = Message.from_openai(
+            {"role": "user", "content": [{"type": "text", "text": "Hi"}]}
+        )
+        assert message.content == "Hi" and message.tool_calls is None
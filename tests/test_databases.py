@@ -43,6 +43,88 @@ class TestDatabases(unittest.TestCase):
         self._test_helper(db)
         db.disconnect()
 
+    def test_chroma_namespaces_survive_a_restart(self):
+        """
+        Namespace collections have valid names whatever the namespace, and are found again after a restart.
+        """
+        from cachelm.databases.chroma import ChromaDatabase
+        from tests.helpers import FakeVectorizer
+
+        history = [Message(role="user", content="Hello, how are you?")]
+        response = Message(role="assistant", content="I'm fine, thank you!")
+        db = ChromaDatabase(FakeVectorizer())
+        assert db.connect(), "Failed to connect to Chroma database"
+        db.reset()
+        db.write(history, response, namespace="openai/gpt-4o @ 0.7")
+        assert db.find(history, namespace="openai/gpt-4o @ 0.7") is not None
+        restarted = ChromaDatabase(FakeVectorizer())
+        assert restarted.connect(), "Failed to connect to Chroma database"
+        assert restarted.size() == 1, "Namespace collections should be counted"
+        restarted.reset()
+
+    def test_namespace_names(self):
+        """
+        Namespaces are used as is in collection names when they're valid, hashed otherwise.
+        """
+        from cachelm.utils.namespace import namespace_name
+
+        assert namespace_name("cachelm", "gpt-4o") == "cachelm__gpt-4o"
+        for namespace in ("openai/gpt-4o", "", "-x", "é" * 10, "a" * 100):
+            name = namespace_name("cachelm", namespace)
+            assert name.startswith("cachelm__ns_") and len(name) == 28, name
+        assert namespace_name("cachelm", "a/b") != namespace_name("cachelm", "a:b")
+
+    def test_memory_database(self):
+        """
+        Test the in-memory database, and that namespaces are kept apart.
+        """
+        from cachelm.databases.memory import MemoryDatabase
+        from tests.helpers import FakeVectorizer
+
+        db = MemoryDatabase(FakeVectorizer(dimension=4096))
+        assert db.connect(), "Failed to connect to memory database"
+        self._test_helper(db)
+        history = [Message(role="user", content="What is the capital of France?")]
+        for i in range(40):
+            db.write(
+                [Message(role="user", content=f"Question number {i}")],
+                Message(role="assistant", content=str(i)),
+                namespace="numbers",
+            )
+        assert db.find(history, namespace="numbers") is None
+        found = db.find_with_distance(
+            [Message(role="user", content="Question number 17")], namespace="numbers"
+        )
+        assert found is not None and found[0].content == "17"
+        assert found[1] < 1e-5, "Identical windows should have a zero distance"
+        assert db.size() == 41
+        db.disconnect()
+
+    def test_qdrant_default_partition(self):
+        """
+        Qdrant lookups of the default partition don't see the points of other namespaces.
+        """
+        from cachelm.databases.qdrant import QdrantDatabase
+        from cachelm.utils.aggregator import AggregateMethod
+        from tests.helpers import FakeVectorizer
+
+        vectorizer = FakeVectorizer(aggregate_method=AggregateMethod.EXPONENTIAL_DECAY)
+        db = QdrantDatabase(vectorizer)
+        assert db.connect(), "Failed to connect to Qdrant database"
+        history = [Message(role="user", content="What is the capital of France?")]
+        db.write(history, Message(role="assistant", content="Paris"))
+        db.write(history, Message(role="assistant", content="Paris"), namespace="fr")
+        db.write(history, Message(role="assistant", content="Paris"), namespace="fr")
+        for namespace, expected in ((None, 1), ("fr", 2)):
+            count = db.client.count(
+                db.collection_name,
+                count_filter=db._namespace_filter(namespace),
+            ).count
+            assert (
+                count == expected
+            ), f"{namespace} partition should have {expected} points"
+        db.disconnect()
+
     def test_clickhouse_database(self):
         """
         Test the ClickHouse database.
@@ -76,3 +158,173 @@ class TestDatabases(unittest.TestCase):
         assert success, "Failed to connect to RedisVL database"
         self._test_helper(db)
         db.disconnect()
+
+
+class TestShardedDatabase(unittest.TestCase):
+    def _history(self, question: str) -> list[Message]:
+        return [Message(role="user", content=question)]
+
+    def test_centroid_routing(self):
+        """
+        Entries are spread over the shards and found again by probing the nearest centroid.
+        """
+        from cachelm.databases.sharded import ShardedDatabase
+        from cachelm.databases.memory import MemoryDatabase
+        from tests.helpers import FakeVectorizer
+
+        vectorizer = FakeVectorizer()
+        shards = [MemoryDatabase(vectorizer), MemoryDatabase(vectorizer)]
+        db = ShardedDatabase(shards, routing="centroid")
+        assert db.connect(), "Failed to connect to sharded database"
+
+        db.write(self._history("weather in paris"), Message("assistant", "sunny"))
+        db.write(self._history("python list sort"), Message("assistant", "sorted()"))
+        assert [shard.size() for shard in shards] == [1, 1]
+
+        result = db.find(self._history("python list sort"))
+        assert result is not None and result.content == "sorted()"
+        result = db.find(self._history("weather in paris"))
+        assert result is not None and result.content == "sunny"
+        db.disconnect()
+
+    def test_centroids_survive_a_restart(self):
+        """
+        A process without centroids searches every shard, and persisted or precomputed centroids
+        route like the process that learned them.
+        """
+        import os
+        import tempfile
+
+        from cachelm.databases.sharded import ShardedDatabase
+        from cachelm.databases.memory import MemoryDatabase
+        from tests.helpers import FakeVectorizer
+
+        vectorizer = FakeVectorizer()
+        shards = [MemoryDatabase(vectorizer), MemoryDatabase(vectorizer)]
+        path = os.path.join(tempfile.mkdtemp(), "centroids.json")
+        db = ShardedDatabase(shards, routing="centroid", centroids_path=path)
+        assert db.connect()
+        db.write(self._history("weather in paris"), Message("assistant", "sunny"))
+        db.write(self._history("python list sort"), Message("assistant", "sorted()"))
+        db.disconnect()
+
+        restarted = ShardedDatabase(shards, routing="centroid")
+        assert restarted.connect()
+        result = restarted.find(self._history("python list sort"))
+        assert result is not None, "Without centroids, every shard should be searched"
+        restarted.disconnect()
+
+        restored = ShardedDatabase(shards, routing="centroid", centroids_path=path)
+        assert restored.connect()
+        assert restored.centroids == db.centroids
+        restored.disconnect()
+
+        frozen = ShardedDatabase(
+            shards, routing="centroid", centroids=db.centroids, learn_centroids=False
+        )
+        assert frozen.connect()
+        frozen.write(self._history("weather in rome"), Message("assistant", "hot"))
+        assert frozen.centroids == db.centroids, "Frozen centroids should not move"
+        assert frozen.find(self._history("weather in paris")).content == "sunny"
+        frozen.disconnect()
+
+    def test_namespace_routing_add_shard(self):
+        """
+        Namespaces moved to a new shard are still found and migrated to their new owner.
+        """
+        from cachelm.databases.sharded import ShardedDatabase
+        from cachelm.databases.memory import MemoryDatabase
+        from tests.helpers import FakeVectorizer
+
+        vectorizer = FakeVectorizer()
+        db = ShardedDatabase([MemoryDatabase(vectorizer)], routing="namespace")
+        assert db.connect(), "Failed to connect to sharded database"
+        history = self._history("what is the capital of france")
+        namespaces = [f"ns_{i}" for i in range(8)]
+        for namespace in namespaces:
+            db.write(history, Message("assistant", namespace), namespace=namespace)
+
+        new_shard = MemoryDatabase(vectorizer)
+        db.add_shard(new_shard)
+        for namespace in namespaces:
+            result = db.find(history, namespace=namespace)
+            assert result is not None and result.content == namespace
+        db.executor.shutdown(wait=True)
+        assert new_shard.size() > 0, "Some namespaces should move to the new shard"
+        db.finish_rebalancing()
+        for namespace in namespaces:
+            assert db.find(history, namespace=namespace) is not None
+        db.disconnect()
+
+
+class TestFederatedDatabase(unittest.TestCase):
+    def test_first_hit_wins(self):
+        """
+        A slow database doesn't delay a hit found by a fast one, and writes go to write_to only.
+        """
+        import time
+
+        from cachelm.databases.federated import FederatedDatabase
+        from cachelm.databases.memory import MemoryDatabase
+        from tests.helpers import FakeVectorizer
+
+        class SlowDatabase(MemoryDatabase):
+            def find_with_distance(self, history, namespace=None):
+                time.sleep(1)
+                return super().find_with_distance(history, namespace)
+
+        vectorizer = FakeVectorizer()
+        slow, fast = SlowDatabase(vectorizer), MemoryDatabase(vectorizer)
+        db = FederatedDatabase([slow, fast], timeouts=[0.2, None], write_to=[1])
+        assert db.connect(), "Failed to connect to federated database"
+        history = [Message(role="user", content="Hello, how are you?")]
+        db.write(history, Message(role="assistant", content="Fine"))
+        assert slow.size() == 0 and fast.size() == 1
+
+        start = time.monotonic()
+        result = db.find(history)
+        assert result is not None and result.content == "Fine"
+        assert time.monotonic() - start < 0.5, "Should not wait for the slow database"
+
+        start = time.monotonic()
+        assert db.find([Message(role="user", content="Unrelated")]) is None
+        assert time.monotonic() - start < 0.5, "Should give up after the timeout"
+        for executor in db.executors:
+            executor.shutdown(wait=True)
+        db.disconnect()
+
+    def test_hung_database_is_isolated(self):
+        """
+        A hung database without a timeout fills its own threads only, other hits are not delayed.
+        """
+        import time
+        from threading import Event
+
+        from cachelm.databases.federated import FederatedDatabase
+        from cachelm.databases.memory import MemoryDatabase
+        from tests.helpers import FakeVectorizer
+
+        released = Event()
+
+        class HungDatabase(MemoryDatabase):
+            def find_with_distance(self, history, namespace=None):
+                released.wait(5)
+                return None
+
+        vectorizer = FakeVectorizer()
+        hung, fast = HungDatabase(vectorizer), MemoryDatabase(vectorizer)
+        db = FederatedDatabase([hung, fast], max_workers=3, max_pending=3)
+        assert db.connect(), "Failed to connect to federated database"
+        history = [Message(role="user", content="Hello, how are you?")]
+        db.write(history, Message(role="assistant", content="Fine"))
+        for _ in range(10):
+            start = time.monotonic()
+            result = db.find(history)
+            assert result is not None and result.content == "Fine"
+            assert (
+                time.monotonic() - start < 0.2
+            ), "The hung database should not delay hits"
+        assert db.pending[0] == 3, "Lookups in flight on the hung database are capped"
+        assert db.skipped[0] == 7
+        released.set()
+        db.disconnect()
@@ -0,0 +1,59 @@
+import unittest
+
+from loguru import logger
+
+from cachelm.utils.log import configure_hot_path_logging, log_hot
+
+
+class Payload:
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "x" * 1000
+
+
+class TestHotPathLogging(unittest.TestCase):
+    def tearDown(self):
+        configure_hot_path_logging()
+
+    def _sink(self, level: str) -> list[str]:
+        records = []
+        sink_id = logger.add(lambda message: records.append(message), level=level)
+        self.addCleanup(logger.remove, sink_id)
+        return records
+
+    def test_payloads_are_lazy_and_truncated(self):
+        """
+        Payloads are only formatted when a sink accepts the record, and then truncated.
+        """
+        payload = Payload()
+        records = self._sink("WARNING")
+        log_hot("TRACE", "Writing: {}", payload)
+        assert payload.formatted == 0, "A filtered record should not format its payload"
+        assert records == []
+
+        configure_hot_path_logging(max_chars=10)
+        log_hot("WARNING", "Writing: {}", payload)
+        assert payload.formatted == 1
+        assert "Writing: xxxxxxxxxx... (990 more chars)" in records[0]
+        assert "test_log" in records[0], "The caller should be the record's origin"
+
+    def test_sampling(self):
+        """
+        A sample rate of 0 drops every record.
+        """
+        records = self._sink("INFO")
+        configure_hot_path_logging(sample_rate=0)
+        log_hot("INFO", "Setting history")
+        assert records == []
+        configure_hot_path_logging(sample_rate=1)
+        log_hot("INFO", "Setting history")
+        assert len(records) == 1
+        with self.assertRaises(ValueError):
+            configure_hot_path_logging(sample_rate=2)
+        with self.assertRaises(ValueError):
+            configure_hot_path_logging(max_chars=0)
+        with self.assertRaises(TypeError):
+            configure_hot_path_logging(sample_rate="all")
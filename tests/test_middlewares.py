@@ -0,0 +1,139 @@
+import unittest
+
+from cachelm.middlewares.deduper import Deduper
+from cachelm.middlewares.replacer import Replacement, Replacer
+from cachelm.middlewares.skipper import Skipper
+from cachelm.utils.chat_history import ChatHistory, Message, ToolCall
+
+
+class TestReplacer(unittest.TestCase):
+    def test_compiled_matches_sequential(self):
+        """
+        The compiled mode gives the same result as sequential replacements for non-overlapping rules.
+        """
+        replacements = [
+            Replacement(f"{{{{customer_{i}}}}}", f"Customer {i:04d}")
+            for i in range(500)
+        ] + [Replacement("{{sku}}", "SKU-42.a"), Replacement("{{name}}", "Anmol")]
+        content = (
+            "Anmol ordered SKU-42.a for Customer 0042 and Customer 0499, not SKU-42b."
+        )
+        plain = Replacer(replacements)
+        compiled = Replacer(replacements, compiled=True)
+
+        for replacer in (plain, compiled):
+            saved = replacer.pre_cache_save(Message("user", content), ChatHistory())
+            assert saved.content == (
+                "{{name}} ordered {{sku}} for {{customer_42}} and {{customer_499}}, not SKU-42b."
+            ), "Values should be replaced by their keys"
+            restored = replacer.post_cache_retrieval(saved, ChatHistory())
+            assert restored.content == content, "Keys should be replaced back"
+
+    def test_compiled_prefers_longest_match(self):
+        """
+        Overlapping values are replaced by the longest one.
+        """
+        replacer = Replacer(
+            [Replacement("{{city}}", "York"), Replacement("{{city2}}", "New York")],
+            compiled=True,
+        )
+        saved = replacer.pre_cache_save(
+            Message("user", "New York and York"), ChatHistory()
+        )
+        assert saved.content == "{{city2}} and {{city}}"
+
+
+class TestSkipper(unittest.TestCase):
+    def test_patterns(self):
+        """
+        Combined, backreference and inline flag patterns all skip their matches.
+        """
+        for patterns in (
+            [r"skip_this.*", r"ignore_\d+", r"(\w+) \1"],
+            [r"skip_this.*", r"(?i)IGNORE_\d+"],
+        ):
+            skipper = Skipper(patterns=patterns)
+            for content in ("please skip_this one", "ignore_42", "no no"):
+                if content == "no no" and len(patterns) == 2:
+                    continue
+                assert (
+                    skipper.pre_cache_save(Message("assistant", content), ChatHistory())
+                    is None
+                ), f"{content!r} should be skipped with {patterns}"
+            assert skipper.pre_cache_save(
+                Message("assistant", "keep me"), ChatHistory()
+            ), "Other messages should be kept"
+
+    def test_top_level_alternation(self):
+        """
+        Every branch of a pattern with a top-level alternation still skips its matches.
+        """
+        for pattern, contents in (
+            ("a|ab", ["a", "ab"]),
+            ("ab|ac", ["ab", "ac"]),
+            ("password|passphrase", ["my password", "my passphrase"]),
+        ):
+            skipper = Skipper(patterns=[pattern, r"skip_this.*"])
+            for content in contents:
+                assert (
+                    skipper.pre_cache_save(Message("assistant", content), ChatHistory())
+                    is None
+                ), f"{content!r} should be skipped with {pattern!r}"
+            assert skipper.pre_cache_save(
+                Message("assistant", "keep me"), ChatHistory()
+            ), "Other messages should be kept"
+
+    def test_group_dependent_patterns_are_separate(self):
+        """
+        Patterns that depend on their groups or set inline flags are searched on their own.
+        """
+        skipper = Skipper(
+            patterns=[
+                r"skip_this.*",
+                r"(?:secret|private)_key",
+                r"(?P<word>\w+) (?P=word)",
+                r"(?i)IGNORE_\d+",
+            ]
+        )
+        assert len(skipper._separate) == 2, "Only group-dependent patterns stay apart"
+        for content in ("my private_key", "no no", "ignore_42"):
+            assert (
+                skipper.pre_cache_save(Message("assistant", content), ChatHistory())
+                is None
+            ), f"{content!r} should be skipped"
+
+    def test_any_tool_call(self):
+        """
+        A message is skipped if any of its tool calls is in the skip list.
+        """
+        skipper = Skipper(patterns=[], function_calls=["send_email"])
+        message = Message(
+            "assistant",
+            "",
+            tool_calls=[ToolCall("get_weather", "{}"), ToolCall("send_email", "{}")],
+        )
+        assert skipper.pre_cache_save(message, ChatHistory()) is None
+
+
+class TestDeduper(unittest.TestCase):
+    def test_dedupes_against_history(self):
+        """
+        Cached replies already present in the history are dropped, for histories and plain lists.
+        """
+        deduper = Deduper()
+        messages = [Message("user", f"Question {i}") for i in range(1000)]
+        history = ChatHistory()
+        history.set_messages(list(messages))
+        for context in (history, messages):
+            assert (
+                deduper.post_cache_retrieval(
+                    Message("assistant", "Question 7"), context
+                )
+                is None
+            )
+            assert deduper.post_cache_retrieval(Message("assistant", "Answer"), context)
+        history.add_assistant_message(Message("assistant", "Answer"))
+        assert (
+            deduper.post_cache_retrieval(Message("assistant", "Answer"), history)
+            is None
+        ), "Appended messages should be indexed"
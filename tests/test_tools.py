@@ -0,0 +1,86 @@
+import unittest
+
+from cachelm.utils.aggregator import AggregateMethod
+
+
+class TestReplayTuner(unittest.TestCase):
+    def _records(self):
+        return [
+            {
+                "messages": [
+                    {"role": "user", "content": "How do I reset my password?"}
+                ],
+                "response": "Go to the settings page.",
+                "model": "gpt-4o",
+            },
+            {
+                "messages": [
+                    {"role": "user", "content": "how do I reset my password??"}
+                ],
+                "response": "Go to the settings page.",
+                "model": "gpt-4o",
+            },
+            {
+                "messages": [
+                    {"role": "user", "content": "How do I reset my password?"}
+                ],
+                "response": "Go to the settings page.",
+                "model": "gpt-4o-mini",
+            },
+            {
+                "messages": [
+                    {"role": "user", "content": "How do I reset my passport?"}
+                ],
+                "response": "Contact the embassy.",
+                "model": "gpt-4o",
+                "usage": {"total_tokens": 1000},
+            },
+        ]
+
+    def test_keys_match_the_database(self):
+        """
+        Keys computed by the tuner should be the embeddings the database would store.
+        """
+        import numpy as np
+
+        from cachelm.databases.memory import MemoryDatabase
+        from cachelm.tools.tune import ReplayTuner
+        from cachelm.vectorizers.hashing import HashingVectorizer
+
+        tuner = ReplayTuner(self._records(), HashingVectorizer())
+        for method in (
+            AggregateMethod.CONCATENATE,
+            AggregateMethod.EXPONENTIAL_DECAY,
+            AggregateMethod.LINEAR_DECAY,
+        ):
+            vectorizer = HashingVectorizer(
+                aggregate_method=method, window_size=2, decay=0.3
+            )
+            expected = MemoryDatabase(vectorizer)._embed(tuner.histories[1].window(2))
+            keys = tuner.keys(2, method, decay=0.3)
+            assert np.allclose(keys[1], expected, atol=1e-6), f"{method} keys differ"
+
+    def test_replay(self):
+        """
+        Hits, wrong answers and tokens saved should follow the replayed cache at each threshold.
+        """
+        from cachelm.tools.tune import ReplayTuner
+        from cachelm.vectorizers.hashing import HashingVectorizer
+
+        tuner = ReplayTuner(
+            self._records(), HashingVectorizer(), partition_by=["model"]
+        )
+        strict, loose = tuner.evaluate([0.01, 0.5], window_size=1)
+        assert strict["hits"] == 0, "Near-duplicates should miss a strict threshold"
+        assert strict["upstream_calls"] == 4
+        assert strict["near_misses"] == 1, "The lowercase variant is a near miss"
+        assert loose["hits"] == 2, "The other model's request should not hit"
+        assert loose["wrong_hits"] == 1, "The passport question gets a wrong answer"
+        assert loose["wrong_hit_rate"] == 0.5
+        assert loose["tokens_saved"] > 1000, "Logged usage should be counted"
+        assert sum(loose["nearest_distance_histogram"].values()) == 2
+
+        results = tuner.sweep([0.01, 0.5], window_sizes=[1, 2], decays=[0.4])
+        assert len(results) == 2 * 3 * 2, "One result per setting and threshold"
+        best = ReplayTuner.best(results, max_wrong_hit_rate=0.0)
+        assert best["threshold"] == 0.01 and best["wrong_hits"] == 0
@@ -58,3 +58,416 @@ class TestVectorizer(unittest.TestCase):
 
         vectorizer = RedisvlVectorizer()
         self._test_helper(vectorizer)
+
+    def test_hashing_vectorizer(self):
+        """
+        Test the hashing vectorizer, and that near-duplicates get close vectors.
+        """
+        import numpy as np
+
+        from cachelm.vectorizers.hashing import HashingVectorizer
+
+        vectorizer = HashingVectorizer(dimension=512)
+        self._test_helper(vectorizer)
+        assert len(vectorizer.embed("Hello, world!")) == 512, "Wrong dimension"
+
+        vectors = np.array(
+            vectorizer.embed_many(
+                [
+                    "How do I reset my password?",
+                    "how do i reset my password??",
+                    "What is the capital of France?",
+                ]
+            )
+        )
+        assert np.allclose(np.linalg.norm(vectors, axis=1), 1), "Should be normalized"
+        assert vectors[0] @ vectors[1] > 0.9, "Near-duplicates should be close"
+        assert vectors[0] @ vectors[2] < 0.3, "Unrelated texts should be far"
+        assert (
+            HashingVectorizer(dimension=512).embed("How do I reset my password?")
+            == vectors[0].tolist()
+        ), "Embeddings should be deterministic"
+        assert vectorizer.embed_many(["", "a"]) == [
+            [0.0] * 512,
+            [0.0] * 512,
+        ], "Texts without n-grams should embed to zero vectors"
+
+    def test_simhash_vectorizer(self):
+        """
+        Test the SimHash vectorizer, and that near-duplicates get close vectors.
+        """
+        import numpy as np
+
+        from cachelm.vectorizers.hashing import SimHashVectorizer
+
+        vectorizer = SimHashVectorizer(bits=128)
+        self._test_helper(vectorizer)
+
+        vectors = np.array(
+            vectorizer.embed_many(
+                [
+                    "How do I reset my password?",
+                    "how do i reset my password??",
+                    "What is the capital of France?",
+                ]
+            )
+        )
+        assert vectors.shape == (3, 128), "Wrong dimension"
+        assert np.allclose(np.linalg.norm(vectors, axis=1), 1), "Should be normalized"
+        assert vectors[0] @ vectors[1] > 0.7, "Near-duplicates should be close"
+        assert vectors[0] @ vectors[2] < 0.3, "Unrelated texts should be far"
+        assert (
+            SimHashVectorizer(bits=128).embed("How do I reset my password?")
+            == vectors[0].tolist()
+        ), "Embeddings should be deterministic"
+        with self.assertRaises(ValueError):
+            SimHashVectorizer(bits=100)
+
+
+class TestBatchingVectorizer(unittest.TestCase):
+    def test_concurrent_calls_are_batched(self):
+        """
+        Concurrent embed calls should be merged into fewer embed_many calls, each caller getting its own vectors.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from threading import Barrier
+
+        from cachelm.vectorizers.batching import BatchingVectorizer
+        from tests.helpers import FakeVectorizer
+
+        fake = FakeVectorizer(window_size=3)
+        vectorizer = BatchingVectorizer(fake, max_batch=64, max_wait_ms=50)
+        assert vectorizer.window_size == 3, "Window size should be the wrapped one"
+
+        texts = [f"message number {i}" for i in range(16)]
+        barrier = Barrier(len(texts))
+
+        def embed(text):
+            barrier.wait()
+            return vectorizer.embed_many([text, text + " again"])
+
+        with ThreadPoolExecutor(max_workers=len(texts)) as executor:
+            results = list(executor.map(embed, texts))
+        vectorizer.close()
+
+        for text, vectors in zip(texts, results):
+            assert vectors == fake.embed_many(
+                [text, text + " again"]
+            ), "Each caller should get the vectors of its own texts"
+        stats = vectorizer.stats()
+        assert stats["requests"] == len(texts), "Every call should be counted"
+        assert stats["texts"] == 2 * len(texts), "Every text should be embedded"
+        assert stats["batches"] < len(texts), "Concurrent calls should be batched"
+        assert sum(stats["batch_sizes"].values()) == stats["batches"]
+        assert stats["queue_depth"] == 0, "The queue should be drained"
+
+    def test_batches_are_capped_in_texts(self):
+        """
+        Calls overflowing max_batch texts should open the next batch instead of growing this one.
+        """
+        from cachelm.vectorizers.batching import BatchingVectorizer
+        from tests.helpers import FakeVectorizer
+
+        class RecordingVectorizer(FakeVectorizer):
+            sizes = []
+
+            def embed_many(self, text):
+                self.sizes.append(len(text))
+                return super().embed_many(text)
+
+        wrapped = RecordingVectorizer()
+        vectorizer = BatchingVectorizer(wrapped, max_batch=4, max_wait_ms=200)
+        futures = [
+            vectorizer.submit([f"text {i}"] * count)
+            for i, count in enumerate((1, 2, 3, 6, 1))
+        ]
+        results = [future.result() for future in futures]
+        vectorizer.close()
+        assert [len(vectors) for vectors in results] == [1, 2, 3, 6, 1]
+        assert wrapped.sizes == [3, 3, 6, 1], "Batches should hold at most 4 texts"
+
+    def test_errors_reach_every_caller(self):
+        """
+        An error of the wrapped vectorizer should be raised to the callers of the batch.
+        """
+        from cachelm.vectorizers.batching import BatchingVectorizer
+        from tests.helpers import FakeVectorizer
+
+        class FailingVectorizer(FakeVectorizer):
+            def embed_many(self, text):
+                raise RuntimeError("model unavailable")
+
+        vectorizer = BatchingVectorizer(FailingVectorizer(), max_wait_ms=0)
+        with self.assertRaises(RuntimeError):
+            vectorizer.embed("Hello")
+        assert vectorizer.embed_many([]) == [], "No texts should need no batch"
+        vectorizer.close()
+        with self.assertRaises(RuntimeError):
+            vectorizer.embed("Hello")
+
+
+class TestProcessPoolVectorizer(unittest.TestCase):
+    def test_matches_wrapped_vectorizer(self):
+        """
+        Vectors computed in the worker processes should match the ones computed in process.
+        """
+        from cachelm.vectorizers.process_pool import ProcessPoolVectorizer
+        from tests.helpers import FakeVectorizer
+
+        vectorizer = ProcessPoolVectorizer(
+            FakeVectorizer, workers=2, min_split_size=4, buffer_size=64
+        )
+        try:
+            texts = ["Hello, world!", "Grüße, Welt!", "", "Goodbye, world!"] * 8
+            embeddings = vectorizer.embed_many(texts)
+            expected = FakeVectorizer().embed_many(texts)
+            assert len(embeddings) == len(texts), "Every text should be embedded"
+            for embedding, reference in zip(embeddings, expected):
+                assert isinstance(embedding[0], float), "Embeddings should be floats"
+                assert all(
+                    abs(a - b) < 1e-6 for a, b in zip(embedding, reference)
+                ), "Embeddings should match the wrapped vectorizer"
+            assert vectorizer.embed_many([]) == [], "No texts should give no vectors"
+            assert vectorizer.embedding_dimension(effective=False) == 64
+        finally:
+            vectorizer.close()
+
+    def test_dead_worker_is_replaced(self):
+        """
+        A worker killed between calls is replaced, the call is retried and its buffers are released.
+        """
+        import os
+        import signal
+        from multiprocessing.shared_memory import SharedMemory
+
+        from cachelm.vectorizers.process_pool import ProcessPoolVectorizer
+        from tests.helpers import FakeVectorizer
+
+        vectorizer = ProcessPoolVectorizer(FakeVectorizer, workers=1)
+        try:
+            expected = vectorizer.embed_many(["Hello, world!"])
+            worker = vectorizer._pool[0]
+            os.kill(worker.process.pid, signal.SIGKILL)
+            worker.process.join(5)
+            assert vectorizer.embed_many(["Hello, world!"]) == expected
+            assert vectorizer.restarts == 1
+            assert vectorizer._pool[0] is not worker
+            with self.assertRaises(FileNotFoundError):
+                SharedMemory(name=worker.input.name)
+        finally:
+            vectorizer.close()
+
+    def test_failed_replacement_is_dropped(self):
+        """
+        A dead worker that can't be replaced is dropped from the pool instead of being reused.
+        """
+        import os
+        import signal
+
+        from cachelm.vectorizers.process_pool import ProcessPoolVectorizer
+        from tests.helpers import FakeVectorizer
+
+        vectorizer = ProcessPoolVectorizer(FakeVectorizer, workers=1)
+        try:
+            expected = vectorizer.embed_many(["Hello, world!"])
+            worker = vectorizer._pool[0]
+            os.kill(worker.process.pid, signal.SIGKILL)
+            worker.process.join(5)
+
+            def spawn_fails(count):
+                raise OSError("Can't start a process")
+
+            vectorizer._spawn = spawn_fails
+            with self.assertRaises(OSError):
+                vectorizer.embed_many(["Hello, world!"])
+            assert vectorizer._pool == [], "The dead worker should be dropped"
+            assert vectorizer._idle.empty(), "The dead worker should not be reused"
+
+            del vectorizer._spawn
+            assert (
+                vectorizer.embed_many(["Hello, world!"]) == expected
+            ), "The pool should be started again"
+        finally:
+            vectorizer.close()
+
+
+class TestRemoteVectorizer(unittest.TestCase):
+    def test_remote_embeddings(self):
+        """
+        The remote vectorizer should return the vectors of the server, across server restarts.
+        """
+        import os
+        import tempfile
+
+        from cachelm.vectorizers.remote import EmbeddingServer, RemoteVectorizer
+        from tests.helpers import FakeVectorizer
+
+        with tempfile.TemporaryDirectory() as directory:
+            socket_path = os.path.join(directory, "embeddings.sock")
+            server = EmbeddingServer(FakeVectorizer(), socket_path, max_wait_ms=1)
+            server.start()
+            vectorizer = RemoteVectorizer(socket_path)
+            try:
+                texts = ["Hello, world!", "Grüße, Welt!", ""]
+                expected = FakeVectorizer().embed_many(texts)
+                embeddings = vectorizer.embed_many(texts)
+                for embedding, reference in zip(embeddings, expected):
+                    assert all(
+                        abs(a - b) < 1e-6 for a, b in zip(embedding, reference)
+                    ), "Embeddings should match the server vectorizer"
+                assert len(vectorizer.embed("Hello")) == 64
+
+                server.stop()
+                server = EmbeddingServer(FakeVectorizer(), socket_path)
+                server.start()
+                assert (
+                    len(vectorizer.embed_many(texts)) == 3
+                ), "Stale pooled connections should be replaced"
+            finally:
+                vectorizer.close()
+                server.stop()
+
+    def test_server_errors(self):
+        """
+        Errors of the server vectorizer should be raised by the client, keeping the connection usable.
+        """
+        import os
+        import tempfile
+
+        from cachelm.vectorizers.remote import EmbeddingServer, RemoteVectorizer
+        from tests.helpers import FakeVectorizer
+
+        class FailingVectorizer(FakeVectorizer):
+            def embed_many(self, text):
+                if "fail" in text:
+                    raise ValueError("bad input")
+                return super().embed_many(text)
+
+        with tempfile.TemporaryDirectory() as directory:
+            socket_path = os.path.join(directory, "embeddings.sock")
+            server = EmbeddingServer(
+                FailingVectorizer(), socket_path, max_batch=1, max_wait_ms=0
+            )
+            server.start()
+            vectorizer = RemoteVectorizer(socket_path)
+            try:
+                with self.assertRaises(RuntimeError):
+                    vectorizer.embed("fail")
+                assert len(vectorizer.embed("Hello")) == 64
+            finally:
+                vectorizer.close()
+                server.stop()
+
+
+class TestCachedVectorizer(unittest.TestCase):
+    def test_read_through_store(self):
+        """
+        Texts embedded before, even by another instance, should be read from the store.
+        """
+        import os
+        import tempfile
+
+        from cachelm.vectorizers.cached import CachedVectorizer
+        from tests.helpers import FakeVectorizer
+
+        class CountingVectorizer(FakeVectorizer):
+            embedded = 0
+
+            def embed_many(self, text):
+                self.embedded += len(text)
+                return super().embed_many(text)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "embeddings.db")
+            wrapped = CountingVectorizer()
+            vectorizer = CachedVectorizer(wrapped, path, model_name="fake")
+            texts = ["Hello, world!", "Goodbye, world!", "Hello, world!"]
+            first = vectorizer.embed_many(texts)
+            assert wrapped.embedded == 2, "Duplicate texts should be embedded once"
+            assert first[0] == first[2], "Duplicate texts should get the same vector"
+            assert vectorizer.prefetch(["Hello, world!", "New text"]) == 1
+            vectorizer.close()
+
+            restarted = CountingVectorizer()
+            vectorizer = CachedVectorizer(restarted, path, model_name="fake")
+            assert vectorizer.embed_many(texts) == first, "Vectors should persist"
+            assert restarted.embedded == 0, "Stored texts should not be embedded again"
+            other_model = CachedVectorizer(restarted, path, model_name="other")
+            other_model.embed("Hello, world!")
+            assert restarted.embedded == 1, "Stores should be keyed by model"
+            other_model.close()
+            vectorizer.close()
+
+            with self.assertRaises(ValueError):
+                CachedVectorizer(FakeVectorizer(), path)
+
+    def test_eviction(self):
+        """
+        The least recently used embeddings should be evicted past max_entries.
+        """
+        import os
+        import tempfile
+
+        from cachelm.vectorizers.cached import CachedVectorizer
+        from tests.helpers import FakeVectorizer
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "embeddings.db")
+            vectorizer = CachedVectorizer(
+                FakeVectorizer(), path, model_name="fake", max_entries=20
+            )
+            vectorizer.prefetch([f"text {i}" for i in range(10)])
+            vectorizer.embed("text 0")
+            vectorizer.prefetch([f"other text {i}" for i in range(15)])
+            stats = vectorizer.stats()
+            assert stats["size"] <= 20, "The store should be bounded"
+            assert stats["evictions"] > 0, "Evictions should be counted"
+            hits = stats["hits"]
+            vectorizer.embed("text 0")
+            assert (
+                vectorizer.stats()["hits"] == hits + 1
+            ), "Recently used embeddings should be kept"
+            vectorizer.close()
+
+    def test_access_times_are_flushed(self):
+        """
+        Access times recorded by reads should be written once enough of them are pending.
+        """
+        import os
+        import tempfile
+
+        import numpy as np
+
+        from cachelm.vectorizers.cached import SQLiteEmbeddingStore
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = SQLiteEmbeddingStore(
+                os.path.join(directory, "embeddings.db"), max_touched=2
+            )
+            vector = np.zeros(4, dtype="<f4")
+            store.put_many("fake", [(b"a", vector), (b"b", vector)])
+            store.get_many("fake", [b"a"])
+            assert len(store._touched) == 1, "A single read should stay in memory"
+            store.get_many("fake", [b"b"])
+            assert store._touched == {}, "Reads past max_touched should be written"
+            store.close()
+
+    def test_read_errors_fall_back(self):
+        """
+        Texts should be embedded by the wrapped vectorizer when the store can't be read.
+        """
+        import os
+        import tempfile
+
+        import numpy as np
+
+        from cachelm.vectorizers.cached import CachedVectorizer
+        from tests.helpers import FakeVectorizer
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "embeddings.db")
+            vectorizer = CachedVectorizer(FakeVectorizer(), path, model_name="fake")
+            expected = FakeVectorizer().embed("Hello, world!")
+            vectorizer.store._connection.close()
+            vector = vectorizer.embed("Hello, world!")
+            assert np.allclose(vector, expected), "The wrapped vectorizer should answer"